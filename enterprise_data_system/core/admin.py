@@ -2,9 +2,9 @@ from django.contrib import admin
 from .models import (
     Account, AccountLocation,
     BillingAccount, BillingLocation,
-    Customer, CustomerIdentity,
+    Customer, CustomerIdentity, CustomerFeatures,
     LineOfBusiness, SeriesName, PlanName,
-    Contract, ContractPayment, ContractBankAccount, ContractCreditCard,
+    Contract, ContractPayment, ContractBankAccount, ContractCreditCard, ContractQuote,
     Invoice,
     CustomerFeedback, CallRecord,
     ChronicDiseaseRisk, ChurnPrediction, ProductRecommendation,
@@ -17,6 +17,7 @@ admin.site.register(BillingAccount)
 admin.site.register(BillingLocation)
 admin.site.register(Customer)
 admin.site.register(CustomerIdentity)
+admin.site.register(CustomerFeatures)
 admin.site.register(LineOfBusiness)
 admin.site.register(SeriesName)
 admin.site.register(PlanName)
@@ -24,6 +25,7 @@ admin.site.register(Contract)
 admin.site.register(ContractPayment)
 admin.site.register(ContractBankAccount)
 admin.site.register(ContractCreditCard)
+admin.site.register(ContractQuote)
 admin.site.register(Invoice)
 admin.site.register(CustomerFeedback)
 admin.site.register(CallRecord)
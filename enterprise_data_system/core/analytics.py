@@ -0,0 +1,322 @@
+from datetime import date, datetime, timedelta
+
+from django.db.models import (
+    Avg, Count, Q, Sum, OuterRef, Subquery,
+    DecimalField, FloatField, IntegerField,
+)
+from django.db.models.functions import Cast, Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import snapshots
+from .models import (
+    Customer, Contract, ContractPayment, CustomerFeedback, CallRecord,
+    ChronicDiseaseRisk, ChurnPrediction
+)
+
+# Dashboard buckets: response key -> filter value
+BUSINESS_KEYWORDS = ['insurance', 'investment', 'banking', 'loan']
+DURATION_BUCKETS = {'1': 12, '2': 24, '3': 36, '5': 60, '10': 120}
+STATUS_BUCKETS = {'active': 'A', 'pending': 'P', 'expired': 'E', 'suspended': 'C'}
+
+# Sentiment trend buckets and window limits for ai_analytics
+TREND_BUCKETS = {'day': TruncDate, 'week': TruncWeek, 'month': TruncMonth}
+DEFAULT_TREND_DAYS = 7
+MAX_TREND_DAYS = 366
+
+# Per-customer statistics used by risk_analysis / calculate_quote
+CLAIMED_STATUS = 'claimed'
+DELAYED_STATUS = 'delayed'
+COMPLAINT_THRESHOLD = 0.3
+DEFAULT_SENTIMENT = 0.5
+
+# Score thresholds shared by the risk and churn distributions
+HIGH_THRESHOLD = 0.7
+LOW_THRESHOLD = 0.3
+
+
+def contract_summary():
+    """
+    Contract totals and distributions in a single conditional-aggregation query.
+    Returns dict with total, active, total_premium and the business/duration/status
+    distributions keyed the same way as the dashboard response.
+    """
+    aggregates = {
+        'total': Count('id'),
+        'total_premium': Sum('contractpayment__premium'),
+    }
+    for keyword in BUSINESS_KEYWORDS:
+        aggregates[f'business_{keyword}'] = Count('id', filter=Q(business__name__icontains=keyword))
+    for key, months in DURATION_BUCKETS.items():
+        aggregates[f'duration_{key}'] = Count('id', filter=Q(duration=months))
+    for key, code in STATUS_BUCKETS.items():
+        aggregates[f'status_{key}'] = Count('id', filter=Q(status=code))
+
+    row = Contract.objects.aggregate(**aggregates)
+
+    return {
+        'total': row['total'],
+        'active': row['status_active'],
+        'total_premium': row['total_premium'] or 0,
+        'business_distribution': {k: row[f'business_{k}'] for k in BUSINESS_KEYWORDS},
+        'duration_distribution': {k: row[f'duration_{k}'] for k in DURATION_BUCKETS},
+        'status_distribution': {k: row[f'status_{k}'] for k in STATUS_BUCKETS},
+    }
+
+
+def score_distribution(queryset, field):
+    """
+    Count rows of `queryset` per high/medium/low band of `field` in one query.
+    Also returns the average so callers don't need a second aggregate.
+    """
+    return queryset.aggregate(
+        high=Count('id', filter=Q(**{f'{field}__gte': HIGH_THRESHOLD})),
+        medium=Count('id', filter=Q(**{f'{field}__gte': LOW_THRESHOLD, f'{field}__lt': HIGH_THRESHOLD})),
+        low=Count('id', filter=Q(**{f'{field}__lt': LOW_THRESHOLD})),
+        average=Avg(field),
+    )
+
+
+def as_percentages(distribution, keys=('low', 'medium', 'high')):
+    """Convert band counts into rounded percentages of their total"""
+    total = sum(distribution[k] for k in keys)
+    return {k: round(distribution[k] / total * 100) if total > 0 else 0 for k in keys}
+
+
+def _month_start(day, months_back=0):
+    month_index = day.year * 12 + (day.month - 1) - months_back
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def customer_summary(months=12):
+    """
+    Customer totals plus a cumulative monthly growth trend.
+    Uses two queries: one conditional aggregate for totals and the count of
+    customers before the window, and one GROUP BY month over the window.
+    """
+    today = timezone.now().date()
+    window_start = _month_start(today, months - 1)
+
+    row = Customer.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='A')),
+        before_window=Count('id', filter=Q(start_date__lt=window_start)),
+    )
+
+    monthly = dict(
+        Customer.objects.filter(start_date__gte=window_start)
+        .annotate(month=TruncMonth('start_date'))
+        .values('month')
+        .annotate(n=Count('id'))
+        .values_list('month', 'n')
+    )
+
+    trend = []
+    running = row['before_window']
+    for i in range(months - 1, -1, -1):
+        running += monthly.get(_month_start(today, i), 0)
+        trend.append(running)
+
+    return {
+        'total': row['total'],
+        'active': row['active'],
+        'growth_trend': trend,
+    }
+
+
+def dashboard_summary():
+    """Everything dashboard_analytics needs, in four queries total"""
+    contracts = contract_summary()
+    customers = customer_summary()
+    risk = score_distribution(ChronicDiseaseRisk.objects.all(), 'risk_score')
+
+    total_contracts = contracts['total']
+    average_value = contracts['total_premium'] / total_contracts if total_contracts > 0 else 0
+
+    return {
+        'total_customers': customers['total'],
+        'active_customers': customers['active'],
+        'total_contracts': total_contracts,
+        'active_contracts': contracts['active'],
+        'average_contract_value': average_value,
+        'retention_rate': 95,  # 示例数据
+        'business_distribution': contracts['business_distribution'],
+        'duration_distribution': contracts['duration_distribution'],
+        'status_distribution': contracts['status_distribution'],
+        'risk_distribution': as_percentages(risk),
+        'growth_trend': customers['growth_trend'],
+    }
+
+
+def sentiment_trend(queryset, field, days=DEFAULT_TREND_DAYS, bucket='day'):
+    """
+    Average sentiment per day/week/month over the last `days` days.
+    One GROUP BY query regardless of window size; empty buckets are omitted.
+    """
+    since = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    since -= timedelta(days=days - 1)
+
+    rows = (
+        queryset.filter(**{f'{field}__gte': since})
+        .annotate(period=TREND_BUCKETS[bucket](field))
+        .values('period')
+        .annotate(score=Avg('sentiment_score'), count=Count('id'))
+        .order_by('period')
+    )
+
+    trend = []
+    for row in rows:
+        period = row['period']
+        if isinstance(period, datetime):
+            period = timezone.localtime(period).date() if timezone.is_aware(period) else period.date()
+        trend.append({
+            'date': period.strftime('%Y-%m-%d'),
+            'score': round(row['score'], 2),
+            'count': row['count']
+        })
+    return trend
+
+
+def ai_summary(days=DEFAULT_TREND_DAYS, bucket='day'):
+    """Everything ai_analytics needs; `days`/`bucket` shape the sentiment trends"""
+    feedback = CustomerFeedback.objects.aggregate(count=Count('id'), avg=Avg('sentiment_score'))
+    calls = CallRecord.objects.aggregate(count=Count('id'), avg=Avg('sentiment_score'))
+
+    risk = score_distribution(ChronicDiseaseRisk.objects.all(), 'risk_score')
+    churn = score_distribution(ChurnPrediction.objects.all(), 'churn_probability')
+
+    return {
+        'feedback_analytics': {
+            'total_feedbacks': feedback['count'],
+            'average_sentiment': round(feedback['avg'] or 0, 2),
+            'sentiment_trend': sentiment_trend(CustomerFeedback.objects.all(), 'created_at', days, bucket)
+        },
+        'call_analytics': {
+            'total_calls': calls['count'],
+            'average_sentiment': round(calls['avg'] or 0, 2),
+            'sentiment_trend': sentiment_trend(CallRecord.objects.all(), 'call_time', days, bucket)
+        },
+        'risk_analytics': {
+            'average_risk_score': round(risk['average'] or 0, 2),
+            'risk_distribution': as_percentages(risk, keys=('high', 'medium', 'low'))
+        },
+        'churn_analytics': {
+            'average_churn_probability': round(churn['average'] or 0, 2),
+            'churn_distribution': as_percentages(churn, keys=('high', 'medium', 'low'))
+        },
+        'trend_window': {
+            'days': days,
+            'bucket': bucket
+        }
+    }
+
+
+def contract_analytics():
+    """Everything ContractViewSet.analytics needs, in two queries"""
+    row = Contract.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='A')),
+        pending=Count('id', filter=Q(status='P')),
+        expired=Count('id', filter=Q(status='E')),
+        avg_duration=Avg('duration'),
+    )
+    total_premium = ContractPayment.objects.filter(contract__status='A').aggregate(
+        Sum('premium')
+    )['premium__sum'] or 0
+
+    total = row['total']
+
+    def share(key):
+        return round(row[key] / total * 100, 1) if total > 0 else 0
+
+    return {
+        'total_contracts': total,
+        'active_contracts': row['active'],
+        'total_premium': float(total_premium),  # Convert Decimal to float
+        'average_duration': float(row['avg_duration']) if row['avg_duration'] else 0,
+        'contract_distribution': {
+            'active': share('active'),
+            'pending': share('pending'),
+            'expired': share('expired')
+        }
+    }
+
+
+def _per_customer(queryset, customer_field, aggregate, output_field):
+    """Correlated subquery aggregating `queryset` rows that belong to the outer customer"""
+    return Subquery(
+        queryset.filter(**{customer_field: OuterRef('pk')})
+        .order_by()
+        .values(customer_field)
+        .annotate(value=aggregate)
+        .values('value')[:1],
+        output_field=output_field
+    )
+
+
+def with_customer_stats(queryset):
+    """
+    Annotate a Customer queryset with everything get_customer_stats returns.
+    Each statistic is a correlated subquery, so related rows never fan out
+    and the whole page is fetched in a single SQL statement.
+    """
+    contracts = Contract.objects.all()
+    feedback = CustomerFeedback.objects.all()
+    payments = ContractPayment.objects.all()
+    customer = 'account__customer'
+
+    return queryset.annotate(
+        stat_contracts_count=Coalesce(
+            _per_customer(contracts, customer, Count('id'), IntegerField()), 0),
+        stat_claims_count=Coalesce(
+            _per_customer(contracts.filter(status=CLAIMED_STATUS), customer, Count('id'), IntegerField()), 0),
+        stat_delayed_payments=Coalesce(
+            _per_customer(contracts.filter(status=DELAYED_STATUS), customer, Count('id'), IntegerField()), 0),
+        stat_total_coverage=Coalesce(
+            _per_customer(contracts, customer, Sum(Cast('coverage', FloatField())), FloatField()), 0.0),
+        stat_total_premium=Coalesce(
+            _per_customer(payments, 'contract__' + customer, Sum('premium'),
+                          DecimalField(max_digits=12, decimal_places=2)), 0, output_field=DecimalField()),
+        stat_avg_sentiment=_per_customer(feedback, 'customer', Avg('sentiment_score'), FloatField()),
+        stat_complaints_count=Coalesce(
+            _per_customer(feedback.filter(sentiment_score__lt=COMPLAINT_THRESHOLD), 'customer',
+                          Count('id'), IntegerField()), 0),
+    )
+
+
+def with_interaction_stats(queryset):
+    """Annotate a Customer queryset with feedback and call counts and call sentiment"""
+    calls = CallRecord.objects.all()
+    return queryset.annotate(
+        stat_feedback_count=Coalesce(
+            _per_customer(CustomerFeedback.objects.all(), 'customer', Count('id'), IntegerField()), 0),
+        stat_call_count=Coalesce(
+            _per_customer(calls, 'customer', Count('id'), IntegerField()), 0),
+        stat_avg_call_sentiment=_per_customer(calls, 'customer', Avg('sentiment_score'), FloatField()),
+    )
+
+
+def stats_from_annotations(customer):
+    """Build the stats dict from a customer fetched through with_customer_stats"""
+    contracts_count = customer.stat_contracts_count
+    total_premium = customer.stat_total_premium or 0
+    return {
+        'contracts_count': contracts_count,
+        'claims_count': customer.stat_claims_count,
+        'avg_sentiment': customer.stat_avg_sentiment if customer.stat_avg_sentiment is not None else DEFAULT_SENTIMENT,
+        'complaints_count': customer.stat_complaints_count,
+        'delayed_payments': customer.stat_delayed_payments,
+        'avg_premium': total_premium / contracts_count if contracts_count > 0 else 0,
+        'total_coverage': customer.stat_total_coverage or 0
+    }
+
+
+def customer_stats(customer_ids):
+    """Stats for many customers at once: {customer_id: stats}, one query"""
+    customers = with_customer_stats(
+        Customer.objects.select_related('customeridentity').filter(pk__in=customer_ids))
+    return {customer.pk: stats_from_annotations(customer) for customer in customers}
+
+
+snapshots.register('dashboard', dashboard_summary)
+snapshots.register('ai', ai_summary)
+snapshots.register('contracts', contract_analytics)
@@ -0,0 +1,135 @@
+from django.utils import timezone
+
+from . import analytics
+from .models import Customer, CustomerFeatures
+
+# The Customer model has no income/risk/family/employment columns yet, so the
+# models get the centre of their training distribution for those inputs.
+DEFAULT_FEATURES = {
+    'age': 45,
+    'income': 115000,
+    'risk_tolerance': 'medium',
+    'family_size': 3,
+    'employment_status': 'employed',
+}
+
+# CustomerFeatures columns rewritten by refresh_customer_features
+STORE_FIELDS = [
+    'dob', 'start_date', 'contracts_count', 'claims_count', 'delayed_payments',
+    'total_premium', 'total_coverage', 'feedback_count', 'avg_sentiment',
+    'complaints_count', 'call_count', 'avg_call_sentiment', 'updated_at',
+]
+
+REFRESH_CHUNK_SIZE = 1000
+
+
+def age_from_dob(dob, today):
+    if dob is None:
+        return DEFAULT_FEATURES['age']
+    return (today - dob).days / 365.25
+
+
+def customer_age(customer, today):
+    identity = getattr(customer, 'customeridentity', None)
+    return age_from_dob(identity.dob if identity is not None else None, today)
+
+
+def model_inputs(age, years_as_customer, stats):
+    """Model input dict as expected by PredictionService"""
+    return {
+        'age': age,
+        'income': DEFAULT_FEATURES['income'],
+        'years_as_customer': years_as_customer,
+        'num_products': stats['contracts_count'],
+        'total_claims': stats['claims_count'],
+        'avg_sentiment': stats['avg_sentiment'],
+        'num_complaints': stats['complaints_count'],
+        'payment_delay': stats['delayed_payments'],
+        'premium': float(stats['avg_premium']),
+        'coverage': float(stats['total_coverage']),
+        'risk_tolerance': DEFAULT_FEATURES['risk_tolerance'],
+        'family_size': DEFAULT_FEATURES['family_size'],
+        'employment_status': DEFAULT_FEATURES['employment_status'],
+    }
+
+
+def customer_features(customer, stats, today=None):
+    """
+    Model input dict for one customer, as expected by PredictionService.
+    `stats` is the dict returned by analytics.customer_stats / get_customer_stats.
+    """
+    today = today or timezone.now().date()
+    return model_inputs(customer_age(customer, today), (today - customer.start_date).days / 365, stats)
+
+
+def stats_from_store(features):
+    """The stats dict of analytics.stats_from_annotations, from a CustomerFeatures row"""
+    contracts_count = features.contracts_count
+    return {
+        'contracts_count': contracts_count,
+        'claims_count': features.claims_count,
+        'avg_sentiment': features.avg_sentiment if features.avg_sentiment is not None else analytics.DEFAULT_SENTIMENT,
+        'complaints_count': features.complaints_count,
+        'delayed_payments': features.delayed_payments,
+        'avg_premium': features.total_premium / contracts_count if contracts_count > 0 else 0,
+        'total_coverage': features.total_coverage,
+    }
+
+
+def features_from_store(features, today=None):
+    """Model input dict from a CustomerFeatures row; same values as customer_features()"""
+    today = today or timezone.now().date()
+    return model_inputs(age_from_dob(features.dob, today), (today - features.start_date).days / 365,
+                        stats_from_store(features))
+
+
+def refresh_customer_features(customer_ids):
+    """
+    Recompute the CustomerFeatures rows of `customer_ids` from the source tables:
+    one annotated query and one upsert. Returns the number of rows written.
+    """
+    customers = analytics.with_interaction_stats(analytics.with_customer_stats(
+        Customer.objects.select_related('customeridentity').filter(pk__in=list(customer_ids))))
+    now = timezone.now()
+    rows = []
+    for customer in customers:
+        identity = getattr(customer, 'customeridentity', None)
+        rows.append(CustomerFeatures(
+            customer_id=customer.pk,
+            dob=identity.dob if identity is not None else None,
+            start_date=customer.start_date,
+            contracts_count=customer.stat_contracts_count,
+            claims_count=customer.stat_claims_count,
+            delayed_payments=customer.stat_delayed_payments,
+            total_premium=customer.stat_total_premium or 0,
+            total_coverage=customer.stat_total_coverage or 0,
+            feedback_count=customer.stat_feedback_count,
+            avg_sentiment=customer.stat_avg_sentiment,
+            complaints_count=customer.stat_complaints_count,
+            call_count=customer.stat_call_count,
+            avg_call_sentiment=customer.stat_avg_call_sentiment,
+            updated_at=now,
+        ))
+    if rows:
+        CustomerFeatures.objects.bulk_create(rows, update_conflicts=True, unique_fields=['customer'],
+                                             update_fields=STORE_FIELDS)
+    return len(rows)
+
+
+def refresh_missing_features(queryset=None, chunk_size=REFRESH_CHUNK_SIZE):
+    """Build store rows for customers (in `queryset`, default all) that don't have one yet"""
+    queryset = Customer.objects.all() if queryset is None else queryset
+    missing = list(queryset.filter(customerfeatures__isnull=True).values_list('pk', flat=True))
+    for start in range(0, len(missing), chunk_size):
+        refresh_customer_features(missing[start:start + chunk_size])
+    return len(missing)
+
+
+def load_customer_features(customer_ids):
+    """{customer_id: CustomerFeatures} by primary key, building rows missing from the store"""
+    customer_ids = list(customer_ids)
+    rows = CustomerFeatures.objects.in_bulk(customer_ids)
+    missing = [pk for pk in customer_ids if pk not in rows]
+    if missing and refresh_customer_features(missing):
+        rows.update(CustomerFeatures.objects.in_bulk(missing))
+    return rows
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.ml.registry import ModelRegistry, active_version_fingerprint
+from core.models import MLModelVersion
+
+
+class Command(BaseCommand):
+    help = 'Make an MLModelVersion the active one for its model type (served without a restart)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model_type', choices=['DISEASE', 'CHURN', 'PRODUCT'])
+        parser.add_argument('version', help='MLModelVersion.version to activate')
+
+    def handle(self, *args, **options):
+        try:
+            # Loading it here first verifies the artifacts before any server switches to them
+            target = ModelRegistry().activate(options['model_type'], options['version'])
+        except MLModelVersion.DoesNotExist:
+            raise CommandError(f"No {options['model_type']} version {options['version']!r}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Activated {target.model_type} {target.version}; active set: {active_version_fingerprint()}'
+        ))
@@ -0,0 +1,84 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter, so nothing this process already imported is counted
+PROBE = r'''
+import json, os, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+setup_seconds = time.perf_counter() - started
+started = time.perf_counter()
+import core.views
+import_seconds = time.perf_counter() - started
+
+rss_kb = None
+try:
+    with open('/proc/self/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+except OSError:
+    import resource
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1)
+print(json.dumps({
+    'setup_seconds': setup_seconds,
+    'import_seconds': import_seconds,
+    'rss_mb': rss_kb / 1024,
+    'modules': sorted({name.split('.')[0] for name in sys.modules}),
+}))
+'''
+
+DEFAULT_BUDGET = {'IMPORT_SECONDS': 1.0, 'RSS_MB': 150, 'LAZY_MODULES': []}
+
+
+class Command(BaseCommand):
+    help = ('Measure `import core.views` time and RSS in fresh interpreters and fail if either, '
+            'or an eagerly imported ML module, is over STARTUP_BUDGET')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to time (median is reported)')
+        parser.add_argument('--max-seconds', type=float, default=None,
+                            help="Import time budget (default: STARTUP_BUDGET['IMPORT_SECONDS'])")
+        parser.add_argument('--max-rss-mb', type=float, default=None,
+                            help="Resident memory budget (default: STARTUP_BUDGET['RSS_MB'])")
+
+    def probe(self):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+        result = subprocess.run([sys.executable, '-c', PROBE], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f'Importing core.views failed:\n{result.stderr}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        budget = {**DEFAULT_BUDGET, **getattr(settings, 'STARTUP_BUDGET', {})}
+        max_seconds = options['max_seconds'] or budget['IMPORT_SECONDS']
+        max_rss = options['max_rss_mb'] or budget['RSS_MB']
+
+        runs = [self.probe() for _ in range(max(1, options['runs']))]
+        setup_seconds = statistics.median(run['setup_seconds'] for run in runs)
+        import_seconds = statistics.median(run['import_seconds'] for run in runs)
+        rss_mb = max(run['rss_mb'] for run in runs)
+        eager = sorted(set(budget['LAZY_MODULES']).intersection(runs[0]['modules']))
+
+        self.stdout.write(f'django.setup(): {setup_seconds:.3f}s (median of {len(runs)})')
+        self.stdout.write(f'import core.views: {import_seconds:.3f}s (budget {max_seconds}s)')
+        self.stdout.write(f'RSS: {rss_mb:.1f} MB (budget {max_rss} MB)')
+
+        failures = []
+        if import_seconds > max_seconds:
+            failures.append(f'import core.views took {import_seconds:.3f}s > {max_seconds}s')
+        if rss_mb > max_rss:
+            failures.append(f'RSS {rss_mb:.1f} MB > {max_rss} MB')
+        if eager:
+            failures.append(f"imported at startup but should be lazy: {', '.join(eager)}")
+        if failures:
+            raise CommandError('; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Startup within budget'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.ml.compression import MODELS
+from core.models.analytics_models import MLModelVersion
+from core.tasks import compress_model
+
+STATS = [('trees', 'trees'), ('nodes', 'nodes'), ('pickle_bytes', 'pickle bytes'), ('forest_bytes', 'forest bytes'),
+         ('load_ms', 'load ms'), ('p99_ms', 'p99 ms'), ('score', 'score')]
+
+
+class Command(BaseCommand):
+    help = 'Prune, depth-cap or distill a trained forest within a metric tolerance and register it as a new version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model_type', choices=list(MODELS))
+        parser.add_argument('--version', default=None, help='Version to compress (default: the active one)')
+        parser.add_argument('--tolerance', type=float, default=None,
+                            help="Largest allowed metric drop (default: ML_COMPRESSION['TOLERANCE'])")
+        parser.add_argument('--activate', action='store_true', help='Activate the compressed version')
+
+    def handle(self, *args, **options):
+        try:
+            version, report = compress_model(options['model_type'], version=options['version'],
+                                             tolerance=options['tolerance'], activate=options['activate'])
+        except (MLModelVersion.DoesNotExist, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'':<14}{'before':>12}{'after':>12}")
+        for key, label in STATS:
+            self.stdout.write(f"{label:<14}{report['before'][key]:>12}{report['after'][key]:>12}")
+        state = 'active' if version.is_active else 'inactive'
+        self.stdout.write(self.style.SUCCESS(
+            f"{version.version} ({state}): {report['method']} {report['params']}, "
+            f"{report['metric']} within {report['tolerance']}"))
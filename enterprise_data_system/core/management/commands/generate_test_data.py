@@ -104,6 +104,7 @@ class Command(BaseCommand):
 
             # Create account
             account = Account.objects.create(
+                customer=customer,
                 name=f"{customer.first_name} {customer.last_name} Account",
                 company_code=1000 + i,
                 tax_id=generate_ssn(),
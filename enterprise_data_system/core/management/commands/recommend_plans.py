@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from core.recommendations import recommend_plans, DEFAULT_TOP_N, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Recompute the top-N plan recommendations of every active customer from contract co-occurrence'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=DEFAULT_TOP_N, help='Plans recommended per customer')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Customers written per transaction')
+
+    def handle(self, *args, **options):
+        summary = recommend_plans(top_n=options['top_n'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {summary['recommendations']} recommendations over {summary['plans']} plans "
+            f"for {summary['customers']} customers in {summary['seconds']}s"
+        ))
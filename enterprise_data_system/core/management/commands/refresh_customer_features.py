@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from core.features import refresh_customer_features, refresh_missing_features, REFRESH_CHUNK_SIZE
+from core.models import Customer
+
+
+class Command(BaseCommand):
+    help = 'Build the CustomerFeatures store (backfill), or rebuild it from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every row, not just customers missing from the store')
+        parser.add_argument('--chunk-size', type=int, default=REFRESH_CHUNK_SIZE,
+                            help='Customers recomputed per query')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if not options['all']:
+            count = refresh_missing_features(chunk_size=chunk_size)
+            self.stdout.write(self.style.SUCCESS(f'Added {count} customers to the feature store'))
+            return
+
+        count = 0
+        chunk = []
+        for pk in Customer.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=chunk_size):
+            chunk.append(pk)
+            if len(chunk) >= chunk_size:
+                count += refresh_customer_features(chunk)
+                chunk = []
+                self.stdout.write(f'  {count} customers refreshed')
+        if chunk:
+            count += refresh_customer_features(chunk)
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {count} customers in the feature store'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from core.ml.registry import ModelRegistry
+from core.quotes import requote_portfolio, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Re-quote all active contracts using vectorized portfolio pricing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Contracts priced per chunk (bounds memory)')
+        parser.add_argument('--base-premium', type=float, default=None,
+                            help='Price every contract from this premium instead of its current one')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Re-quoting portfolio...')
+
+        summary = requote_portfolio(
+            ModelRegistry().service(),
+            chunk_size=options['chunk_size'],
+            base_premium=options['base_premium'],
+            progress=lambda n: self.stdout.write(f'  {n} contracts quoted'),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Quoted {summary['quotes']} contracts in {summary['seconds']}s "
+            f"({summary['quotes_per_second']} quotes/sec)"
+        ))
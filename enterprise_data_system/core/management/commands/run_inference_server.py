@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.ml.inference_server import InferenceBackend, make_server
+from core.serving import build_prediction_cache, build_model_registry, build_coalescer
+
+
+class Command(BaseCommand):
+    help = 'Serve PredictionService to the web workers over a Unix socket or localhost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', default=None,
+                            help="'unix:/path/to.sock' or '127.0.0.1:8765' (default: INFERENCE_SERVER['ADDRESS'])")
+        parser.add_argument('--no-preload', action='store_true',
+                            help='Load models on the first request instead of at startup')
+
+    def handle(self, *args, **options):
+        address = options['address'] or getattr(settings, 'INFERENCE_SERVER', {}).get('ADDRESS')
+        registry = build_model_registry(build_prediction_cache())
+        if not options['no_preload']:
+            registry.service()
+
+        backend = InferenceBackend(registry.service, coalescer=build_coalescer(registry.service))
+        server = make_server(address, backend)
+        self.stdout.write(self.style.SUCCESS(f'Inference server listening on {address}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if backend.coalescer is not None:
+                backend.coalescer.close()
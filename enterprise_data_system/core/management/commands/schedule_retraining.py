@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from core.retraining import run_scheduled_retraining
+
+
+class Command(BaseCommand):
+    help = 'Retrain the models whose pending data updates crossed the ML_RETRAINING thresholds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report pending updates without training')
+
+    def handle(self, *args, **options):
+        summary = run_scheduled_retraining(dry_run=options['dry_run'])
+        for table, pending in summary['tables'].items():
+            self.stdout.write(f"{table}: {pending['rows']} pending rows since {pending['oldest']:%Y-%m-%d %H:%M}")
+        for model_type, status in summary['models'].items():
+            state = 'due' if status['due'] else 'waiting'
+            self.stdout.write(f"{model_type}: {state}, {status['rows']} rows ({status['reason']})")
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Retrained {', '.join(summary['trained']) or 'nothing'}; cleared {summary['cleared']} log rows"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from core.ml.incremental import INCREMENTAL_MODELS
+from core.ml.training import MODEL_TYPES
+from core.tasks import train_incremental, train_models
+
+
+class Command(BaseCommand):
+    help = 'Train the disease, churn and recommendation models concurrently and activate them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', choices=MODEL_TYPES, default=MODEL_TYPES)
+        parser.add_argument('--cpu-budget', type=int, default=None,
+                            help="Cores shared by all models (default: ML_TRAINING['CPU_BUDGET'])")
+        parser.add_argument('--samples', type=int, default=None, help='Synthetic training rows')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--data', default=None, help='Train on data written by train_models.py --write-data')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Out-of-core training of disease/churn from --data or the feature store')
+        parser.add_argument('--refresh', action='store_true',
+                            help='Continue the active incremental versions from rows updated since they were created')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows per chunk with --incremental')
+
+    def handle(self, *args, **options):
+        if options['incremental'] or options['refresh']:
+            return self.handle_incremental(options)
+        jobs = train_models(options['models'], cpu_budget=options['cpu_budget'], n_samples=options['samples'],
+                            seed=options['seed'], data_path=options['data'])
+        for model_type, job in jobs.items():
+            if job.status != 'COMPLETED':
+                self.stdout.write(self.style.ERROR(f'{model_type}: {job.error_message}'))
+                continue
+            timings = ', '.join(f'{stage} {seconds}s' for stage, seconds in job.metrics['timings'].items())
+            self.stdout.write(self.style.SUCCESS(f'{model_type}: n_jobs={job.metrics["n_jobs"]}, {timings}'))
+
+    def handle_incremental(self, options):
+        for model_type in options['models']:
+            if model_type not in INCREMENTAL_MODELS:
+                self.stdout.write(self.style.WARNING(f'{model_type}: no incremental mode, skipped'))
+                continue
+            job = train_incremental(model_type, refresh=options['refresh'], data_path=options['data'],
+                                    chunk_size=options['chunk_size'])
+            if job is None:
+                self.stdout.write(f'{model_type}: no new rows since the active version')
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'{model_type}: {job.metrics["mode"]} on {job.metrics["rows"]} rows, fit {job.metrics["timings"]["fit"]}s'))
@@ -0,0 +1,52 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.ml import tuning
+from core.ml.training import MODEL_TYPES
+from core.tasks import promote_tuned
+
+
+class Command(BaseCommand):
+    help = ('Cross-validated forest hyperparameter search scored on quality and inference latency; '
+            'prints the Pareto frontier and can promote a candidate to a model version')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', choices=MODEL_TYPES, default=MODEL_TYPES)
+        parser.add_argument('--samples', type=int, default=tuning.DEFAULT_SAMPLES, help='Synthetic training rows')
+        parser.add_argument('--folds', type=int, default=tuning.DEFAULT_FOLDS)
+        parser.add_argument('--seed', type=int, default=tuning.DEFAULT_SEED)
+        parser.add_argument('--data', default=None, help='Tune on data written by train_models.py --write-data')
+        parser.add_argument('--cpu-budget', type=int, default=None,
+                            help="Parallel fits (default: ML_TRAINING['CPU_BUDGET'] or all cores)")
+        parser.add_argument('--report', default=None, help='JSON report written by the search, read by --promote')
+        parser.add_argument('--promote', nargs='+', default=None, metavar='CANDIDATE',
+                            help='Train and activate these candidate ids (e.g. CHURN-3) from --report')
+
+    def handle(self, *args, **options):
+        cpu_budget = options['cpu_budget'] or getattr(settings, 'ML_TRAINING', {}).get('CPU_BUDGET')
+        if options['promote']:
+            return self.handle_promote(options, cpu_budget)
+
+        report = tuning.tune(options['models'], n_samples=options['samples'], n_folds=options['folds'],
+                             seed=options['seed'], data_path=options['data'], cpu_budget=cpu_budget)
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2)
+        self.stdout.write(tuning.format_frontier(report))
+        self.stdout.write(self.style.SUCCESS(f"Searched in {report['wall_seconds']}s"))
+
+    def handle_promote(self, options, cpu_budget):
+        if not options['report']:
+            raise CommandError('--promote needs the --report of a previous search')
+        with open(options['report']) as f:
+            report = json.load(f)
+        try:
+            jobs = promote_tuned(report, options['promote'], cpu_budget=cpu_budget)
+        except (KeyError, ValueError) as e:
+            raise CommandError(str(e))
+        for model_type, job in jobs.items():
+            if job.status != 'COMPLETED':
+                self.stdout.write(self.style.ERROR(f'{model_type}: {job.error_message}'))
+                continue
+            self.stdout.write(self.style.SUCCESS(f'{model_type}: activated with {job.metrics["params"]}'))
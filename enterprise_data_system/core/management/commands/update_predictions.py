@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from core.recommendations import recommend_plans, DEFAULT_TOP_N
+from core.scoring import score_customers, DEFAULT_CHUNK_SIZE, DEFAULT_WORKERS
+
+
+class Command(BaseCommand):
+    help = 'Score all active customers (disease, churn) and recompute their plan recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Customers scored per chunk (bounds memory)')
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                            help='Scoring processes; 1 scores in this process')
+        parser.add_argument('--top-n', type=int, default=DEFAULT_TOP_N, help='Plans recommended per customer')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Scoring customers...')
+
+        summary = score_customers(
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            progress=lambda n, rate: self.stdout.write(f'  {n} customers scored ({rate:.1f} rows/sec)'),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {summary['customers']} customers in {summary['seconds']}s "
+            f"({summary['rows_per_second']} rows/sec, {summary['workers']} workers)"
+        ))
+
+        self.stdout.write('Recommending plans...')
+        summary = recommend_plans(top_n=options['top_n'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {summary['recommendations']} recommendations over {summary['plans']} plans "
+            f"for {summary['customers']} customers in {summary['seconds']}s"
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.9 on 2026-10-18 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_remove_account_customer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='customer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='accounts', to='core.customer'),
+        ),
+    ]
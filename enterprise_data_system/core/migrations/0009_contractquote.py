@@ -0,0 +1,32 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_account_customer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractQuote',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('base_premium', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('disease_risk', models.FloatField()),
+                ('churn_probability', models.FloatField()),
+                ('risk_factor', models.FloatField()),
+                ('loyalty_discount', models.FloatField()),
+                ('final_premium', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quoted_at', models.DateTimeField()),
+                ('contract', models.ForeignKey(db_column='contract_id', on_delete=django.db.models.deletion.CASCADE, to='core.contract')),
+            ],
+            options={
+                'db_table': 'contractquote',
+                'indexes': [models.Index(fields=['quoted_at'], name='idx_quote_date')],
+            },
+        ),
+    ]
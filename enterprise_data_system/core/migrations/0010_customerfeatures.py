@@ -0,0 +1,36 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_contractquote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerFeatures',
+            fields=[
+                ('customer', models.OneToOneField(db_column='customer_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='core.customer')),
+                ('dob', models.DateField(null=True)),
+                ('start_date', models.DateField()),
+                ('contracts_count', models.IntegerField(default=0)),
+                ('claims_count', models.IntegerField(default=0)),
+                ('delayed_payments', models.IntegerField(default=0)),
+                ('total_premium', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_coverage', models.FloatField(default=0)),
+                ('feedback_count', models.IntegerField(default=0)),
+                ('avg_sentiment', models.FloatField(null=True)),
+                ('complaints_count', models.IntegerField(default=0)),
+                ('call_count', models.IntegerField(default=0)),
+                ('avg_call_sentiment', models.FloatField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'customerfeatures',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_customerfeatures'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productrecommendation',
+            index=models.Index(fields=['customer', '-recommendation_score'], name='idx_recommendation_customer'),
+        ),
+    ]
@@ -0,0 +1,195 @@
+"""
+Approximate nearest-neighbour index for ProdRecModel.
+
+IVFIndex buckets vectors by their nearest k-means centroid (an inverted
+file); a query only scans the n_probe buckets whose centroids are closest,
+so n_probe trades recall for latency, and n_probe == n_lists is an exact
+search. Buckets are stored contiguously in one array, so a batch of queries
+is answered with one matrix product per probed bucket rather than one tree
+walk per query. Vectors can be added and removed without retraining the
+centroids, and the index saves to a single .npz of plain arrays.
+"""
+import numpy as np
+
+# Upper bound on query x bucket distance blocks, in elements
+MAX_BLOCK = 1 << 22
+
+
+def _sq_distances(Q, q_norms, V, v_norms):
+    D = q_norms[:, np.newaxis] - 2 * (Q @ V.T) + v_norms
+    return np.maximum(D, 0, out=D)
+
+
+def _nearest_centroid(X, centroids):
+    c_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(X), dtype=np.intp)
+    step = max(1, MAX_BLOCK // max(len(centroids), 1))
+    for start in range(0, len(X), step):
+        block = X[start:start + step]
+        # ||x||^2 doesn't change the argmin
+        labels[start:start + step] = np.argmin(c_norms - 2 * (block @ centroids.T), axis=1)
+    return labels
+
+
+class IVFIndex:
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, sample_size=100000, seed=42):
+        """
+        n_lists: number of buckets; None picks ~sqrt(n) when trained
+        n_probe: buckets scanned per query (recall/latency knob, can be changed at any time)
+        n_iter / sample_size: k-means iterations and rows the centroids are trained on
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.sample_size = sample_size
+        self.seed = seed
+        self.centroids = None
+        self.vectors = None
+        self.norms = None
+        self.ids = None
+        self.offsets = None
+        self.next_id = 0
+
+    def __len__(self):
+        return 0 if self.ids is None else len(self.ids)
+
+    def train(self, X):
+        """k-means centroids from a sample of X; the index itself stays empty"""
+        X = np.asarray(X, dtype=np.float32)
+        rng = np.random.default_rng(self.seed)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(X))))
+        n_lists = min(n_lists, len(X))
+        sample = X[rng.choice(len(X), min(len(X), self.sample_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            labels = _nearest_centroid(sample, centroids)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.stack([np.bincount(labels, weights=sample[:, j], minlength=n_lists)
+                             for j in range(sample.shape[1])], axis=1)
+            filled = counts > 0
+            # Empty buckets keep their previous centroid
+            centroids[filled] = (sums[filled] / counts[filled, np.newaxis]).astype(np.float32)
+
+        self.n_lists = n_lists
+        self.centroids = centroids
+        self.vectors = np.empty((0, X.shape[1]), dtype=np.float32)
+        self.norms = np.empty(0, dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        return self
+
+    def add(self, X, ids=None):
+        """Insert vectors into their buckets; ids default to consecutive integers. Returns the ids."""
+        if self.centroids is None:
+            raise ValueError("train() the index first")
+        X = np.asarray(X, dtype=np.float32)
+        if ids is None:
+            ids = np.arange(self.next_id, self.next_id + len(X), dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        self.next_id = max(self.next_id, int(ids.max()) + 1) if len(ids) else self.next_id
+
+        labels = _nearest_centroid(X, self.centroids)
+        order = np.argsort(labels, kind='stable')
+        labels = labels[order]
+        # Each new vector goes at the end of its bucket
+        positions = self.offsets[labels + 1]
+        self.vectors = np.insert(self.vectors, positions, X[order], axis=0)
+        self.norms = np.insert(self.norms, positions, np.einsum('ij,ij->i', X[order], X[order]))
+        self.ids = np.insert(self.ids, positions, ids[order])
+        self.offsets[1:] += np.cumsum(np.bincount(labels, minlength=self.n_lists))
+        return ids
+
+    def remove(self, ids):
+        """Drop vectors by id; returns how many were removed"""
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            labels = np.repeat(np.arange(self.n_lists), np.diff(self.offsets))[keep]
+            self.vectors = self.vectors[keep]
+            self.norms = self.norms[keep]
+            self.ids = self.ids[keep]
+            self.offsets[1:] = np.cumsum(np.bincount(labels, minlength=self.n_lists))
+        return removed
+
+    def fit(self, X):
+        """train() + add(), so the index can stand in for NearestNeighbors"""
+        self.train(X)
+        self.add(X)
+        return self
+
+    def search(self, Q, k, n_probe=None):
+        """
+        (squared distances, ids) of the k nearest indexed vectors of each row
+        of Q, nearest first; rows with fewer than k candidates are padded with
+        inf / -1.
+        """
+        Q = np.asarray(Q, dtype=np.float32)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        q_norms = np.einsum('ij,ij->i', Q, Q)
+        best_d = np.full((len(Q), k), np.inf, dtype=np.float32)
+        best_i = np.full((len(Q), k), -1, dtype=np.int64)
+
+        c_dist = _sq_distances(Q, q_norms, self.centroids,
+                               np.einsum('ij,ij->i', self.centroids, self.centroids))
+        if n_probe < self.n_lists:
+            probe = np.argpartition(c_dist, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probe = np.broadcast_to(np.arange(self.n_lists), (len(Q), self.n_lists))
+
+        # Group (query, bucket) pairs by bucket: one distance block per bucket
+        pair_lists = probe.ravel()
+        pair_queries = np.repeat(np.arange(len(Q)), n_probe)
+        order = np.argsort(pair_lists, kind='stable')
+        pair_lists, pair_queries = pair_lists[order], pair_queries[order]
+        bounds = np.flatnonzero(np.diff(pair_lists)) + 1
+        for queries, bucket in zip(np.split(pair_queries, bounds), pair_lists[np.r_[0, bounds]]):
+            start, end = self.offsets[bucket], self.offsets[bucket + 1]
+            if start == end:
+                continue
+            step = max(1, MAX_BLOCK // (end - start))
+            for q_start in range(0, len(queries), step):
+                qs = queries[q_start:q_start + step]
+                D = _sq_distances(Q[qs], q_norms[qs], self.vectors[start:end], self.norms[start:end])
+                cand_d = np.concatenate([best_d[qs], D], axis=1)
+                cand_i = np.concatenate([best_i[qs], np.broadcast_to(self.ids[start:end], D.shape)], axis=1)
+                if cand_d.shape[1] > k:
+                    top = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+                    cand_d = np.take_along_axis(cand_d, top, axis=1)
+                    cand_i = np.take_along_axis(cand_i, top, axis=1)
+                best_d[qs] = cand_d
+                best_i[qs] = cand_i
+
+        order = np.argsort(best_d, axis=1, kind='stable')
+        return np.take_along_axis(best_d, order, axis=1), np.take_along_axis(best_i, order, axis=1)
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True, n_probe=None):
+        """NearestNeighbors.kneighbors equivalent: Euclidean distances and ids, batched"""
+        sq_dist, ids = self.search(X, n_neighbors or 5, n_probe)
+        if not return_distance:
+            return ids
+        return np.sqrt(sq_dist), ids
+
+    def save(self, path):
+        np.savez(
+            path,
+            centroids=self.centroids,
+            vectors=self.vectors,
+            norms=self.norms,
+            ids=self.ids,
+            offsets=self.offsets,
+            params=np.array([self.n_probe, self.next_id, self.n_iter, self.sample_size, self.seed], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            n_probe, next_id, n_iter, sample_size, seed = (int(v) for v in data['params'])
+            index = cls(n_lists=len(data['centroids']), n_probe=n_probe, n_iter=n_iter,
+                        sample_size=sample_size, seed=seed)
+            index.centroids = data['centroids']
+            index.vectors = data['vectors']
+            index.norms = data['norms']
+            index.ids = data['ids']
+            index.offsets = data['offsets']
+            index.next_id = next_id
+        return index
@@ -0,0 +1,120 @@
+"""
+Pickle-free model artifacts: a directory of raw .npy arrays plus manifest.json.
+
+The manifest records what the artifact is ('kind'), the input feature schema,
+small JSON metadata, and the dtype, shape and sha256 of every array, with a
+checksum over all of them. Arrays are loaded with np.load(mmap_mode='r'):
+nothing is unpickled, loading costs the same however many trees a model has,
+and processes that load the same artifact share its pages through the OS
+page cache instead of each holding a private copy.
+
+An artifact is written to a temporary sibling directory and renamed into
+place, so readers never see a half-written one.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+
+def is_artifact(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _checksum(entries):
+    digest = hashlib.sha256()
+    for name in sorted(entries):
+        digest.update(f"{name}:{entries[name]['sha256']}".encode())
+    return digest.hexdigest()
+
+
+def save_artifact(path, kind, arrays, features=None, meta=None):
+    """
+    Write `arrays` ({name: ndarray}) as <name>.npy files under `path`, replacing
+    any artifact already there. `features` is the input schema (list of names,
+    or {name: description}); `meta` must be JSON-serialisable. Returns the manifest.
+    """
+    tmp = f'{path.rstrip(os.sep)}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    entries = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise ValueError(f"Array {name!r} has dtype object, which can't be stored without pickle")
+        filename = f'{name}.npy'
+        np.save(os.path.join(tmp, filename), array, allow_pickle=False)
+        entries[name] = {
+            'file': filename,
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'sha256': _sha256(os.path.join(tmp, filename)),
+        }
+    manifest = {
+        'format': FORMAT_VERSION,
+        'kind': kind,
+        'features': features,
+        'meta': meta or {},
+        'arrays': entries,
+        'checksum': _checksum(entries),
+    }
+    with open(os.path.join(tmp, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp, path)
+    return manifest
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def load_artifact(path, kind=None, mmap=True, verify=True):
+    """
+    ({name: array}, manifest) of the artifact at `path`. Arrays are read-only
+    memory maps unless mmap=False. verify checks every file against its sha256
+    (this reads each file once, which also warms the page cache).
+    """
+    manifest = read_manifest(path)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format {manifest.get('format')!r} in {path}")
+    if kind is not None and manifest['kind'] != kind:
+        raise ValueError(f"{path} holds a {manifest['kind']!r} artifact, not {kind!r}")
+    entries = manifest['arrays']
+    if verify:
+        if _checksum(entries) != manifest['checksum']:
+            raise ValueError(f"Manifest checksum mismatch in {path}")
+        for name, entry in entries.items():
+            if _sha256(os.path.join(path, entry['file'])) != entry['sha256']:
+                raise ValueError(f"Checksum mismatch for {name!r} in {path}")
+
+    arrays = {}
+    for name, entry in entries.items():
+        array = np.load(os.path.join(path, entry['file']), mmap_mode='r' if mmap else None, allow_pickle=False)
+        if array.dtype.str != entry['dtype'] or list(array.shape) != entry['shape']:
+            raise ValueError(f"{name!r} in {path} doesn't match its manifest")
+        arrays[name] = array
+    return arrays, manifest
+
+
+def artifact_bytes(path):
+    """Size on disk of an artifact directory (or of a single file)"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
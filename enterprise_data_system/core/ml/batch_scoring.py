@@ -0,0 +1,40 @@
+"""
+Scoring side of the nightly prediction job (core/scoring.py).
+
+Kept free of Django imports so process pool workers can import it under any
+multiprocessing start method; each worker loads its own PredictionService
+once in the pool initializer.
+"""
+import numpy as np
+
+# |z-score| above which a model input is reported as a risk/contributing factor
+FACTOR_Z_THRESHOLD = 1.0
+
+_worker_service = None
+
+
+def init_worker(model_dir, model_dirs):
+    global _worker_service
+    from .predict import PredictionService
+    _worker_service = PredictionService(model_dir=model_dir, model_dirs=model_dirs)
+
+
+def factors(plan, X):
+    """Per row, the plan's features that are unusually far from the training mean"""
+    z = np.abs(plan.transform_frame(X))
+    return [[plan.features[j] for j in np.flatnonzero(row > FACTOR_Z_THRESHOLD)] for row in z]
+
+
+def score_frame(service, X):
+    """Disease and churn outputs for a feature DataFrame, one predict call per model"""
+    disease_probs, churn_probs = service.predict_risk_arrays(X)
+    return {
+        'disease': disease_probs,
+        'churn': churn_probs,
+        'disease_factors': factors(service.disease_plan, X),
+        'churn_factors': factors(service.churn_plan, X),
+    }
+
+
+def score_in_worker(X):
+    return score_frame(_worker_service, X)
@@ -0,0 +1,74 @@
+"""
+Recall and speed of the IVF index against the exact ball tree used by
+ProdRecModel, over a sweep of n_probe values.
+
+Run from the project root:
+    python -m core.ml.benchmark_ann [n_users] [n_queries]
+Exits non-zero if recall at the default n_probe is below MIN_RECALL.
+"""
+import sys
+import time
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+
+from .ann_index import IVFIndex
+from .train_models import generate_training_data
+
+FEATURES = ['age', 'income', 'num_products', 'avg_sentiment', 'years_as_customer',
+            'family_size', 'total_claims', 'premium']
+K = 5
+DEFAULT_N_PROBE = IVFIndex().n_probe
+MIN_RECALL = 0.9
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def recall(exact_ids, approx_ids):
+    """Fraction of the exact k nearest neighbours the approximate search found"""
+    hits = sum(len(np.intersect1d(e, a)) for e, a in zip(exact_ids, approx_ids))
+    return hits / exact_ids.size
+
+
+def benchmark(n_users=200000, n_queries=2000, n_probes=(1, 2, 4, 8, 16, 32), seed=0):
+    df = generate_training_data(n_samples=n_users + n_queries, seed=seed)
+    scaler = StandardScaler().fit(df[FEATURES])
+    X = scaler.transform(df[FEATURES]).astype(np.float32)
+    users, queries = X[:n_users], X[n_users:]
+
+    exact, exact_build = _timed(lambda: NearestNeighbors(n_neighbors=K, algorithm='ball_tree').fit(users))
+    (_, exact_ids), exact_query = _timed(lambda: exact.kneighbors(queries))
+    index, ivf_build = _timed(lambda: IVFIndex().fit(users))
+
+    print(f"{n_users} users, {n_queries} queries, k={K}, {index.n_lists} lists")
+    print(f"build: ball tree {exact_build:.2f}s, ivf {ivf_build:.2f}s")
+    print(f"{'index':<16}{'recall':>8}{'batch':>12}{'per query':>12}{'speedup':>9}")
+    print(f"{'ball tree':<16}{1.0:>8.3f}{exact_query * 1e3:>10.1f}ms"
+          f"{exact_query / n_queries * 1e6:>10.1f}us{1.0:>8.1f}x")
+
+    ok = True
+    for n_probe in n_probes:
+        (_, ids), seconds = _timed(lambda: index.search(queries, K, n_probe=n_probe))
+        r = recall(exact_ids, ids)
+        if n_probe == DEFAULT_N_PROBE:
+            ok = r >= MIN_RECALL
+        print(f"{f'ivf n_probe={n_probe}':<16}{r:>8.3f}{seconds * 1e3:>10.1f}ms"
+              f"{seconds / n_queries * 1e6:>10.1f}us{exact_query / seconds:>8.1f}x")
+
+    # Incremental update: index 1% more users without retraining the centroids
+    extra = scaler.transform(
+        generate_training_data(n_samples=n_users // 100, seed=seed + 1)[FEATURES]).astype(np.float32)
+    _, add_seconds = _timed(lambda: index.add(extra))
+    print(f"add {len(extra)} users: {add_seconds * 1e3:.1f}ms (full ivf rebuild {ivf_build * 1e3:.0f}ms)")
+    return ok
+
+
+if __name__ == '__main__':
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    sys.exit(0 if benchmark(n_users, n_queries) else 1)
@@ -0,0 +1,72 @@
+"""
+Parity and speed check for the flattened forests.
+
+Run from the project root after training:
+    python -m core.ml.benchmark_forests [n_rows]
+Exits non-zero if any flat forest output differs from sklearn's.
+"""
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+from .flat_forest import FlatForest, MODEL_DIR
+from .feature_vector import compile_pipeline
+from .predict import DISEASE_FEATURES, CHURN_FEATURES, RECOMMENDATION_FEATURES
+from .train_models import generate_training_data
+
+
+def _time_per_call(fn, X, repeat):
+    fn(X)  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def benchmark(n_rows=1000, repeat=50):
+    df = generate_training_data(n_samples=n_rows)
+
+    disease_model = joblib.load(os.path.join(MODEL_DIR, 'disease_model.pkl'))
+    disease_scaler = joblib.load(os.path.join(MODEL_DIR, 'disease_scaler.pkl'))
+    churn_model = joblib.load(os.path.join(MODEL_DIR, 'churn_model.pkl'))
+    churn_scaler = joblib.load(os.path.join(MODEL_DIR, 'churn_scaler.pkl'))
+    rec_pipeline = joblib.load(os.path.join(MODEL_DIR, 'recommendation_model.pkl'))
+    rec_plan, rec_model = compile_pipeline(rec_pipeline)
+
+    cases = [
+        ('disease', disease_model, 'predict_proba', disease_scaler.transform(df[DISEASE_FEATURES])),
+        ('churn', churn_model, 'predict_proba', churn_scaler.transform(df[CHURN_FEATURES])),
+        ('recommendation', rec_model, 'predict', rec_plan.transform_frame(df[RECOMMENDATION_FEATURES])),
+    ]
+
+    ok = True
+    print(f"{'model':<16}{'parity':<8}{'sk 1-row':>12}{'flat 1-row':>12}{'sk batch':>12}{'flat batch':>12}")
+    for name, model, method, X in cases:
+        flat = FlatForest.from_sklearn(model)
+        sk_fn = getattr(model, method)
+        flat_fn = getattr(flat, method)
+
+        parity = bool(np.array_equal(sk_fn(X), flat_fn(X)))
+        ok = ok and parity
+
+        one = X[:1]
+        sk_one = _time_per_call(sk_fn, one, repeat)
+        flat_one = _time_per_call(flat_fn, one, repeat)
+        sk_batch = _time_per_call(sk_fn, X, max(repeat // 10, 3))
+        flat_batch = _time_per_call(flat_fn, X, max(repeat // 10, 3))
+
+        print(f"{name:<16}{'ok' if parity else 'FAIL':<8}"
+              f"{sk_one * 1e3:>10.3f}ms{flat_one * 1e3:>10.3f}ms"
+              f"{sk_batch * 1e3:>10.2f}ms{flat_batch * 1e3:>10.2f}ms"
+              f"   (1-row speedup {sk_one / flat_one:.1f}x, batch of {len(X)} {sk_batch / flat_batch:.1f}x)")
+    return ok
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sys.exit(0 if benchmark(n_rows) else 1)
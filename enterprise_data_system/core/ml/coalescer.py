@@ -0,0 +1,144 @@
+"""
+Micro-batching for concurrent PredictionService calls.
+
+Callers block on score_all() while a single worker thread collects requests
+for up to `window_ms` milliseconds (or until `max_batch_size` rows) and runs
+one score_batch() over them, i.e. one predict call per model per batch.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCoalescer:
+    def __init__(self, service, window_ms=2.0, max_batch_size=64, history=1000):
+        """service: a PredictionService, or a callable returning the current one (ModelRegistry.service)"""
+        self.service = service
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Observability
+        self._batch_sizes = deque(maxlen=history)
+        self._batch_latencies = deque(maxlen=history)
+        self._queue_waits = deque(maxlen=history)
+        self._batches = 0
+        self._rows = 0
+        self._errors = 0
+
+        self._worker = threading.Thread(target=self._run, name='prediction-coalescer', daemon=True)
+        self._worker.start()
+
+    def _service(self):
+        return self.service() if callable(self.service) else self.service
+
+    def submit(self, customer_data):
+        """Queue one customer_data dict; returns a Future resolving to score_all()'s output"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("PredictionCoalescer is closed")
+            self._pending.append((customer_data, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def score_all(self, customer_data, timeout=None):
+        """Drop-in for PredictionService.score_all that rides on a shared batch"""
+        return self._service().cached('score_all', customer_data,
+                                   lambda: self.submit(customer_data).result(timeout))
+
+    def _collect(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return []
+            deadline = time.perf_counter() + self.window
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            size = min(len(self._pending), self.max_batch_size)
+            return [self._pending.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return  # closed and drained
+            try:
+                self._score(batch)
+            except Exception as e:
+                # e.g. the registry failed to load a model. This thread must
+                # survive: callers block on these futures without a timeout
+                logger.exception('Prediction batch of %d rows failed', len(batch))
+                self._fail(batch, e)
+
+    def _fail(self, batch, error):
+        for _, future, _ in batch:
+            if not future.done():
+                self._errors += 1
+                future.set_exception(error)
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        rows = [customer_data for customer_data, _, _ in batch]
+        service = self._service()
+        try:
+            results = service.score_batch(rows)
+        except Exception:
+            # One bad row shouldn't fail its neighbours: retry individually
+            logger.exception('Batched prediction failed, scoring %d rows individually', len(batch))
+            results = None
+
+        for i, (customer_data, future, queued_at) in enumerate(batch):
+            self._queue_waits.append(started - queued_at)
+            if results is not None:
+                future.set_result(results[i])
+                continue
+            try:
+                future.set_result(service.score_all(customer_data))
+            except Exception as e:
+                self._errors += 1
+                future.set_exception(e)
+
+        self._batch_latencies.append(time.perf_counter() - started)
+        self._batch_sizes.append(len(batch))
+        self._batches += 1
+        self._rows += len(batch)
+
+    def close(self):
+        """Stop accepting requests; queued ones are still scored"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+
+    def stats(self):
+        def ms(values, q):
+            return round(float(np.percentile(values, q)) * 1000, 3) if values else None
+
+        latencies = list(self._batch_latencies)
+        waits = list(self._queue_waits)
+        sizes = list(self._batch_sizes)
+        return {
+            'window_ms': self.window * 1000,
+            'max_batch_size': self.max_batch_size,
+            'batches': self._batches,
+            'rows': self._rows,
+            'errors': self._errors,
+            'queued': len(self._pending),
+            'avg_batch_size': round(sum(sizes) / len(sizes), 2) if sizes else 0,
+            'batch_latency_ms': {'p50': ms(latencies, 50), 'p99': ms(latencies, 99)},
+            'queue_wait_ms': {'p50': ms(waits, 50), 'p99': ms(waits, 99)},
+        }
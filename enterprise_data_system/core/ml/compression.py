@@ -0,0 +1,217 @@
+"""
+Post-training forest compression.
+
+A trained version's forest (the teacher) is replaced by the cheapest student
+whose held-out metric stays within `tolerance` of the teacher's. Students are
+built three ways:
+  prune:   the teacher's first n trees (forest trees are interchangeable)
+  depth:   the teacher's hyperparameters refitted with fewer, shallower trees
+  distill: a small forest fitted to the teacher's predictions instead of the
+           noisy labels
+Cost is the number of levels the flat forest walks per row (sum of tree
+depths), so the smallest-cost student is the fastest to serve. The student is
+written as a complete version directory (pickles plus flat-forest export) and
+the report compares artifact size, load time and p99 single-row latency of
+the served flat forest before and after.
+
+Kept free of Django imports; core.tasks.compress_model registers the result
+as its own MLModelVersion. Standalone, from the project root:
+    python -m core.ml.compression CHURN <version dir> <output dir> --tolerance 0.01
+"""
+import copy
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score, r2_score
+from sklearn.model_selection import train_test_split
+
+from .artifacts import artifact_bytes
+from .flat_forest import export_forests, forest_location, has_forest, load_forest
+from .predict import DISEASE_FEATURES, CHURN_FEATURES, RECOMMENDATION_FEATURES
+from .train_models import generate_training_data, read_training_data
+
+# model_type -> (artifact name, scaler pickle or None for a pipeline, features, target, metric)
+MODELS = {
+    'DISEASE': ('disease_model', 'disease_scaler.pkl', DISEASE_FEATURES, 'disease_risk', 'accuracy'),
+    'CHURN': ('churn_model', 'churn_scaler.pkl', CHURN_FEATURES, 'churn_risk', 'accuracy'),
+    'PRODUCT': ('recommendation_model', None, RECOMMENDATION_FEATURES, 'product_score', 'r2'),
+}
+
+DEFAULT_TOLERANCE = 0.01
+DEFAULT_SAMPLES = 10000
+TREE_COUNTS = (10, 25, 50, 100)
+DEPTHS = (4, 6, 8, 10)
+# Single-row predictions timed for the p99 latency
+LATENCY_ROWS = 1000
+LOAD_REPEAT = 5
+
+
+def _score(metric, y, y_pred):
+    return float(r2_score(y, y_pred) if metric == 'r2' else accuracy_score(y, y_pred))
+
+
+def _forest(model):
+    # The recommendation model is a Pipeline ending in the regressor
+    return model.steps[-1][1] if hasattr(model, 'steps') else model
+
+
+def _with_forest(model, forest):
+    if not hasattr(model, 'steps'):
+        return forest
+    model = copy.copy(model)
+    model.steps = model.steps[:-1] + [(model.steps[-1][0], forest)]
+    return model
+
+
+def cost(forest):
+    """Levels the flat forest walks per row: the sum of tree depths"""
+    return int(sum(tree.tree_.max_depth for tree in forest.estimators_))
+
+
+def prune(forest, n_trees):
+    """The forest's first n_trees trees as a forest of its own"""
+    pruned = copy.copy(forest)
+    pruned.estimators_ = forest.estimators_[:n_trees]
+    pruned.n_estimators = n_trees
+    return pruned
+
+
+def candidates(teacher, X_fit, y_fit, n_jobs=None):
+    """Yield (method, params, student forest), all smaller than `teacher`"""
+    n_trees = len(teacher.estimators_)
+    depth = max(tree.tree_.max_depth for tree in teacher.estimators_)
+    counts = [n for n in TREE_COUNTS if n < n_trees]
+    depths = [d for d in DEPTHS if d < depth]
+    for n in counts:
+        yield 'prune', {'n_estimators': n}, prune(teacher, n)
+
+    # Students learn the teacher's hard labels (classifier) or its scores (regressor)
+    y_teacher = teacher.predict(X_fit)
+    for method, y in (('depth', y_fit), ('distill', y_teacher)):
+        for n in counts + [n_trees]:
+            for d in depths:
+                params = {'n_estimators': n, 'max_depth': d}
+                student = clone(teacher).set_params(**params, n_jobs=n_jobs)
+                student.fit(X_fit, y)
+                student.n_jobs = None
+                yield method, params, student
+
+
+def _p99_ms(predict, X):
+    predict(X[:1])  # warm up
+    timings = np.empty(len(X))
+    for i in range(len(X)):
+        start = time.perf_counter()
+        predict(X[i:i + 1])
+        timings[i] = time.perf_counter() - start
+    return float(np.percentile(timings, 99) * 1e3)
+
+
+def artifact_stats(model_dir, name, X):
+    """Pickle and flat forest size, flat forest load time and p99 single-row latency"""
+    pickle_file = os.path.join(model_dir, f'{name}.pkl')
+    loads = []
+    for _ in range(LOAD_REPEAT):
+        start = time.perf_counter()
+        forest = load_forest(name, model_dir)
+        loads.append(time.perf_counter() - start)
+    predict = forest.predict_proba if forest.is_classifier else forest.predict
+    return {
+        'trees': forest.n_trees,
+        'nodes': int(len(forest.feature)),
+        'pickle_bytes': os.path.getsize(pickle_file),
+        'forest_bytes': artifact_bytes(forest_location(name, model_dir)),
+        'load_ms': round(float(np.median(loads)) * 1e3, 3),
+        'p99_ms': round(_p99_ms(predict, X[:LATENCY_ROWS]), 4),
+    }
+
+
+def compress(model_type, base_dir, output_dir, tolerance=DEFAULT_TOLERANCE, n_samples=DEFAULT_SAMPLES,
+             seed=None, data_path=None, n_jobs=None):
+    """
+    Write the cheapest student within `tolerance` of the teacher in `base_dir`
+    to `output_dir`. Data comes from `data_path` or is generated fresh, and is
+    split into a fitting part and a held-out part both are scored on.
+    Returns {'method', 'params', 'metric', 'tolerance', 'before', 'after', 'candidates'};
+    raises ValueError when the model isn't a forest or no student is within tolerance.
+    """
+    name, scaler_file, features, target, metric = MODELS[model_type]
+    model = joblib.load(os.path.join(base_dir, f'{name}.pkl'))
+    teacher = _forest(model)
+    if not hasattr(teacher, 'estimators_'):
+        # e.g. an incrementally trained (SGD) version
+        raise ValueError(f"The {model_type} model in {base_dir} is a {type(teacher).__name__}, not a forest")
+    if scaler_file:
+        preprocess = joblib.load(os.path.join(base_dir, scaler_file)).transform
+    else:
+        preprocess = model[:-1].transform
+
+    df = read_training_data(data_path) if data_path else generate_training_data(n_samples, seed=seed)
+    X = preprocess(df[features])
+    X_fit, X_test, y_fit, y_test = train_test_split(X, df[target].to_numpy(), test_size=0.2, random_state=42)
+    teacher_score = _score(metric, y_test, teacher.predict(X_test))
+
+    results = []
+    best = None
+    for method, params, student in candidates(teacher, X_fit, y_fit, n_jobs):
+        score = _score(metric, y_test, student.predict(X_test))
+        result = {'method': method, 'params': params, 'score': round(score, 4), 'cost': cost(student)}
+        results.append(result)
+        if score >= teacher_score - tolerance and (
+                best is None or (result['cost'], -score) < (best[0]['cost'], -best[0]['score'])):
+            best = result, student
+    if best is None:
+        raise ValueError(f"No compressed {model_type} model within {tolerance} {metric} of the teacher")
+    chosen, student = best
+
+    os.makedirs(output_dir, exist_ok=True)
+    for filename in os.listdir(base_dir):
+        # The flat forest is re-exported below; an older .forest.npz would be stale
+        if os.path.isfile(os.path.join(base_dir, filename)) and not filename.endswith('.forest.npz'):
+            shutil.copy2(os.path.join(base_dir, filename), output_dir)
+    joblib.dump(_with_forest(model, student), os.path.join(output_dir, f'{name}.pkl'))
+    export_forests(output_dir)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        before_dir = base_dir
+        if not has_forest(name, base_dir):
+            # The base version predates flat-forest exports
+            shutil.copy2(os.path.join(base_dir, f'{name}.pkl'), scratch)
+            export_forests(scratch)
+            before_dir = scratch
+        before = artifact_stats(before_dir, name, X_test)
+    after = artifact_stats(output_dir, name, X_test)
+    before.update(score=round(teacher_score, 4), cost=cost(teacher))
+    after.update(score=chosen['score'], cost=chosen['cost'])
+    return {
+        'method': chosen['method'],
+        'params': chosen['params'],
+        'metric': metric,
+        'tolerance': tolerance,
+        'before': before,
+        'after': after,
+        'candidates': results,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Compress a trained forest within a metric tolerance')
+    parser.add_argument('model_type', choices=list(MODELS))
+    parser.add_argument('base_dir', help='Version directory holding the trained model')
+    parser.add_argument('output_dir')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--data', default=None, help='Score on data written by train_models --write-data')
+    args = parser.parse_args()
+    report = compress(args.model_type, args.base_dir, args.output_dir, args.tolerance, args.samples,
+                      args.seed, args.data)
+    report.pop('candidates')
+    print(json.dumps(report, indent=2))
@@ -1,16 +1,25 @@
+"""
+Score the trained models on fresh synthetic (or --data) rows. From the project root:
+    python -m core.ml.evaluate_models --samples 2000
+"""
 import numpy as np
 import pandas as pd
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, r2_score
 from sklearn.model_selection import train_test_split
-from train_models import generate_training_data
 import joblib
 import os
 
+from .train_models import generate_training_data, read_training_data
+
 MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
 
-def evaluate_models():
-    print("Generating test data...")
-    df = generate_training_data(n_samples=2000)
+def evaluate_models(n_samples=2000, seed=None, data_path=None):
+    if data_path:
+        print(f"Loading test data from {data_path}...")
+        df = read_training_data(data_path)
+    else:
+        print("Generating test data...")
+        df = generate_training_data(n_samples=n_samples, seed=seed)
     
     # Evaluate Disease Risk Model
     print("\nEvaluating Disease Risk Model...")
@@ -66,4 +75,10 @@ def evaluate_models():
     print(f"R2 Score: {r2:.4f}")
 
 if __name__ == '__main__':
-    evaluate_models()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description='Evaluate the trained models on synthetic data')
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--data', default=None, help='Evaluate on data written by train_models --write-data')
+    args = parser.parse_args()
+    evaluate_models(n_samples=args.samples, seed=args.seed, data_path=args.data)
\ No newline at end of file
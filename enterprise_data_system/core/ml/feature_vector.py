@@ -0,0 +1,178 @@
+"""
+Compiled single-row feature path for PredictionService.
+
+A customer_data dict is written once into a NumPy row with a fixed column
+order; each model then gathers its columns by index and applies its scaler
+from precomputed mean/scale arrays. This reproduces StandardScaler,
+OneHotEncoder(drop='first') and ColumnTransformer output exactly, without
+building a DataFrame per call.
+"""
+import threading
+
+import numpy as np
+
+# Fixed order of every numeric input any model reads
+NUMERIC_COLUMNS = [
+    'age', 'income', 'years_as_customer', 'num_products', 'total_claims',
+    'avg_sentiment', 'num_complaints', 'payment_delay', 'premium', 'coverage',
+    'family_size',
+]
+COLUMN_INDEX = {name: i for i, name in enumerate(NUMERIC_COLUMNS)}
+
+
+class FeatureRow:
+    """Per-thread preallocated row that customer_data dicts are written into"""
+
+    def __init__(self, columns=NUMERIC_COLUMNS):
+        self.columns = list(columns)
+        self._local = threading.local()
+
+    def fill(self, customer_data):
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.empty(len(self.columns), dtype=np.float64)
+        for i, name in enumerate(self.columns):
+            value = customer_data.get(name)
+            row[i] = np.nan if value is None else float(value)
+        return row
+
+
+def _gather(row, idx, names):
+    values = row[idx]
+    if np.isnan(values).any():
+        missing = [name for name, v in zip(names, values) if np.isnan(v)]
+        raise KeyError(f"Missing features: {missing}")
+    return values
+
+
+class ScaledPlan:
+    """Column selection + StandardScaler for one model, as index and affine arrays"""
+
+    def __init__(self, features, scaler=None, mean=None, scale=None):
+        self.features = list(features)
+        self.idx = np.array([COLUMN_INDEX[name] for name in self.features], dtype=np.intp)
+        n = len(self.features)
+        if scaler is not None:
+            mean = getattr(scaler, 'mean_', None)
+            scale = getattr(scaler, 'scale_', None)
+        self.mean = np.zeros(n) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = np.ones(n) if scale is None else np.asarray(scale, dtype=np.float64)
+
+    def transform(self, row):
+        values = _gather(row, self.idx, self.features)
+        return ((values - self.mean) / self.scale).reshape(1, -1)
+
+    def transform_frame(self, X):
+        values = X[self.features].to_numpy(dtype=np.float64)
+        return (values - self.mean) / self.scale
+
+    def to_dict(self):
+        return {'features': self.features, 'mean': self.mean.tolist(), 'scale': self.scale.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['features'], mean=data['mean'], scale=data['scale'])
+
+
+class PipelinePlan:
+    """
+    ColumnTransformer(StandardScaler on numerics, OneHotEncoder on categoricals)
+    compiled into index/affine arrays plus per-column category -> slot maps.
+    """
+
+    def __init__(self, numeric, cat_columns, slots):
+        self.numeric = numeric
+        self.cat_columns = list(cat_columns)
+        self.slots = slots
+        self.width = len(numeric.features) + sum(
+            sum(1 for slot in slot_map.values() if slot is not None) for slot_map in slots)
+        self._local = threading.local()
+
+    @classmethod
+    def from_preprocessor(cls, preprocessor):
+        transformers = {name: (columns, transformer)
+                        for name, transformer, columns in preprocessor.transformers_}
+        num_columns, num_pipeline = transformers['num']
+        cat_columns, cat_pipeline = transformers['cat']
+
+        numeric = ScaledPlan(num_columns, num_pipeline.named_steps['scaler'])
+
+        onehot = cat_pipeline.named_steps['onehot']
+        drop_idx = getattr(onehot, 'drop_idx_', None)
+        slots = []
+        offset = len(numeric.features)
+        for i, categories in enumerate(onehot.categories_):
+            dropped = None if drop_idx is None or drop_idx[i] is None else int(drop_idx[i])
+            slot_map = {}
+            for j, category in enumerate(categories):
+                if j == dropped:
+                    slot_map[category] = None
+                else:
+                    slot_map[category] = offset
+                    offset += 1
+            slots.append(slot_map)
+        return cls(numeric, cat_columns, slots)
+
+    def _check_category(self, column, slot_map, value):
+        if value not in slot_map:
+            raise ValueError(f"Found unknown category {value!r} in column {column!r}")
+
+    def transform(self, row, customer_data):
+        out = getattr(self._local, 'out', None)
+        if out is None:
+            out = self._local.out = np.empty((1, self.width), dtype=np.float64)
+        n = len(self.numeric.features)
+        out[0, :n] = self.numeric.transform(row)[0]
+        out[0, n:] = 0.0
+        for column, slot_map in zip(self.cat_columns, self.slots):
+            value = customer_data[column]
+            self._check_category(column, slot_map, value)
+            slot = slot_map[value]
+            if slot is not None:
+                out[0, slot] = 1.0
+        return out
+
+    def transform_frame(self, X):
+        """Batch version of transform for a DataFrame with the pipeline's columns"""
+        out = np.zeros((len(X), self.width), dtype=np.float64)
+        n = len(self.numeric.features)
+        out[:, :n] = self.numeric.transform_frame(X)
+        rows = np.arange(len(X))
+        for column, slot_map in zip(self.cat_columns, self.slots):
+            values = X[column].to_numpy()
+            slots = np.empty(len(X), dtype=np.intp)
+            for i, value in enumerate(values):
+                self._check_category(column, slot_map, value)
+                slot = slot_map[value]
+                slots[i] = -1 if slot is None else slot
+            hit = slots >= 0
+            out[rows[hit], slots[hit]] = 1.0
+        return out
+
+    def to_dict(self):
+        return {
+            'numeric': self.numeric.to_dict(),
+            'cat_columns': self.cat_columns,
+            'slots': [[[str(category), slot] for category, slot in slot_map.items()]
+                      for slot_map in self.slots],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        slots = [{category: slot for category, slot in pairs} for pairs in data['slots']]
+        return cls(ScaledPlan.from_dict(data['numeric']), data['cat_columns'], slots)
+
+
+def compile_pipeline(pipeline):
+    """
+    PipelinePlan + final estimator for the recommendation pipeline, or None when
+    the pipeline doesn't have the expected preprocessor/regressor layout.
+    """
+    try:
+        preprocessor = pipeline.named_steps['preprocessor']
+        regressor = pipeline.named_steps['regressor']
+        if preprocessor.remainder != 'drop':
+            return None
+        return PipelinePlan.from_preprocessor(preprocessor), regressor
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
@@ -0,0 +1,275 @@
+"""
+Array-based random forest evaluator.
+
+A fitted RandomForestClassifier/Regressor is flattened into contiguous
+NumPy arrays (feature, threshold, left, right, value) with every tree's
+nodes concatenated. Evaluation walks all trees for all rows at once, one
+depth level per step, and reproduces sklearn's predict/predict_proba
+bit for bit (float32 inputs, per-tree normalisation, trees summed in order).
+
+Export after training, from the project root:
+    python -m core.ml.flat_forest
+"""
+import json
+import os
+
+import numpy as np
+
+from .artifacts import is_artifact, load_artifact, save_artifact
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
+
+# Forests exported by export_forests(): artifact name -> pickle holding the estimator
+FOREST_ARTIFACTS = {
+    'disease_model': 'disease_model.pkl',
+    'churn_model': 'churn_model.pkl',
+    'recommendation_model': 'recommendation_model.pkl',
+}
+
+# Scalers whose input columns are the feature schema of a forest trained on scaled arrays
+FOREST_SCALERS = {
+    'disease_model': 'disease_scaler.pkl',
+    'churn_model': 'churn_scaler.pkl',
+}
+
+
+def forest_path(name, model_dir=MODEL_DIR):
+    """Single-file export written before artifact directories; still loaded by load_forest()"""
+    return os.path.join(model_dir, f'{name}.forest.npz')
+
+
+def forest_dir(name, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f'{name}.forest')
+
+
+def plan_path(name, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f'{name}.plan.json')
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 classes=None, n_features=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.n_features = n_features
+
+    @property
+    def is_classifier(self):
+        return self.classes_ is not None
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Flatten a fitted sklearn RandomForestClassifier or RandomForestRegressor"""
+        is_classifier = hasattr(forest, 'classes_')
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests can be flattened")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            leaf = tree.children_left == -1
+
+            value = tree.value[:, 0, :].astype(np.float64)
+            if is_classifier:
+                # Same normalisation as DecisionTreeClassifier.predict_proba
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(leaf, -1, tree.children_left + offset))
+            rights.append(np.where(leaf, -1, tree.children_right + offset))
+            values.append(value)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            classes=forest.classes_ if is_classifier else None,
+            n_features=forest.n_features_in_,
+        )
+
+    def apply(self, X):
+        """Leaf node index (into the flat arrays) per row and tree, shape (n_rows, n_trees)"""
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+
+        # One slot per (row, tree); only slots still on an internal node are advanced
+        nodes = np.tile(self.roots, n_rows)
+        offsets = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, self.n_trees)
+        active = np.arange(nodes.size)
+        while active.size:
+            current = nodes[active]
+            left = self.left[current]
+            internal = left != -1
+            if not internal.all():
+                active, current, left = active[internal], current[internal], left[internal]
+                if not active.size:
+                    break
+            go_left = flat_X[offsets[active] + self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, left, self.right[current])
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def _mean_leaf_value(self, X):
+        leaves = self.apply(X)
+        leaf_values = self.value[leaves]  # (n_rows, n_trees, n_values)
+        # Accumulate tree by tree in estimator order, exactly like sklearn
+        total = np.zeros((leaf_values.shape[0], leaf_values.shape[2]), dtype=np.float64)
+        for t in range(leaf_values.shape[1]):
+            total += leaf_values[:, t, :]
+        total /= self.n_trees
+        return total
+
+    def predict_proba(self, X):
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._mean_leaf_value(X)
+
+    def predict(self, X):
+        out = self._mean_leaf_value(X)
+        if self.is_classifier:
+            return self.classes_[np.argmax(out, axis=1)]
+        return out[:, 0]
+
+    def to_arrays(self):
+        """({name: array}, JSON metadata) describing this forest"""
+        arrays = {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'left': self.left,
+            'right': self.right,
+            'value': self.value,
+            'roots': self.roots,
+        }
+        if self.is_classifier:
+            arrays['classes'] = self.classes_
+        return arrays, {'max_depth': self.max_depth, 'n_features': self.n_features}
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        return cls(
+            feature=arrays['feature'],
+            threshold=arrays['threshold'],
+            left=arrays['left'],
+            right=arrays['right'],
+            value=arrays['value'],
+            roots=arrays['roots'],
+            max_depth=int(meta['max_depth']),
+            classes=arrays.get('classes'),
+            n_features=int(meta['n_features']),
+        )
+
+    def save(self, path):
+        arrays, meta = self.to_arrays()
+        np.savez(path, max_depth=np.asarray(meta['max_depth']), n_features=np.asarray(meta['n_features']),
+                 **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        meta = {'max_depth': arrays.pop('max_depth'), 'n_features': arrays.pop('n_features')}
+        return cls.from_arrays(arrays, meta)
+
+    def save_artifact(self, path, features=None):
+        """Write as a memory-mappable artifact directory (see artifacts.py)"""
+        arrays, meta = self.to_arrays()
+        return save_artifact(path, 'flat_forest', arrays, features=features, meta=meta)
+
+    @classmethod
+    def load_artifact(cls, path, mmap=True, verify=True):
+        arrays, manifest = load_artifact(path, kind='flat_forest', mmap=mmap, verify=verify)
+        return cls.from_arrays(arrays, manifest['meta'])
+
+
+def load_forest(name, model_dir=MODEL_DIR):
+    """The exported forest `name`: its artifact directory, or the .forest.npz of older exports"""
+    if is_artifact(forest_dir(name, model_dir)):
+        return FlatForest.load_artifact(forest_dir(name, model_dir))
+    return FlatForest.load(forest_path(name, model_dir))
+
+
+def has_forest(name, model_dir=MODEL_DIR):
+    return is_artifact(forest_dir(name, model_dir)) or os.path.exists(forest_path(name, model_dir))
+
+
+def forest_location(name, model_dir=MODEL_DIR):
+    """Path of the exported forest load_forest() reads"""
+    path = forest_dir(name, model_dir)
+    return path if is_artifact(path) else forest_path(name, model_dir)
+
+
+def _final_estimator(model):
+    # The recommendation model is a Pipeline ending in the regressor
+    return model.steps[-1][1] if hasattr(model, 'steps') else model
+
+
+def _input_features(model, name, model_dir):
+    import joblib
+    source = model
+    if not hasattr(model, 'steps') and name in FOREST_SCALERS:
+        scaler_path = os.path.join(model_dir, FOREST_SCALERS[name])
+        source = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
+    names = getattr(source, 'feature_names_in_', None)
+    return None if names is None else [str(col) for col in names]
+
+
+def export_forests(model_dir=MODEL_DIR):
+    """
+    Flatten every pickled forest in `model_dir` into a .forest artifact
+    directory next to it (see artifacts.py), with the model's input columns as
+    its feature schema. Pipelines also get a .plan.json with their compiled
+    preprocessing, so the flat artifacts can be served without unpickling the
+    pipeline.
+    """
+    import joblib
+    from .feature_vector import compile_pipeline
+
+    exported = {}
+    for name, filename in FOREST_ARTIFACTS.items():
+        pickle_path = os.path.join(model_dir, filename)
+        if not os.path.exists(pickle_path):
+            continue
+        model = joblib.load(pickle_path)
+        path = forest_dir(name, model_dir)
+        FlatForest.from_sklearn(_final_estimator(model)).save_artifact(
+            path, features=_input_features(model, name, model_dir))
+        exported[name] = path
+
+        if hasattr(model, 'steps'):
+            compiled = compile_pipeline(model)
+            if compiled is None:
+                raise ValueError(f"Cannot compile preprocessing for {name}")
+            with open(plan_path(name, model_dir), 'w') as f:
+                json.dump(compiled[0].to_dict(), f)
+    return exported
+
+
+if __name__ == '__main__':
+    for name, path in export_forests().items():
+        print(f'{name}: {path}')
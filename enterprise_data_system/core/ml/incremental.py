@@ -0,0 +1,105 @@
+"""
+Out-of-core training of the disease and churn models (see
+BaseModel.train_incremental).
+
+Training data arrives as a generator of chunks, so no more than one chunk is
+held at a time: synthetic chunks, files written by train_models.py
+--write-data, or CustomerFeatures rows via core.training_data. Each run
+writes a versioned directory with the artifacts PredictionService loads
+(<name>_model.pkl / <name>_scaler.pkl) plus the BaseModel state a later
+refresh continues from.
+
+Kept free of Django imports, like training.py. Standalone, from the project root:
+    python -m core.ml.incremental CHURN --data /data/training.parquet --output /tmp/churn
+"""
+import os
+import time
+
+import joblib
+
+from .models.base_model import BaseModel
+from .models.chronic_disease_model import DiseaseModel
+from .models.churn_prediction_model import ChurnModel
+from .predict import DISEASE_FEATURES, CHURN_FEATURES
+from .train_models import DEFAULT_CHUNK_SIZE, iter_training_data, iter_training_files
+
+# model_type -> (artifact name, BaseModel class, feature columns, target column)
+INCREMENTAL_MODELS = {
+    'DISEASE': ('disease', DiseaseModel, DISEASE_FEATURES, 'disease_risk'),
+    'CHURN': ('churn', ChurnModel, CHURN_FEATURES, 'churn_risk'),
+}
+
+
+def state_path(model_type, model_dir):
+    name = INCREMENTAL_MODELS[model_type][0]
+    return os.path.join(model_dir, f'{name}_model.incremental.pkl')
+
+
+def has_state(model_type, model_dir):
+    return os.path.exists(state_path(model_type, model_dir))
+
+
+def split_chunk(model_type, chunk):
+    """(X, y) for one chunk; features as float so the scaler sees every column"""
+    _, _, features, target = INCREMENTAL_MODELS[model_type]
+    return chunk[features].astype(float), chunk[target].astype(int)
+
+
+def synthetic_batches(model_type, n_samples, chunk_size=DEFAULT_CHUNK_SIZE, seed=None):
+    """Batch source over generated data; the seed makes every pass see the same rows"""
+    if seed is None:
+        seed = int.from_bytes(os.urandom(4), 'little')
+    return lambda: (split_chunk(model_type, chunk)
+                    for chunk in iter_training_data(n_samples, chunk_size, seed))
+
+
+def file_batches(model_type, path):
+    """Batch source over data written by train_models.py --write-data, one file chunk at a time"""
+    _, _, features, target = INCREMENTAL_MODELS[model_type]
+    return lambda: (split_chunk(model_type, chunk)
+                    for chunk in iter_training_files(path, features + [target]))
+
+
+def train_incremental(model_type, batches, output_dir, base_dir=None, epochs=1):
+    """
+    Train `model_type` from `batches` (a callable returning an iterator of
+    (X, y) chunks) into `output_dir`. With `base_dir`, the incremental model
+    saved there is refreshed from the chunks instead of starting over.
+    Returns {'metrics', 'timings'}.
+    """
+    name, model_class, _, _ = INCREMENTAL_MODELS[model_type]
+    model = BaseModel.load(state_path(model_type, base_dir)) if base_dir else model_class()
+
+    started = time.perf_counter()
+    metrics = model.train_incremental(batches, epochs=epochs)
+    timings = {'fit': round(time.perf_counter() - started, 3)}
+
+    stage = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    joblib.dump(model.model, os.path.join(output_dir, f'{name}_model.pkl'))
+    joblib.dump(model.scaler, os.path.join(output_dir, f'{name}_scaler.pkl'))
+    model.save(state_path(model_type, output_dir))
+    timings['save'] = round(time.perf_counter() - stage, 3)
+    return {'metrics': metrics, 'timings': timings}
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Train the disease or churn model out of core')
+    parser.add_argument('model_type', choices=sorted(INCREMENTAL_MODELS))
+    parser.add_argument('--output', required=True, help='Directory for the model artifacts')
+    parser.add_argument('--data', default=None, help='Data written by train_models.py --write-data')
+    parser.add_argument('--samples', type=int, default=100000, help='Synthetic rows when --data is not given')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--base', default=None, help='Output of a previous run to refresh')
+    parser.add_argument('--epochs', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.data:
+        batches = file_batches(args.model_type, args.data)
+    else:
+        batches = synthetic_batches(args.model_type, args.samples, args.chunk_size, args.seed)
+    print(json.dumps(train_incremental(args.model_type, batches, args.output, args.base, args.epochs),
+                     indent=2, default=float))
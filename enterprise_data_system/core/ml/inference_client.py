@@ -0,0 +1,146 @@
+"""
+Client side of the local inference sidecar (see inference_server.py).
+
+InferenceClient has the same scoring methods as PredictionService, so views
+can use either one. Messages are length-prefixed JSON over a Unix socket
+('unix:/path/to.sock') or localhost TCP ('127.0.0.1:8765'). Each thread keeps
+its own connection and reconnects once if the server has dropped it.
+"""
+import json
+import socket
+import struct
+import threading
+from decimal import Decimal
+
+import numpy as np
+
+HEADER = struct.Struct('!I')
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+class InferenceError(RuntimeError):
+    """Raised for failed sidecar calls; error_type is the server-side exception name"""
+
+    def __init__(self, message, error_type=None):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+def parse_address(address):
+    """'unix:/path' -> (AF_UNIX, '/path'); 'host:port' -> (AF_INET, (host, port))"""
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid inference server address {address!r}")
+    return socket.AF_INET, (host, int(port))
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, 'item'):
+        return value.item()  # NumPy scalars
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _recv_exactly(sock_file, size):
+    data = sock_file.read(size)
+    if len(data) < size:
+        return None
+    return data
+
+
+def read_message(sock_file):
+    """Next message from a socket file, or None once the peer has closed it"""
+    header = _recv_exactly(sock_file, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_MESSAGE_BYTES:
+        raise ValueError(f"Message of {size} bytes exceeds the {MAX_MESSAGE_BYTES} byte limit")
+    body = _recv_exactly(sock_file, size)
+    if body is None:
+        return None
+    return json.loads(body)
+
+
+def write_message(sock_file, message):
+    body = json.dumps(message, default=_json_default).encode()
+    sock_file.write(HEADER.pack(len(body)) + body)
+    sock_file.flush()
+
+
+class InferenceClient:
+    def __init__(self, address, timeout=5.0):
+        self.address = address
+        self.family, self.sockaddr = parse_address(address)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.sockaddr)
+        self._local.sock = sock
+        self._local.file = sock.makefile('rwb')
+        return self._local.file
+
+    def _disconnect(self):
+        for name in ('file', 'sock'):
+            conn = getattr(self._local, name, None)
+            if conn is not None:
+                try:
+                    conn.close()
+                except OSError:
+                    pass
+                setattr(self._local, name, None)
+
+    def call(self, method, args=None):
+        request = {'method': method, 'args': args}
+        for attempt in range(2):
+            sock_file = getattr(self._local, 'file', None)
+            try:
+                if sock_file is None:
+                    sock_file = self._connect()
+                write_message(sock_file, request)
+                response = read_message(sock_file)
+                if response is None:
+                    raise ConnectionError('Inference server closed the connection')
+                break
+            except OSError as e:
+                # A pooled connection may have gone stale: retry once on a fresh one
+                self._disconnect()
+                if attempt:
+                    raise InferenceError(f"Inference server at {self.address} unavailable: {e}") from e
+        if 'error' in response:
+            raise InferenceError(response['error'], response.get('type'))
+        return response['result']
+
+    def close(self):
+        self._disconnect()
+
+    def predict_disease_risk(self, customer_data):
+        return self.call('predict_disease_risk', customer_data)
+
+    def predict_churn_risk(self, customer_data):
+        return self.call('predict_churn_risk', customer_data)
+
+    def get_product_recommendations(self, customer_data):
+        return self.call('get_product_recommendations', customer_data)
+
+    def score_all(self, customer_data):
+        return self.call('score_all', customer_data)
+
+    def score_batch(self, rows):
+        return self.call('score_batch', rows)
+
+    def predict_risk_arrays(self, X):
+        disease_probs, churn_probs = self.call('predict_risk_arrays', X.to_dict('list'))
+        return np.asarray(disease_probs), np.asarray(churn_probs)
+
+    def recommendation_scores(self, X):
+        return np.asarray(self.call('recommendation_scores', X.to_dict('list')))
+
+    def stats(self):
+        return self.call('stats')
@@ -0,0 +1,116 @@
+"""
+Local inference sidecar: one process per host holds the models and serves
+PredictionService to every web worker (see inference_client.py for the
+wire format).
+
+Start it with:
+    python manage.py run_inference_server
+"""
+import logging
+import os
+import socket
+import socketserver
+import time
+
+import pandas as pd
+
+from .inference_client import parse_address, read_message, write_message
+
+logger = logging.getLogger(__name__)
+
+# PredictionService methods taking one customer_data dict / list of dicts
+ROW_METHODS = {'predict_disease_risk', 'predict_churn_risk', 'get_product_recommendations',
+               'score_all', 'score_batch'}
+# Methods taking a DataFrame, sent as {column: [values]}
+FRAME_METHODS = {'predict_risk_arrays', 'recommendation_scores'}
+
+
+class InferenceBackend:
+    def __init__(self, service, coalescer=None):
+        """
+        service: a PredictionService, or a callable returning the current one (ModelRegistry.service)
+        coalescer: optional PredictionCoalescer that concurrent score_all calls are batched through
+        """
+        self.service = service
+        self.coalescer = coalescer
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+
+    def _service(self):
+        return self.service() if callable(self.service) else self.service
+
+    def handle(self, request):
+        self.requests += 1
+        method = request.get('method')
+        args = request.get('args')
+        try:
+            if method == 'score_all' and self.coalescer is not None:
+                result = self.coalescer.score_all(args)
+            elif method in ROW_METHODS:
+                result = getattr(self._service(), method)(args)
+            elif method == 'predict_risk_arrays':
+                disease_probs, churn_probs = self._service().predict_risk_arrays(pd.DataFrame(args))
+                result = [disease_probs.tolist(), churn_probs.tolist()]
+            elif method == 'recommendation_scores':
+                result = self._service().recommendation_scores(pd.DataFrame(args)).tolist()
+            elif method == 'stats':
+                result = self.stats()
+            else:
+                raise ValueError(f"Unknown method {method!r}")
+            return {'result': result}
+        except Exception as e:
+            self.errors += 1
+            logger.exception('Inference request %s failed', method)
+            return {'error': str(e), 'type': type(e).__name__}
+
+    def stats(self):
+        stats = {
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'requests': self.requests,
+            'errors': self.errors,
+        }
+        if self.coalescer is not None:
+            stats['coalescer'] = self.coalescer.stats()
+        service = self._service()
+        if getattr(service, 'cache', None) is not None:
+            stats['prediction_cache'] = service.cache.stats()
+        return stats
+
+
+class InferenceHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # One connection carries many requests from the same worker thread
+        while True:
+            try:
+                request = read_message(self.rfile)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            write_message(self.wfile, self.server.backend.handle(request))
+
+
+class UnixInferenceServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    # The default backlog of 5 refuses connects when many workers start at once
+    request_queue_size = 128
+
+
+class TCPInferenceServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def make_server(address, backend):
+    family, sockaddr = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(sockaddr):
+            os.unlink(sockaddr)  # stale socket from a previous run
+        server = UnixInferenceServer(sockaddr, InferenceHandler)
+    else:
+        server = TCPInferenceServer(sockaddr, InferenceHandler)
+    server.backend = backend
+    return server
@@ -1,34 +1,122 @@
 from abc import ABC, abstractmethod
+import importlib
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 import joblib
 import logging
-import torch
+from .preprocessing import PreprocessingPlan
+from ..artifacts import is_artifact, load_artifact, save_artifact
+from ..flat_forest import FlatForest
+
+def _prefixed(arrays, prefix):
+    return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+
+def _torch():
+    """torch if it is installed, else None. Imported on first use, never at module import."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+def _import(path):
+    module, _, name = path.rpartition('.')
+    return getattr(importlib.import_module(module), name)
 
 class BaseModel(ABC):
+    # Categorical values are encoded as str(value) when None, otherwise
+    # missing values are replaced by this token
+    category_fill = None
+    
     def __init__(self, model_name):
         self.model_name = model_name
         self.model = None
+        self.plan = None
         self.logger = logging.getLogger(model_name)
+    
+    @property
+    def device(self):
+        """torch device for torch models (MPS when available), probed on first use; None without torch"""
+        # Models pickled before this was lazy carry their device in __dict__
+        if self.__dict__.get('device') is None:
+            torch = _torch()
+            if torch is None:
+                return None
+            if torch.backends.mps.is_available():
+                self.__dict__['device'] = torch.device("mps")
+                self.logger.info("Using MPS device")
+            else:
+                self.__dict__['device'] = torch.device("cpu")
+                self.logger.info("MPS not available, using CPU")
+        return self.__dict__['device']
+    
+    def __getstate__(self):
+        # A pickled torch.device would make torch a requirement for loading
+        state = self.__dict__.copy()
+        state.pop('device', None)
+        return state
+    
+    def fit_plan(self, X):
+        """Fit whatever scaler/encoders are still unfitted on X and freeze the preprocessing plan"""
+        if self.cols is None:
+            self.cols = X.columns
+        num_cols = X.select_dtypes(include=['int64', 'float64']).columns
+        if len(num_cols) > 0 and not hasattr(self.scaler, 'mean_'):
+            self.scaler.fit(X[num_cols])
         
-        if torch.backends.mps.is_available():
-            self.device = torch.device("mps")
-            self.logger.info("Using MPS device")
-        else:
-            self.device = torch.device("cpu")
-            self.logger.info("MPS not available, using CPU")
+        encoders = getattr(self, 'encoders', None)
+        cat_cols = X.select_dtypes(include=['object']).columns if encoders is not None else []
+        for col in cat_cols:
+            if col not in encoders:
+                encoders[col] = LabelEncoder().fit(self.encoder_values(X[col]))
+        
+        self.plan = PreprocessingPlan(self.cols, num_cols, cat_cols, self.scaler, encoders, self.category_fill)
+        return self.plan
     
-    @abstractmethod
     def preprocess(self, data):
-        pass
+        """float64 feature array; the first call (at fit time) freezes the plan"""
+        # Models pickled before plans existed compile theirs on first use
+        plan = getattr(self, 'plan', None) or self.fit_plan(data)
+        return plan.transform(data)
     
     @abstractmethod
     def build(self):
         pass
     
+    def build_incremental(self):
+        """Estimator with partial_fit, used by train_incremental()"""
+        raise NotImplementedError(f"{self.model_name} has no incremental mode")
+    
+    def update_stats(self, X):
+        """Fold one chunk into the streaming scaler (and category) statistics"""
+        if self.cols is None:
+            self.cols = X.columns
+        num_cols = X.select_dtypes(include=['int64', 'float64']).columns
+        if len(num_cols) > 0:
+            self.scaler.partial_fit(X[num_cols])
+        
+        # Encoders see every category before the first chunk is encoded;
+        # union1d keeps classes_ sorted, as LabelEncoder.fit does
+        for col in X.select_dtypes(include=['object']).columns:
+            values = np.unique(self.encoder_values(X[col]))
+            if col in getattr(self, 'encoders', {}):
+                self.encoders[col].classes_ = np.union1d(self.encoders[col].classes_, values)
+            elif hasattr(self, 'encoders'):
+                self.encoders[col] = LabelEncoder().fit(values)
+    
+    def encoder_values(self, column):
+        """Values a categorical column is label-encoded from"""
+        if self.category_fill is None:
+            return column.astype(str)
+        return column.fillna(self.category_fill)
+    
     def to_tensor(self, data):
+        torch = _torch()
+        if torch is None:
+            return data
         if isinstance(data, pd.DataFrame):
             return torch.tensor(data.values, dtype=torch.float32, device=self.device)
         elif isinstance(data, pd.Series):
@@ -45,32 +133,80 @@ class BaseModel(ABC):
         
         self.model = self.build()
         
-        X_train_tensor = self.to_tensor(X_train)
-        y_train_tensor = self.to_tensor(y_train)
-        
         if hasattr(self.model, 'to'):
             self.model = self.model.to(self.device)
-            self.model.fit(X_train_tensor, y_train_tensor)
+            self.model.fit(self.to_tensor(X_train), self.to_tensor(y_train))
         else:
             self.model.fit(X_train, y_train)
         
-        train_metrics = self.evaluate(X_train, y_train)
-        test_metrics = self.evaluate(X_test, y_test)
+        # The splits are already preprocessed
+        train_metrics = self._metrics(y_train, self._predict_processed(X_train))
+        test_metrics = self._metrics(y_test, self._predict_processed(X_test))
         
         return train_metrics, test_metrics
     
+    def train_incremental(self, batches, classes=(0, 1), epochs=1):
+        """
+        Out-of-core training: `batches` is a callable returning a fresh iterator
+        of (X, y) chunks, so only one chunk is in memory at a time.
+        A fresh model streams the scaler statistics first and freezes its
+        preprocessing plan, then partial_fits every chunk; an already trained
+        incremental model (refresh) keeps its plan and continues from the new
+        chunks in a single pass.
+        Metrics are progressive validation: each chunk is scored before it is
+        learned from.
+        """
+        if self.model is None:
+            X = None
+            for X, _ in batches():
+                self.update_stats(X)
+            if X is None:
+                raise ValueError("No training chunks")
+            self.fit_plan(X)
+            self.model = self.build_incremental()
+        elif not hasattr(self.model, 'partial_fit'):
+            raise ValueError(f"{self.model_name} was not trained incrementally")
+        
+        rows = 0
+        y_true, y_pred = [], []
+        for _ in range(epochs):
+            for X, y in batches():
+                X_processed = self.preprocess(X)
+                if hasattr(self.model, 'coef_'):
+                    y_true.append(np.asarray(y))
+                    y_pred.append(self.model.predict(X_processed))
+                self.model.partial_fit(X_processed, y, classes=np.asarray(classes))
+                rows += len(X)
+        
+        metrics = {'rows': rows}
+        if y_true:
+            y_true, y_pred = np.concatenate(y_true), np.concatenate(y_pred)
+            metrics.update(self._metrics(y_true, y_pred))
+        return metrics
+    
+    def importances(self):
+        """Per-feature importance of either a forest or a linear (incremental) model"""
+        if hasattr(self.model, 'feature_importances_'):
+            return self.model.feature_importances_
+        weights = np.abs(self.model.coef_[0])
+        return weights / weights.sum() if weights.sum() > 0 else weights
+    
     def predict(self, X):
         if not self.model:
             raise ValueError("run fit() first")
-        X_processed = self.preprocess(X)
-        
+        return self._predict_processed(self.preprocess(X))
+    
+    def _predict_processed(self, X_processed):
         if hasattr(self.model, 'to'):
             X_tensor = self.to_tensor(X_processed)
             return self.model.predict(X_tensor).cpu().numpy()
         return self.model.predict(X_processed)
     
     def evaluate(self, X, y):
-        y_pred = self.predict(X)
+        return self._metrics(y, self.predict(X))
+    
+    @staticmethod
+    def _metrics(y, y_pred):
         return {
             'accuracy': accuracy_score(y, y_pred),
             'precision': precision_score(y, y_pred, average='weighted'),
@@ -79,14 +215,77 @@ class BaseModel(ABC):
         }
     
     def save(self, path):
+        """
+        A path ending in .pkl pickles the whole object, which can be trained
+        further; any other path is written as an artifact directory (see
+        save_artifact), which loads without unpickling but only serves.
+        """
         if hasattr(self.model, 'to'):
             self.model = self.model.cpu()
-        joblib.dump(self, path)
+        if path.endswith('.pkl'):
+            joblib.dump(self, path)
+        else:
+            self.save_artifact(path)
         self.logger.info(f"Model saved to {path}")
     
+    def save_artifact(self, path):
+        """
+        Write the preprocessing plan and the fitted estimator as raw arrays
+        (core/ml/artifacts.py): forests as their flat-forest arrays, linear
+        models as coefficients. Torch and scaler/encoder objects aren't kept.
+        """
+        if self.model is None or getattr(self, 'plan', None) is None:
+            raise ValueError("run fit() first")
+        plan_arrays, plan_meta = self.plan.to_arrays()
+        arrays = {f'plan_{name}': array for name, array in plan_arrays.items()}
+        meta = {
+            'class': f'{type(self).__module__}.{type(self).__qualname__}',
+            'model_name': self.model_name,
+            'plan': plan_meta,
+        }
+        if hasattr(self.model, 'estimators_'):
+            forest_arrays, meta['forest'] = FlatForest.from_sklearn(self.model).to_arrays()
+            arrays.update({f'forest_{name}': array for name, array in forest_arrays.items()})
+            arrays['feature_importances'] = self.model.feature_importances_
+        elif hasattr(self.model, 'coef_'):
+            arrays.update(coef=self.model.coef_, intercept=self.model.intercept_, classes=self.model.classes_)
+            estimator = type(self.model)
+            meta['linear'] = {'class': f'{estimator.__module__}.{estimator.__qualname__}',
+                              'params': self.model.get_params()}
+        else:
+            raise ValueError(f"{type(self.model).__name__} can't be saved as an artifact; save to a .pkl")
+        return save_artifact(path, 'base_model', arrays, features=self.plan.schema(), meta=meta)
+    
     @classmethod
     def load(cls, path):
+        if is_artifact(path):
+            return cls.load_artifact(path)
         model = joblib.load(path)
         if hasattr(model.model, 'to'):
             model.model = model.model.to(model.device)
         return model
+    
+    @classmethod
+    def load_artifact(cls, path, mmap=True, verify=True):
+        """Model saved by save_artifact, its arrays memory-mapped; predict/get_proba only"""
+        arrays, manifest = load_artifact(path, kind='base_model', mmap=mmap, verify=verify)
+        meta = manifest['meta']
+        model_class = _import(meta['class'])
+        if not (isinstance(model_class, type) and issubclass(model_class, cls)):
+            raise ValueError(f"{meta['class']} is not a {cls.__name__}")
+        
+        # The subclass __init__ would create unfitted scalers/encoders the plan replaces
+        model = model_class.__new__(model_class)
+        BaseModel.__init__(model, meta['model_name'])
+        model.plan = PreprocessingPlan.from_arrays(_prefixed(arrays, 'plan_'), meta['plan'])
+        model.cols = pd.Index(model.plan.columns)
+        if 'forest' in meta:
+            model.model = FlatForest.from_arrays(_prefixed(arrays, 'forest_'), meta['forest'])
+            model.model.feature_importances_ = arrays['feature_importances']
+        else:
+            model.model = _import(meta['linear']['class'])(**meta['linear']['params'])
+            model.model.coef_ = arrays['coef']
+            model.model.intercept_ = arrays['intercept']
+            model.model.classes_ = arrays['classes']
+            model.model.n_features_in_ = arrays['coef'].shape[1]
+        return model
@@ -1,41 +1,30 @@
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
 import pandas as pd
 from .base_model import BaseModel
 
 class ChurnModel(BaseModel):
-    def __init__(self):
+    category_fill = 'NA'
+    
+    def __init__(self, params=None):
         super().__init__("churn_model")
+        # Forest hyperparameters overriding build()'s defaults (e.g. from core/ml/tuning.py)
+        self.params = params or {}
         self.scaler = StandardScaler()
         self.encoders = {}
         self.cols = None
         
-    def preprocess(self, data):
-        if self.cols is None:
-            self.cols = data.columns
-            
-        tmp = data.copy()
-        num_cols = tmp.select_dtypes(include=['int64', 'float64']).columns
-        if len(num_cols) > 0:
-            if not hasattr(self.scaler, 'mean_'):
-                self.scaler.fit(tmp[num_cols])
-            tmp[num_cols] = self.scaler.transform(tmp[num_cols])
-        
-        cat_cols = tmp.select_dtypes(include=['object']).columns
-        for col in cat_cols:
-            if col not in self.encoders:
-                self.encoders[col] = LabelEncoder()
-                self.encoders[col].fit(tmp[col].fillna('NA'))
-            tmp[col] = self.encoders[col].transform(tmp[col].fillna('NA'))
-        
-        return tmp
-    
     def build(self):
-        return RandomForestClassifier(
-            n_estimators=100,
-            max_depth=8,
-            min_samples_split=30,
-            class_weight='balanced',
+        params = {'n_estimators': 100, 'max_depth': 8, 'min_samples_split': 30, **self.params}
+        return RandomForestClassifier(**params, class_weight='balanced', random_state=42)
+    
+    def build_incremental(self):
+        # Logistic regression by SGD; partial_fit can't use class_weight='balanced',
+        # which needs every label up front
+        return SGDClassifier(
+            loss='log_loss',
+            alpha=1e-4,
             random_state=42
         )
     
@@ -55,7 +44,7 @@ class ChurnModel(BaseModel):
             
         imp = pd.DataFrame({
             'feat': self.cols,
-            'imp': self.model.feature_importances_
+            'imp': self.importances()
         })
         
         top_feats = imp[imp['imp'] > thresh]
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+class PreprocessingPlan:
+    """
+    Column layout, scaler arrays and category codes of a BaseModel, frozen at
+    fit time. transform() writes straight into a float64 array in the training
+    column order: no DataFrame copy, no dtype sniffing and no lazy fitting, so
+    serving always sees the columns the model was trained on.
+    """
+
+    def __init__(self, columns, num_cols, cat_cols, scaler=None, encoders=None, category_fill=None):
+        """
+        columns: training column order
+        num_cols: columns scaled by `scaler` (in the order it was fitted on)
+        cat_cols: columns label-encoded by `encoders`; any other column is passed through as float
+        category_fill: None to encode str(value), otherwise the token missing values are replaced by
+        """
+        self.columns = list(columns)
+        self.num_cols = list(num_cols)
+        self.cat_cols = list(cat_cols)
+        self.category_fill = category_fill
+        n = len(self.num_cols)
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64) if n else np.zeros(0)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64) if n else np.ones(0)
+        self.num_idx = np.array([self.columns.index(col) for col in self.num_cols], dtype=np.intp)
+        # LabelEncoder codes are positions in its sorted classes_
+        self.categories = {col: pd.Index(encoders[col].classes_) for col in self.cat_cols}
+
+    def to_arrays(self):
+        """({name: array}, JSON metadata) describing this plan, for artifacts.save_artifact"""
+        arrays = {'mean': self.mean, 'scale': self.scale, 'num_idx': self.num_idx}
+        for i, col in enumerate(self.cat_cols):
+            values = np.asarray(self.categories[col])
+            if values.dtype.hasobject:
+                if not all(isinstance(v, str) for v in values):
+                    raise ValueError(f"Categories of {col!r} must be strings to be stored without pickle")
+                values = values.astype(str)
+            arrays[f'categories_{i}'] = values
+        meta = {
+            'columns': [str(col) for col in self.columns],
+            'num_cols': [str(col) for col in self.num_cols],
+            'cat_cols': [str(col) for col in self.cat_cols],
+            'category_fill': self.category_fill,
+        }
+        return arrays, meta
+
+    @classmethod
+    def from_arrays(cls, arrays, meta):
+        plan = cls.__new__(cls)
+        plan.columns = meta['columns']
+        plan.num_cols = meta['num_cols']
+        plan.cat_cols = meta['cat_cols']
+        plan.category_fill = meta['category_fill']
+        plan.mean = arrays['mean']
+        plan.scale = arrays['scale']
+        plan.num_idx = np.asarray(arrays['num_idx'], dtype=np.intp)
+        plan.categories = {col: pd.Index(np.asarray(arrays[f'categories_{i}'], dtype=object))
+                           for i, col in enumerate(plan.cat_cols)}
+        return plan
+
+    def schema(self):
+        """Feature schema for an artifact manifest: {column: 'numeric' | categories | 'passthrough'}"""
+        return {
+            str(col): ('numeric' if col in self.num_cols
+                       else [str(v) for v in self.categories[col]] if col in self.categories
+                       else 'passthrough')
+            for col in self.columns
+        }
+
+    def _codes(self, col, values):
+        values = np.asarray(values, dtype=object)
+        index = self.categories[col]
+        codes = index.get_indexer(values)
+        missed = codes < 0
+        if missed.any():
+            # Only values that aren't already a known category get normalised
+            rest = values[missed]
+            if self.category_fill is None:
+                rest = rest.astype(str)
+            else:
+                rest = np.where(pd.isna(rest), self.category_fill, rest)
+            codes[missed] = index.get_indexer(rest)
+            if (codes < 0).any():
+                unknown = sorted({str(v) for v in values[codes < 0]})
+                raise ValueError(f"Found unknown categories {unknown} in column {col!r}")
+        return codes
+
+    def transform(self, data):
+        """float64 array of `data` (DataFrame or {column: values}) in training column order"""
+        n_rows = len(data[self.columns[0]]) if self.columns else 0
+        out = np.empty((n_rows, len(self.columns)), dtype=np.float64)
+        for i, col in enumerate(self.columns):
+            if col in self.categories:
+                out[:, i] = self._codes(col, data[col])
+            else:
+                out[:, i] = np.asarray(data[col], dtype=np.float64)
+        if len(self.num_idx):
+            out[:, self.num_idx] -= self.mean
+            out[:, self.num_idx] /= self.scale
+        return out
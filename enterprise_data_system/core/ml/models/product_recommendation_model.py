@@ -3,29 +3,26 @@ from sklearn.preprocessing import StandardScaler
 import pandas as pd
 import numpy as np
 from .base_model import BaseModel
+from ..ann_index import IVFIndex
 
 class ProdRecModel(BaseModel):
-    def __init__(self, k=5):
+    def __init__(self, k=5, index='exact', n_lists=None, n_probe=8):
+        """
+        index: 'exact' (ball tree) or 'ivf' (approximate, see core/ml/ann_index.py),
+               which can grow with add_users() and is tuned by n_lists / n_probe
+        """
         super().__init__("prod_rec_model")
         self.scaler = StandardScaler()
         self.k = k
+        self.index = index
+        self.n_lists = n_lists
+        self.n_probe = n_probe
         self.prods = None
         self.cols = None
         
-    def preprocess(self, data):
-        if self.cols is None:
-            self.cols = data.columns
-            
-        tmp = data.copy()
-        num_cols = tmp.select_dtypes(include=['int64', 'float64']).columns
-        if len(num_cols) > 0:
-            if not hasattr(self.scaler, 'mean_'):
-                self.scaler.fit(tmp[num_cols])
-            tmp[num_cols] = self.scaler.transform(tmp[num_cols])
-        
-        return tmp
-    
     def build(self):
+        if getattr(self, 'index', 'exact') == 'ivf':
+            return IVFIndex(n_lists=self.n_lists, n_probe=self.n_probe)
         return NearestNeighbors(
             n_neighbors=self.k,
             algorithm='ball_tree',
@@ -33,30 +30,45 @@ class ProdRecModel(BaseModel):
         )
     
     def fit(self, user_data, prod_data):
-        self.prods = prod_data
+        self.prods = list(prod_data)
         X = self.preprocess(user_data)
         self.model = self.build()
         self.model.fit(X)
         return self
     
+    def add_users(self, user_data, prod_data):
+        """Index more users without rebuilding (ivf index only)"""
+        if not isinstance(self.model, IVFIndex):
+            raise ValueError("only the ivf index can be updated; refit the exact one")
+        self.model.add(self.preprocess(user_data))
+        self.prods.extend(prod_data)
+        return self
+    
     def get_recs(self, user_data, n=5):
+        """
+        Recommended products for every row of user_data: a list of lists, one
+        list of up to n products per row, nearest neighbour's products first.
+        Earlier versions returned a single flat, unordered list for the first
+        row only; a caller scoring one user now reads get_recs(df)[0].
+        """
         if self.model is None or self.prods is None:
             raise ValueError("run fit() first")
             
         X = self.preprocess(user_data)
-        dists, idxs = self.model.kneighbors(X)
+        dists, idxs = self.model.kneighbors(X, n_neighbors=self.k)
         
         recs = []
-        for user_idx in idxs[0]:
-            user_prods = self.prods[user_idx]
-            recs.extend(user_prods)
+        for row in idxs:
+            # dict keeps first-seen order, so nearer neighbours' products come first
+            prods = dict.fromkeys(prod for user_idx in row if user_idx >= 0 for prod in self.prods[user_idx])
+            recs.append(list(prods)[:n])
             
-        return list(set(recs))[:n]
+        return recs
     
     def get_sim_score(self, user_data):
         if self.model is None:
             raise ValueError("run fit() first")
             
         X = self.preprocess(user_data)
-        dists, _ = self.model.kneighbors(X)
+        dists, _ = self.model.kneighbors(X, n_neighbors=self.k)
         return 1 / (1 + np.mean(dists, axis=1))
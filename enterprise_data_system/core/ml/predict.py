@@ -1,39 +1,128 @@
 import os
+import json
+from datetime import datetime
 import joblib
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
+from .feature_vector import FeatureRow, ScaledPlan, PipelinePlan, compile_pipeline
+from .flat_forest import has_forest, load_forest, plan_path
+from .prediction_cache import canonical_key
 
 MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
 
+DISEASE_FEATURES = ['age', 'total_claims', 'num_products', 'premium', 'coverage']
+CHURN_FEATURES = ['years_as_customer', 'num_complaints', 'avg_sentiment', 'payment_delay', 'premium']
+RECOMMENDATION_FEATURES = ['age', 'income', 'num_products', 'avg_sentiment', 'years_as_customer',
+                           'family_size', 'total_claims', 'premium', 'risk_tolerance', 'employment_status']
+
+def risk_level(prob):
+    return 'High' if prob > 0.7 else 'Medium' if prob > 0.3 else 'Low'
+
+def recommended_products(score):
+    if score > 0.7:
+        return ['Premium Life Insurance', 'Comprehensive Health Coverage']
+    elif score > 0.4:
+        return ['Standard Life Insurance', 'Basic Health Coverage']
+    return ['Term Life Insurance', 'Accident Coverage']
+
 class PredictionService:
-    def __init__(self):
+    def __init__(self, model_dir=MODEL_DIR, flat_forests=None, cache=None, version_source=None,
+                 model_dirs=None):
+        """
+        model_dir: directory holding the model artifacts
+        flat_forests: serve single-row predictions from the forests exported by
+                      flat_forest.export_forests() (memory-mapped artifact
+                      directories, or older .forest.npz files); None uses them
+                      when present. Frame and batch scoring always use the
+                      sklearn estimators, which are faster on many rows.
+        cache: optional PredictionCache memoizing single-customer predictions
+        version_source: callable returning the active model version; the cache
+                        is invalidated whenever its value changes
+        model_dirs: optional {'disease'|'churn'|'recommendation': directory} overriding
+                    model_dir per model, so each can come from a different version
+        """
+        self.cache = cache
+        self.version_source = version_source
+        self.dirs = {name: model_dir for name in ('disease', 'churn', 'recommendation')}
+        self.dirs.update(model_dirs or {})
+        if flat_forests is None:
+            flat_forests = all(has_forest(f'{name}_model', self.dirs[name]) for name in self.dirs)
+        self.flat_forests = flat_forests
+
+        # Scalers are shared by both backends
+        self.disease_scaler = joblib.load(os.path.join(self.dirs['disease'], 'disease_scaler.pkl'))
+        self.churn_scaler = joblib.load(os.path.join(self.dirs['churn'], 'churn_scaler.pkl'))
+
         # Load disease risk model
-        self.disease_model = joblib.load(os.path.join(MODEL_DIR, 'disease_model.pkl'))
-        self.disease_scaler = joblib.load(os.path.join(MODEL_DIR, 'disease_scaler.pkl'))
+        self.disease_model = joblib.load(os.path.join(self.dirs['disease'], 'disease_model.pkl'))
         
         # Load churn model
-        self.churn_model = joblib.load(os.path.join(MODEL_DIR, 'churn_model.pkl'))
-        self.churn_scaler = joblib.load(os.path.join(MODEL_DIR, 'churn_scaler.pkl'))
+        self.churn_model = joblib.load(os.path.join(self.dirs['churn'], 'churn_model.pkl'))
         
         # Load recommendation model (includes preprocessing pipeline)
-        self.recommendation_model = joblib.load(os.path.join(MODEL_DIR, 'recommendation_model.pkl'))
+        self.recommendation_model = joblib.load(os.path.join(self.dirs['recommendation'], 'recommendation_model.pkl'))
+
+        self.compile()
+
+    def compile(self):
+        """Precompute the index/affine arrays and models used by the single-row fast path"""
+        self.feature_row = FeatureRow()
+        self.disease_plan = ScaledPlan(DISEASE_FEATURES, self.disease_scaler)
+        self.churn_plan = ScaledPlan(CHURN_FEATURES, self.churn_scaler)
+        # None when the pipeline layout isn't recognised; falls back to pandas
+        self.recommendation_plan = compile_pipeline(self.recommendation_model)
+        self.row_models = {'disease': self.disease_model, 'churn': self.churn_model}
+        self.row_recommendation_plan = self.recommendation_plan
+        if self.flat_forests:
+            self.row_models = {name: load_forest(f'{name}_model', self.dirs[name]) for name in self.row_models}
+            with open(plan_path('recommendation_model', self.dirs['recommendation'])) as f:
+                plan = PipelinePlan.from_dict(json.load(f))
+            self.row_recommendation_plan = (
+                plan, load_forest('recommendation_model', self.dirs['recommendation']))
+
+    def _disease_result(self, risk_prob, now):
+        return {
+            'risk_score': float(risk_prob),
+            'risk_level': risk_level(risk_prob),
+            'prediction_date': now
+        }
+
+    def _churn_result(self, churn_prob, now):
+        return {
+            'churn_probability': float(churn_prob),
+            'risk_level': risk_level(churn_prob),
+            'prediction_date': now
+        }
+
+    def _recommendation_result(self, score, now):
+        return {
+            'recommendation_score': float(score),
+            'recommended_products': recommended_products(score),
+            'recommendation_date': now
+        }
+
+    def _disease_prob(self, row):
+        return self.row_models['disease'].predict_proba(self.disease_plan.transform(row))[0][1]
+
+    def _churn_prob(self, row):
+        return self.row_models['churn'].predict_proba(self.churn_plan.transform(row))[0][1]
+
+    def _recommendation_score(self, row, customer_data):
+        if self.row_recommendation_plan is None:
+            X = pd.DataFrame([customer_data])[RECOMMENDATION_FEATURES]
+            return self.recommendation_model.predict(X)[0]
+        plan, regressor = self.row_recommendation_plan
+        return regressor.predict(plan.transform(row, customer_data))[0]
 
     def predict_disease_risk(self, customer_data):
         """
         Predict disease risk for a customer
         customer_data: dict with keys ['age', 'total_claims', 'num_products', 'premium', 'coverage']
         """
-        features = ['age', 'total_claims', 'num_products', 'premium', 'coverage']
-        X = pd.DataFrame([customer_data])[features]
-        X_scaled = self.disease_scaler.transform(X)
-        risk_prob = self.disease_model.predict_proba(X_scaled)[0][1]
-        
-        return {
-            'risk_score': float(risk_prob),
-            'risk_level': 'High' if risk_prob > 0.7 else 'Medium' if risk_prob > 0.3 else 'Low',
-            'prediction_date': pd.Timestamp.now().isoformat()
-        }
+        def compute():
+            row = self.feature_row.fill(customer_data)
+            return self._disease_result(self._disease_prob(row), datetime.now().isoformat())
+        return self.cached('disease_risk', customer_data, compute)
 
     def predict_churn_risk(self, customer_data):
         """
@@ -41,16 +130,10 @@ class PredictionService:
         customer_data: dict with keys ['years_as_customer', 'num_complaints', 'avg_sentiment', 
                                      'payment_delay', 'premium']
         """
-        features = ['years_as_customer', 'num_complaints', 'avg_sentiment', 'payment_delay', 'premium']
-        X = pd.DataFrame([customer_data])[features]
-        X_scaled = self.churn_scaler.transform(X)
-        churn_prob = self.churn_model.predict_proba(X_scaled)[0][1]
-        
-        return {
-            'churn_probability': float(churn_prob),
-            'risk_level': 'High' if churn_prob > 0.7 else 'Medium' if churn_prob > 0.3 else 'Low',
-            'prediction_date': pd.Timestamp.now().isoformat()
-        }
+        def compute():
+            row = self.feature_row.fill(customer_data)
+            return self._churn_result(self._churn_prob(row), datetime.now().isoformat())
+        return self.cached('churn_risk', customer_data, compute)
 
     def get_product_recommendations(self, customer_data):
         """
@@ -59,25 +142,78 @@ class PredictionService:
                                      'years_as_customer', 'family_size', 'total_claims', 'premium',
                                      'risk_tolerance', 'employment_status']
         """
-        features = ['age', 'income', 'num_products', 'avg_sentiment', 'years_as_customer',
-                   'family_size', 'total_claims', 'premium', 'risk_tolerance', 'employment_status']
-        X = pd.DataFrame([customer_data])[features]
-        recommendation_score = self.recommendation_model.predict(X)[0]
-        
-        # Map score to product recommendations
-        recommendations = []
-        if recommendation_score > 0.7:
-            recommendations.extend(['Premium Life Insurance', 'Comprehensive Health Coverage'])
-        elif recommendation_score > 0.4:
-            recommendations.extend(['Standard Life Insurance', 'Basic Health Coverage'])
-        else:
-            recommendations.extend(['Term Life Insurance', 'Accident Coverage'])
-            
-        return {
-            'recommendation_score': float(recommendation_score),
-            'recommended_products': recommendations,
-            'recommendation_date': pd.Timestamp.now().isoformat()
-        }
+        def compute():
+            row = self.feature_row.fill(customer_data)
+            score = self._recommendation_score(row, customer_data)
+            return self._recommendation_result(score, datetime.now().isoformat())
+        return self.cached('recommendations', customer_data, compute)
+
+    def score_all(self, customer_data):
+        """
+        Run the disease and churn models on one customer, sharing a single feature row.
+        Returns {'disease_risk', 'churn_risk'} like score_batch; plan recommendations
+        are precomputed by core.recommendations.recommend_plans, not scored here.
+        """
+        def compute():
+            row = self.feature_row.fill(customer_data)
+            now = datetime.now().isoformat()
+            return {
+                'disease_risk': self._disease_result(self._disease_prob(row), now),
+                'churn_risk': self._churn_result(self._churn_prob(row), now),
+            }
+        return self.cached('score_all', customer_data, compute)
+
+    def cached(self, method, customer_data, compute):
+        """Return compute() memoized under (model version, method, features)"""
+        if self.cache is None:
+            return compute()
+        if self.version_source is not None:
+            self.cache.set_version(self.version_source())
+        key = canonical_key(method, customer_data, self.cache.version)
+        result = self.cache.get(key)
+        if result is None:
+            result = compute()
+            self.cache.put(key, result)
+        return result
+
+    def predict_risk_arrays(self, X):
+        """
+        Disease and churn probabilities for a feature DataFrame, as NumPy arrays
+        X: DataFrame containing DISEASE_FEATURES and CHURN_FEATURES columns
+        """
+        disease_probs = self.disease_model.predict_proba(
+            self.disease_scaler.transform(X[DISEASE_FEATURES]))[:, 1]
+        churn_probs = self.churn_model.predict_proba(
+            self.churn_scaler.transform(X[CHURN_FEATURES]))[:, 1]
+        return disease_probs, churn_probs
+
+    def recommendation_scores(self, X):
+        """Recommendation scores for a feature DataFrame, as a NumPy array"""
+        if self.recommendation_plan is None:
+            return self.recommendation_model.predict(X[RECOMMENDATION_FEATURES])
+        plan, regressor = self.recommendation_plan
+        return regressor.predict(plan.transform_frame(X))
+
+    def score_batch(self, rows):
+        """
+        Score many customers at once: one DataFrame and one predict call per model.
+        rows: list of customer_data dicts with the disease and churn keys above
+        Returns a list of {'disease_risk', 'churn_risk'} in input order.
+        """
+        if not rows:
+            return []
+
+        X = pd.DataFrame(rows)
+        disease_probs, churn_probs = self.predict_risk_arrays(X)
+
+        now = datetime.now().isoformat()
+        results = []
+        for disease_prob, churn_prob in zip(disease_probs, churn_probs):
+            results.append({
+                'disease_risk': self._disease_result(disease_prob, now),
+                'churn_risk': self._churn_result(churn_prob, now),
+            })
+        return results
 
 # Example usage:
 if __name__ == '__main__':
@@ -0,0 +1,97 @@
+"""
+In-process LRU/TTL cache for PredictionService results.
+
+Entries are keyed by the model version plus a canonical hash of the input
+features, so identical customer_data dicts hit regardless of key order or
+int/float spelling. Changing the version drops every entry.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def canonical_key(method, customer_data, version):
+    parts = []
+    for name in sorted(customer_data):
+        value = customer_data[name]
+        if isinstance(value, bool) or value is None:
+            text = repr(value)
+        else:
+            try:
+                text = repr(float(value))
+            except (TypeError, ValueError):
+                text = repr(str(value))
+        parts.append(f'{name}={text}')
+    digest = hashlib.blake2b('|'.join(parts).encode(), digest_size=16).hexdigest()
+    return f'{version}:{method}:{digest}'
+
+
+class PredictionCache:
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def set_version(self, version):
+        """Record the active model version; a change invalidates every entry"""
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self._invalidations += 1
+                self._entries.clear()
+                self.version = version
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self._hits + self._misses
+        return {
+            'version': self.version,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self._hits,
+            'misses': self._misses,
+            'hit_rate': round(self._hits / lookups, 4) if lookups else 0,
+            'evictions': self._evictions,
+            'expirations': self._expirations,
+            'invalidations': self._invalidations,
+        }
@@ -0,0 +1,185 @@
+"""
+Lazy, versioned model registry backed by MLModelVersion.
+
+Nothing is loaded at import time. service() resolves the active
+MLModelVersion rows, builds a PredictionService for that set on first use and
+keeps the most recently used loads in an LRU, so a newly activated version
+goes live without a restart and only versions in use stay in memory.
+
+An active version whose model_path is a directory is served from the
+PredictionService artifacts in it; models without one fall back to the
+artifacts in ML_MODEL_DIR. A model_path that is a BaseModel .pkl or artifact
+directory (see core/ml/artifacts.py) is loaded by model(). Relative model
+paths are resolved against ML_MODEL_DIR.
+
+The active rows are cached in Django's cache for VERSION_CHECK_SECONDS;
+writes to MLModelVersion drop them in this process (see core/signals.py),
+other processes pick the change up once the entry expires.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models import MLModelVersion
+from .artifacts import is_artifact
+
+VERSION_CACHE_KEY = 'ml:active_versions'
+VERSION_CHECK_SECONDS = 5
+
+# MLModelVersion.model_type -> PredictionService model name
+SERVICE_MODELS = {'DISEASE': 'disease', 'CHURN': 'churn', 'PRODUCT': 'recommendation'}
+
+
+def model_dir():
+    return getattr(settings, 'ML_MODEL_DIR', os.path.join(os.path.dirname(__file__), 'models'))
+
+
+def resolve_path(model_path):
+    return model_path if os.path.isabs(model_path) else os.path.join(model_dir(), model_path)
+
+
+def active_versions():
+    """{model_type: (version, model_path)} for the active MLModelVersion rows"""
+    versions = cache.get(VERSION_CACHE_KEY)
+    if versions is None:
+        # Oldest first, so the newest row wins if several are active
+        rows = (MLModelVersion.objects.filter(is_active=True)
+                .order_by('created_at').values_list('model_type', 'version', 'model_path'))
+        versions = {model_type: (version, model_path) for model_type, version, model_path in rows}
+        cache.set(VERSION_CACHE_KEY, versions, VERSION_CHECK_SECONDS)
+    return versions
+
+
+def fingerprint(versions):
+    """e.g. 'CHURN=CHURN-20260101-010000|DISEASE=...'; 'baseline' when none are active"""
+    return '|'.join(f'{model_type}={versions[model_type][0]}' for model_type in sorted(versions)) or 'baseline'
+
+
+def active_version_fingerprint():
+    return fingerprint(active_versions())
+
+
+def forget_active_versions():
+    cache.delete(VERSION_CACHE_KEY)
+
+
+def _is_service_dir(path):
+    # A BaseModel artifact directory is one model, not a set of service artifacts
+    return os.path.isdir(path) and not is_artifact(path)
+
+
+class ModelRegistry:
+    def __init__(self, max_loaded=2, cache=None, default_dir=None):
+        """
+        max_loaded: loaded services/models kept before the least recently used is dropped
+        cache: optional PredictionCache shared by every service this registry builds
+        default_dir: artifacts for models without a versioned directory (ML_MODEL_DIR)
+        """
+        self.max_loaded = max_loaded
+        self.prediction_cache = cache
+        self.default_dir = default_dir
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loads = 0
+        self._evictions = 0
+        self._load_seconds = {}
+
+    def _get(self, key, load):
+        with self._lock:
+            if key in self._loaded:
+                self._loaded.move_to_end(key)
+                return self._loaded[key]
+        # One load at a time; lookups of already-loaded versions don't wait on it
+        with self._load_lock:
+            with self._lock:
+                if key in self._loaded:
+                    return self._loaded[key]
+            started = time.perf_counter()
+            value = load()
+            with self._lock:
+                self._loaded[key] = value
+                self._load_seconds[key] = round(time.perf_counter() - started, 3)
+                self._loads += 1
+                while len(self._loaded) > self.max_loaded:
+                    evicted, _ = self._loaded.popitem(last=False)
+                    self._load_seconds.pop(evicted, None)
+                    self._evictions += 1
+            return value
+
+    def service_dirs(self, versions):
+        """(model_dir, model_dirs) a PredictionService for `versions` is built from"""
+        model_dirs = {}
+        for model_type, name in SERVICE_MODELS.items():
+            if model_type in versions:
+                path = resolve_path(versions[model_type][1])
+                if _is_service_dir(path):
+                    model_dirs[name] = path
+        return self.default_dir or model_dir(), model_dirs
+
+    def _build_service(self, versions):
+        from .predict import PredictionService
+        version = fingerprint(versions)
+        default_dir, model_dirs = self.service_dirs(versions)
+        return PredictionService(
+            model_dir=default_dir,
+            cache=self.prediction_cache,
+            version_source=lambda: version,
+            model_dirs=model_dirs,
+        )
+
+    def service(self, versions=None):
+        """PredictionService for the active versions (or `versions`), loaded on first use"""
+        if versions is None:
+            versions = active_versions()
+        return self._get(('service', fingerprint(versions)), lambda: self._build_service(versions))
+
+    def model(self, model_type):
+        """Trained BaseModel of the active `model_type` version, or None if there isn't one"""
+        version = active_versions().get(model_type)
+        if version is None:
+            return None
+        from .models.base_model import BaseModel
+        name, model_path = version
+        return self._get(('model', model_type, name), lambda: BaseModel.load(resolve_path(model_path)))
+
+    def activate(self, model_type, version):
+        """
+        Hot-swap `model_type` to `version`: the new artifacts are loaded first,
+        then the active flag moves in one transaction, so requests see either
+        the old set or the fully loaded new one.
+        """
+        target = MLModelVersion.objects.get(model_type=model_type, version=version)
+        versions = dict(active_versions())
+        versions[model_type] = (target.version, target.model_path)
+        if _is_service_dir(resolve_path(target.model_path)):
+            self.service(versions)
+        else:
+            from .models.base_model import BaseModel
+            self._get(('model', model_type, target.version),
+                      lambda: BaseModel.load(resolve_path(target.model_path)))
+
+        with transaction.atomic():
+            MLModelVersion.objects.filter(model_type=model_type, is_active=True).exclude(
+                pk=target.pk).update(is_active=False)
+            MLModelVersion.objects.filter(pk=target.pk).update(is_active=True)
+            # update() sends no signals
+            transaction.on_commit(forget_active_versions)
+        return target
+
+    def stats(self):
+        with self._lock:
+            loaded = [{'key': ':'.join(key), 'load_seconds': self._load_seconds.get(key)}
+                      for key in self._loaded]
+        return {
+            'active': active_version_fingerprint(),
+            'loaded': loaded,
+            'max_loaded': self.max_loaded,
+            'loads': self._loads,
+            'evictions': self._evictions,
+        }
@@ -1,3 +1,9 @@
+"""
+Synthetic training data and the disease, churn and recommendation trainers.
+
+Run as a module from the project root, so its package imports resolve:
+    python -m core.ml.train_models --samples 10000
+"""
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
@@ -6,78 +12,156 @@ from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 import joblib
-from faker import Faker
-import random
 from datetime import datetime, timedelta
 import os
+import time
+
+from .flat_forest import export_forests
 
-fake = Faker()
 MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
 
-def generate_training_data(n_samples=1000):
-    data = []
-    for _ in range(n_samples):
-        # Customer features
-        age = random.randint(18, 80)
-        income = random.randint(30000, 200000)
-        years_as_customer = random.randint(1, 20)
-        num_products = random.randint(1, 5)
-        total_claims = random.randint(0, 10)
-        
-        # Feedback and interaction features
-        avg_sentiment = random.uniform(0, 1)
-        num_complaints = random.randint(0, 5)
-        response_time = random.randint(1, 48)
-        
-        # Contract features
-        premium = random.randint(1000, 5000)
-        coverage = random.randint(50000, 1000000)
-        payment_delay = random.randint(0, 30)
-        
-        # Additional features for product recommendation
-        risk_tolerance = random.choice(['low', 'medium', 'high'])
-        family_size = random.randint(1, 6)
-        employment_status = random.choice(['employed', 'self-employed', 'retired'])
-        
-        # Target variables with more realistic relationships
-        disease_risk = 1 if (age > 50 and total_claims > 5) or random.random() < 0.3 else 0
-        churn_risk = 1 if (payment_delay > 15 or num_complaints > 3) or random.random() < 0.2 else 0
-        
-        # Product score based on multiple factors
-        base_score = random.uniform(0.3, 0.7)
-        age_factor = min((age - 18) / 62, 1) * 0.2
-        income_factor = min(income / 200000, 1) * 0.2
-        loyalty_factor = min(years_as_customer / 20, 1) * 0.2
-        sentiment_factor = avg_sentiment * 0.2
-        risk_factor = {'low': 0.1, 'medium': 0.2, 'high': 0.3}[risk_tolerance]
-        
-        product_score = (base_score + age_factor + income_factor + 
-                        loyalty_factor + sentiment_factor + risk_factor)
-        product_score = min(max(product_score, 0), 1)
-        
-        data.append({
-            'age': age,
-            'income': income,
-            'years_as_customer': years_as_customer,
-            'num_products': num_products,
-            'total_claims': total_claims,
-            'avg_sentiment': avg_sentiment,
-            'num_complaints': num_complaints,
-            'response_time': response_time,
-            'premium': premium,
-            'coverage': coverage,
-            'payment_delay': payment_delay,
-            'risk_tolerance': risk_tolerance,
-            'family_size': family_size,
-            'employment_status': employment_status,
-            'disease_risk': disease_risk,
-            'churn_risk': churn_risk,
-            'product_score': product_score
-        })
-    
-    return pd.DataFrame(data)
-
-def train_disease_risk_model(df):
+DEFAULT_CHUNK_SIZE = 500000
+
+RISK_TOLERANCES = np.array(['low', 'medium', 'high'])
+EMPLOYMENT_STATUSES = np.array(['employed', 'self-employed', 'retired'])
+RISK_TOLERANCE_FACTOR = np.array([0.1, 0.2, 0.3])  # indexed like RISK_TOLERANCES
+
+# Forest hyperparameters per model; `params` passed to a trainer override them
+# (see core/ml/tuning.py for searching them)
+FOREST_PARAMS = {
+    'DISEASE': {'n_estimators': 100},
+    'CHURN': {'n_estimators': 100},
+    'PRODUCT': {'n_estimators': 200, 'max_depth': 10, 'min_samples_split': 5, 'min_samples_leaf': 2},
+}
+
+def forest_params(model_type, params=None):
+    return {**FOREST_PARAMS[model_type], **(params or {})}
+
+def _generate_chunk(rng, n_samples):
+    """n_samples rows drawn from `rng`; integer ranges are inclusive, as with random.randint"""
+    # Customer features
+    age = rng.integers(18, 81, n_samples)
+    income = rng.integers(30000, 200001, n_samples)
+    years_as_customer = rng.integers(1, 21, n_samples)
+    num_products = rng.integers(1, 6, n_samples)
+    total_claims = rng.integers(0, 11, n_samples)
+
+    # Feedback and interaction features
+    avg_sentiment = rng.random(n_samples)
+    num_complaints = rng.integers(0, 6, n_samples)
+    response_time = rng.integers(1, 49, n_samples)
+
+    # Contract features
+    premium = rng.integers(1000, 5001, n_samples)
+    coverage = rng.integers(50000, 1000001, n_samples)
+    payment_delay = rng.integers(0, 31, n_samples)
+
+    # Additional features for product recommendation
+    risk_idx = rng.integers(0, len(RISK_TOLERANCES), n_samples)
+    family_size = rng.integers(1, 7, n_samples)
+    employment_idx = rng.integers(0, len(EMPLOYMENT_STATUSES), n_samples)
+
+    # Target variables with more realistic relationships
+    disease_risk = (((age > 50) & (total_claims > 5)) | (rng.random(n_samples) < 0.3)).astype(np.int64)
+    churn_risk = ((payment_delay > 15) | (num_complaints > 3) | (rng.random(n_samples) < 0.2)).astype(np.int64)
+
+    # Product score based on multiple factors
+    base_score = rng.uniform(0.3, 0.7, n_samples)
+    age_factor = np.minimum((age - 18) / 62, 1) * 0.2
+    income_factor = np.minimum(income / 200000, 1) * 0.2
+    loyalty_factor = np.minimum(years_as_customer / 20, 1) * 0.2
+    sentiment_factor = avg_sentiment * 0.2
+    risk_factor = RISK_TOLERANCE_FACTOR[risk_idx]
+
+    product_score = (base_score + age_factor + income_factor +
+                     loyalty_factor + sentiment_factor + risk_factor)
+    product_score = np.clip(product_score, 0, 1)
+
+    return pd.DataFrame({
+        'age': age,
+        'income': income,
+        'years_as_customer': years_as_customer,
+        'num_products': num_products,
+        'total_claims': total_claims,
+        'avg_sentiment': avg_sentiment,
+        'num_complaints': num_complaints,
+        'response_time': response_time,
+        'premium': premium,
+        'coverage': coverage,
+        'payment_delay': payment_delay,
+        'risk_tolerance': RISK_TOLERANCES[risk_idx].astype(object),
+        'family_size': family_size,
+        'employment_status': EMPLOYMENT_STATUSES[employment_idx].astype(object),
+        'disease_risk': disease_risk,
+        'churn_risk': churn_risk,
+        'product_score': product_score
+    })
+
+def iter_training_data(n_samples, chunk_size=DEFAULT_CHUNK_SIZE, seed=None):
+    """Yield generate_training_data's rows as DataFrames of at most chunk_size rows"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_samples, chunk_size):
+        yield _generate_chunk(rng, min(chunk_size, n_samples - start))
+
+def generate_training_data(n_samples=1000, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Synthetic customers with disease_risk/churn_risk/product_score targets; `seed` makes it reproducible"""
+    return pd.concat(iter_training_data(n_samples, chunk_size, seed), ignore_index=True)
+
+def write_training_data(path, n_samples, chunk_size=DEFAULT_CHUNK_SIZE, seed=None):
+    """
+    Generate straight to disk, one chunk in memory at a time.
+    A path ending in .parquet writes one Parquet file (requires pyarrow);
+    anything else is a directory of compressed part-NNNNN.npz files.
+    """
+    chunks = iter_training_data(n_samples, chunk_size, seed)
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return path
+
+    os.makedirs(path, exist_ok=True)
+    for i, chunk in enumerate(chunks):
+        # Fixed-width strings so the files load with allow_pickle=False
+        arrays = {column: (chunk[column].to_numpy() if pd.api.types.is_numeric_dtype(chunk[column])
+                           else chunk[column].to_numpy().astype(str))
+                  for column in chunk.columns}
+        np.savez_compressed(os.path.join(path, f'part-{i:05d}.npz'), **arrays)
+    return path
+
+def iter_training_files(path, columns=None):
+    """Yield the chunks written by write_training_data as DataFrames"""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        for i in range(parquet.num_row_groups):
+            yield parquet.read_row_group(i, columns=columns).to_pandas()
+        return
+
+    for name in sorted(os.listdir(path)):
+        if not name.endswith('.npz'):
+            continue
+        with np.load(os.path.join(path, name), allow_pickle=False) as data:
+            arrays = {column: data[column] for column in columns or data.files}
+            yield pd.DataFrame({
+                column: values.astype(object) if values.dtype.kind == 'U' else values
+                for column, values in arrays.items()
+            })
+
+def read_training_data(path, columns=None):
+    return pd.concat(iter_training_files(path, columns), ignore_index=True)
+
+def train_disease_risk_model(df, model_dir=None, n_jobs=None, params=None):
+    model_dir = model_dir or MODEL_DIR
     features = ['age', 'total_claims', 'num_products', 'premium', 'coverage']
     X = df[features]
     y = df['disease_risk']
@@ -88,16 +172,24 @@ def train_disease_risk_model(df):
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    params = forest_params('DISEASE', params)
+    model = RandomForestClassifier(**params, random_state=42, n_jobs=n_jobs)
+    started = time.perf_counter()
     model.fit(X_train_scaled, y_train)
+    fit_seconds = time.perf_counter() - started
     
     accuracy = model.score(X_test_scaled, y_test)
     print(f'Disease Risk Model Accuracy: {accuracy:.2f}')
     
-    joblib.dump(model, os.path.join(MODEL_DIR, 'disease_model.pkl'))
-    joblib.dump(scaler, os.path.join(MODEL_DIR, 'disease_scaler.pkl'))
+    # Single-row serving is slower with a worker pool per predict call
+    model.n_jobs = None
+    joblib.dump(model, os.path.join(model_dir, 'disease_model.pkl'))
+    joblib.dump(scaler, os.path.join(model_dir, 'disease_scaler.pkl'))
+    return {'accuracy': accuracy, 'fit_seconds': round(fit_seconds, 3), 'train_rows': len(X_train),
+            'params': params}
 
-def train_churn_model(df):
+def train_churn_model(df, model_dir=None, n_jobs=None, params=None):
+    model_dir = model_dir or MODEL_DIR
     features = ['years_as_customer', 'num_complaints', 'avg_sentiment', 'payment_delay', 'premium']
     X = df[features]
     y = df['churn_risk']
@@ -108,20 +200,28 @@ def train_churn_model(df):
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    params = forest_params('CHURN', params)
+    model = RandomForestClassifier(**params, random_state=42, n_jobs=n_jobs)
+    started = time.perf_counter()
     model.fit(X_train_scaled, y_train)
+    fit_seconds = time.perf_counter() - started
     
     accuracy = model.score(X_test_scaled, y_test)
     print(f'Churn Model Accuracy: {accuracy:.2f}')
     
-    joblib.dump(model, os.path.join(MODEL_DIR, 'churn_model.pkl'))
-    joblib.dump(scaler, os.path.join(MODEL_DIR, 'churn_scaler.pkl'))
+    # Single-row serving is slower with a worker pool per predict call
+    model.n_jobs = None
+    joblib.dump(model, os.path.join(model_dir, 'churn_model.pkl'))
+    joblib.dump(scaler, os.path.join(model_dir, 'churn_scaler.pkl'))
+    return {'accuracy': accuracy, 'fit_seconds': round(fit_seconds, 3), 'train_rows': len(X_train),
+            'params': params}
 
-def train_product_recommendation_model(df):
-    numerical_features = ['age', 'income', 'num_products', 'avg_sentiment', 'years_as_customer', 
-                         'family_size', 'total_claims', 'premium']
-    categorical_features = ['risk_tolerance', 'employment_status']
-    
+RECOMMENDATION_NUMERICAL = ['age', 'income', 'num_products', 'avg_sentiment', 'years_as_customer',
+                            'family_size', 'total_claims', 'premium']
+RECOMMENDATION_CATEGORICAL = ['risk_tolerance', 'employment_status']
+
+def recommendation_preprocessor():
+    """Unfitted scaling + one-hot step of the recommendation pipeline"""
     numeric_transformer = Pipeline(steps=[
         ('scaler', StandardScaler())
     ])
@@ -130,38 +230,63 @@ def train_product_recommendation_model(df):
         ('onehot', OneHotEncoder(drop='first', sparse_output=False))
     ])
     
-    preprocessor = ColumnTransformer(
+    return ColumnTransformer(
         transformers=[
-            ('num', numeric_transformer, numerical_features),
-            ('cat', categorical_transformer, categorical_features)
+            ('num', numeric_transformer, RECOMMENDATION_NUMERICAL),
+            ('cat', categorical_transformer, RECOMMENDATION_CATEGORICAL)
         ])
+
+def train_product_recommendation_model(df, model_dir=None, n_jobs=None, params=None):
+    model_dir = model_dir or MODEL_DIR
+    params = forest_params('PRODUCT', params)
     
     model = Pipeline(steps=[
-        ('preprocessor', preprocessor),
-        ('regressor', RandomForestRegressor(n_estimators=200, 
-                                          max_depth=10,
-                                          min_samples_split=5,
-                                          min_samples_leaf=2,
-                                          random_state=42))
+        ('preprocessor', recommendation_preprocessor()),
+        ('regressor', RandomForestRegressor(**params, random_state=42, n_jobs=n_jobs))
     ])
     
-    X = df[numerical_features + categorical_features]
+    X = df[RECOMMENDATION_NUMERICAL + RECOMMENDATION_CATEGORICAL]
     y = df['product_score']
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
+    started = time.perf_counter()
     model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
     
     r2_score = model.score(X_test, y_test)
     print(f'Product Recommendation Model R2 Score: {r2_score:.2f}')
     
-    joblib.dump(model, os.path.join(MODEL_DIR, 'recommendation_model.pkl'))
+    model.named_steps['regressor'].n_jobs = None
+    joblib.dump(model, os.path.join(model_dir, 'recommendation_model.pkl'))
+    return {'r2': r2_score, 'fit_seconds': round(fit_seconds, 3), 'train_rows': len(X_train),
+            'params': params}
 
 if __name__ == '__main__':
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    df = generate_training_data(n_samples=10000)
-    
-    train_disease_risk_model(df)
-    train_churn_model(df)
-    train_product_recommendation_model(df)
-    
-    print(f'Models saved in: {MODEL_DIR}')
+    import argparse
+    parser = argparse.ArgumentParser(description='Train the disease, churn and recommendation models')
+    parser.add_argument('--samples', type=int, default=10000, help='Synthetic rows to generate')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible data')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--data', default=None,
+                        help='Train on data written by --write-data instead of generating it')
+    parser.add_argument('--write-data', default=None,
+                        help='Only generate --samples rows to this .parquet file / .npz directory')
+    args = parser.parse_args()
+
+    if args.write_data:
+        write_training_data(args.write_data, args.samples, args.chunk_size, args.seed)
+        print(f'Training data written to: {args.write_data}')
+    else:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        if args.data:
+            df = read_training_data(args.data)
+        else:
+            df = generate_training_data(n_samples=args.samples, seed=args.seed, chunk_size=args.chunk_size)
+        
+        train_disease_risk_model(df)
+        train_churn_model(df)
+        train_product_recommendation_model(df)
+        # Re-export, or the flat forests left from the last run are served with the new scalers
+        export_forests(MODEL_DIR)
+        
+        print(f'Models saved in: {MODEL_DIR}')
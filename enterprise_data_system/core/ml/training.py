@@ -0,0 +1,128 @@
+"""
+Parallel training of the disease, churn and recommendation models.
+
+Each model trains in its own process; the CPU budget is split between them
+as RandomForest n_jobs in proportion to their tree counts, so all three run
+at once without oversubscribing the machine. Every model writes its
+artifacts (pickles plus the flat-forest export) into its own versioned
+directory, which ModelRegistry can serve directly.
+
+Kept free of Django imports so the pool works under any start method;
+core.tasks.train_models records the results as MLModelTrainingJob /
+MLModelVersion rows. Standalone, from the project root:
+    python -m core.ml.training --cpu-budget 16 --samples 1000000
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .flat_forest import export_forests
+from .train_models import (
+    MODEL_DIR, generate_training_data, read_training_data,
+    train_disease_risk_model, train_churn_model, train_product_recommendation_model,
+)
+
+MODEL_TYPES = ['DISEASE', 'CHURN', 'PRODUCT']
+
+TRAINERS = {
+    'DISEASE': train_disease_risk_model,
+    'CHURN': train_churn_model,
+    'PRODUCT': train_product_recommendation_model,
+}
+
+# Relative fitting cost, used to split the CPU budget (trees per forest)
+TRAINING_COST = {'DISEASE': 100, 'CHURN': 100, 'PRODUCT': 200}
+
+DEFAULT_SAMPLES = 10000
+
+
+def version_name(model_type, now=None):
+    return f"{model_type}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}"
+
+
+def split_cpu_budget(model_types, cpu_budget=None):
+    """{model_type: n_jobs} sharing `cpu_budget` cores (default: all) by training cost"""
+    cpu_budget = cpu_budget or os.cpu_count() or 1
+    total = sum(TRAINING_COST[model_type] for model_type in model_types)
+    return {
+        model_type: max(1, round(cpu_budget * TRAINING_COST[model_type] / total))
+        for model_type in model_types
+    }
+
+
+def train_one(model_type, output_dir, n_jobs=None, n_samples=DEFAULT_SAMPLES, seed=None, data_path=None,
+              params=None):
+    """
+    Train one model into `output_dir` and export its flat forest; `params`
+    override the model's FOREST_PARAMS.
+    Returns {'metrics', 'timings'}; timings are seconds per stage.
+    """
+    timings = {}
+    started = time.perf_counter()
+    # Every worker builds the same data from the seed rather than receiving a pickled copy
+    df = read_training_data(data_path) if data_path else generate_training_data(n_samples, seed=seed)
+    timings['data'] = round(time.perf_counter() - started, 3)
+
+    os.makedirs(output_dir, exist_ok=True)
+    stage = time.perf_counter()
+    metrics = TRAINERS[model_type](df, model_dir=output_dir, n_jobs=n_jobs, params=params)
+    timings['fit'] = metrics.pop('fit_seconds')
+    timings['evaluate_and_save'] = round(time.perf_counter() - stage - timings['fit'], 3)
+
+    stage = time.perf_counter()
+    export_forests(output_dir)
+    timings['export'] = round(time.perf_counter() - stage, 3)
+    timings['total'] = round(time.perf_counter() - started, 3)
+    return {'metrics': metrics, 'timings': timings, 'n_jobs': n_jobs}
+
+
+def train_all(model_types=MODEL_TYPES, output_root=None, cpu_budget=None, n_samples=DEFAULT_SAMPLES,
+              seed=None, data_path=None, params=None):
+    """
+    Train `model_types` concurrently, one process each; `params` is an optional
+    {model_type: forest params} (e.g. a tuned candidate, see tuning.py).
+    Returns {'models': {model_type: {'version', 'path', 'metrics', 'timings', 'n_jobs'}
+    or {'version', 'error'}}, 'wall_seconds', 'seed'}.
+    """
+    output_root = output_root or os.path.join(MODEL_DIR, 'versions')
+    n_jobs = split_cpu_budget(model_types, cpu_budget)
+    if seed is None:
+        # Still one seed for all workers, so every model sees the same data
+        seed = int.from_bytes(os.urandom(4), 'little')
+    now = time.time()
+    versions = {model_type: version_name(model_type, now) for model_type in model_types}
+    params = params or {}
+
+    started = time.perf_counter()
+    models = {}
+    with ProcessPoolExecutor(max_workers=len(model_types)) as pool:
+        futures = {
+            model_type: pool.submit(train_one, model_type, os.path.join(output_root, versions[model_type]),
+                                    n_jobs[model_type], n_samples, seed, data_path, params.get(model_type))
+            for model_type in model_types
+        }
+        for model_type, future in futures.items():
+            try:
+                models[model_type] = {
+                    'version': versions[model_type],
+                    'path': os.path.join(output_root, versions[model_type]),
+                    **future.result(),
+                }
+            except Exception as e:
+                # One failed model shouldn't discard the others
+                models[model_type] = {'version': versions[model_type], 'error': str(e)}
+    return {'models': models, 'wall_seconds': round(time.perf_counter() - started, 3), 'seed': seed}
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Train all models in parallel into versioned directories')
+    parser.add_argument('--models', nargs='+', choices=MODEL_TYPES, default=MODEL_TYPES)
+    parser.add_argument('--cpu-budget', type=int, default=None, help='Cores to use (default: all)')
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--data', default=None, help='Train on data written by train_models --write-data')
+    args = parser.parse_args()
+    print(json.dumps(train_all(args.models, cpu_budget=args.cpu_budget, n_samples=args.samples,
+                               seed=args.seed, data_path=args.data), indent=2, default=float))
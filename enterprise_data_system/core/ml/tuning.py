@@ -0,0 +1,264 @@
+"""
+Cross-validated forest hyperparameter search, scored on quality and latency.
+
+Each model's data is split into folds once; every fold is preprocessed the
+way train_models.py does it (scaler / one-hot fitted on the training part)
+and cached as .npy files, so the search never repeats preprocessing and
+workers memory-map the same arrays instead of receiving pickled copies.
+Every (candidate, fold) fit is a task for a process pool sized to the CPU
+budget, one core per fit. Latency is then timed serially, on the flat forest
+PredictionService serves (single-row predict and per-row cost of a batch),
+so concurrent fits don't distort it. Candidates no other candidate beats on
+score, row latency and batch latency form the Pareto frontier; any of them
+can be trained and activated with core.tasks.promote_tuned.
+
+Kept free of Django imports, like training.py. From the project root:
+    python -m core.ml.tuning --models CHURN --samples 20000 --report tuning.json
+"""
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import accuracy_score, r2_score
+from sklearn.model_selection import KFold, StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+
+from .flat_forest import FlatForest, MODEL_DIR
+from .predict import DISEASE_FEATURES, CHURN_FEATURES, RECOMMENDATION_FEATURES
+from .train_models import forest_params, generate_training_data, read_training_data, recommendation_preprocessor
+from .training import MODEL_TYPES
+
+# model_type -> (features, target, metric name)
+TARGETS = {
+    'DISEASE': (DISEASE_FEATURES, 'disease_risk', 'accuracy'),
+    'CHURN': (CHURN_FEATURES, 'churn_risk', 'accuracy'),
+    'PRODUCT': (RECOMMENDATION_FEATURES, 'product_score', 'r2'),
+}
+
+SEARCH_SPACE = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [6, 10, None],
+    'min_samples_leaf': [1, 5],
+}
+
+DEFAULT_FOLDS = 3
+DEFAULT_SAMPLES = 10000
+DEFAULT_SEED = 42
+CACHE_DIR = os.path.join(MODEL_DIR, 'tuning_cache')
+# Rows per batch in the batch latency measurement
+BATCH_ROWS = 1000
+LATENCY_REPEAT = 50
+
+
+def candidates(model_type, space=None):
+    """
+    [(candidate id, params)]: the current FOREST_PARAMS ('<MODEL>-baseline')
+    plus the grid. Grid points are merged over FOREST_PARAMS, as the trainers
+    merge them, so a candidate is fitted with exactly the params it is promoted with.
+    """
+    space = space or SEARCH_SPACE
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    return [(f'{model_type}-baseline', forest_params(model_type))] + [
+        (f'{model_type}-{i}', forest_params(model_type, params)) for i, params in enumerate(grid)
+    ]
+
+
+def _preprocess(model_type, train, test):
+    features = TARGETS[model_type][0]
+    if model_type == 'PRODUCT':
+        step = recommendation_preprocessor().fit(train[features])
+    else:
+        step = StandardScaler().fit(train[features])
+    return step.transform(train[features]), step.transform(test[features])
+
+
+def fold_dir(model_type, n_samples, seed, n_folds, data_path=None, cache_dir=CACHE_DIR):
+    """Cache directory of one model's folds, keyed by everything that determines their content"""
+    key = json.dumps([model_type, n_samples, seed, n_folds, data_path and os.path.abspath(data_path)])
+    return os.path.join(cache_dir, f"{model_type}-{hashlib.sha1(key.encode()).hexdigest()[:12]}")
+
+
+def cache_folds(model_type, df, path, n_folds, seed):
+    """Write fold-<k>-{X_train,y_train,X_test,y_test}.npy under `path` unless already cached"""
+    if os.path.exists(os.path.join(path, 'folds.json')):
+        return path
+    os.makedirs(path, exist_ok=True)
+    _, target, metric = TARGETS[model_type]
+    y = df[target].to_numpy()
+    splitter = (KFold(n_folds, shuffle=True, random_state=seed) if metric == 'r2'
+                else StratifiedKFold(n_folds, shuffle=True, random_state=seed))
+    for k, (train_idx, test_idx) in enumerate(splitter.split(np.zeros(len(y)), y)):
+        X_train, X_test = _preprocess(model_type, df.iloc[train_idx], df.iloc[test_idx])
+        for name, array in (('X_train', X_train), ('y_train', y[train_idx]),
+                            ('X_test', X_test), ('y_test', y[test_idx])):
+            np.save(os.path.join(path, f'fold-{k}-{name}.npy'), np.ascontiguousarray(array))
+    # Written last: a directory without it is an interrupted cache and is rebuilt
+    with open(os.path.join(path, 'folds.json'), 'w') as f:
+        json.dump({'model_type': model_type, 'folds': n_folds, 'rows': len(df)}, f)
+    return path
+
+
+def _load_fold(path, k):
+    return [np.load(os.path.join(path, f'fold-{k}-{name}.npy'), mmap_mode='r')
+            for name in ('X_train', 'y_train', 'X_test', 'y_test')]
+
+
+def fit_fold(model_type, candidate_id, params, path, k):
+    """
+    Fit one candidate on one cached fold with a single core; returns its score
+    and fit time. The fold-0 forest is flattened for the latency measurement.
+    """
+    X_train, y_train, X_test, y_test = _load_fold(path, k)
+    metric = TARGETS[model_type][2]
+    forest_cls = RandomForestRegressor if metric == 'r2' else RandomForestClassifier
+    model = forest_cls(**params, random_state=42, n_jobs=1)
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+
+    y_pred = model.predict(X_test)
+    score = r2_score(y_test, y_pred) if metric == 'r2' else accuracy_score(y_test, y_pred)
+    if k == 0:
+        FlatForest.from_sklearn(model).save(os.path.join(path, f'{candidate_id}.forest.npz'))
+    return {'score': float(score), 'fit_seconds': fit_seconds}
+
+
+def _median_seconds(fn, X, repeat):
+    fn(X)  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def measure_latency(forest_path, X):
+    """(single-row ms, per-row us within a BATCH_ROWS batch) of the served flat forest"""
+    forest = FlatForest.load(forest_path)
+    predict = forest.predict_proba if forest.is_classifier else forest.predict
+    batch = np.asarray(X[:BATCH_ROWS])
+    row_seconds = _median_seconds(predict, batch[:1], LATENCY_REPEAT)
+    batch_seconds = _median_seconds(predict, batch, max(LATENCY_REPEAT // 10, 3))
+    return row_seconds * 1e3, batch_seconds / len(batch) * 1e6
+
+
+def pareto_front(results, maximize=('score',), minimize=('row_ms', 'batch_us')):
+    """Ids of the results no other result is at least as good as on every objective and better on one"""
+    def dominates(a, b):
+        at_least = (all(a[key] >= b[key] for key in maximize) and all(a[key] <= b[key] for key in minimize))
+        better = (any(a[key] > b[key] for key in maximize) or any(a[key] < b[key] for key in minimize))
+        return at_least and better
+
+    front = [r for r in results if not any(dominates(other, r) for other in results)]
+    return [r['id'] for r in sorted(front, key=lambda r: r['row_ms'])]
+
+
+def tune(model_types=MODEL_TYPES, n_samples=DEFAULT_SAMPLES, n_folds=DEFAULT_FOLDS, seed=DEFAULT_SEED,
+         data_path=None, cpu_budget=None, space=None, cache_dir=CACHE_DIR):
+    """
+    Search every model's candidates in parallel. Returns a report:
+    {'models': {model_type: {'metric', 'candidates': [{'id', 'params', 'score',
+    'score_std', 'fit_seconds', 'row_ms', 'batch_us', 'score_per_ms'}],
+    'frontier': [ids, fastest first]}}, 'samples', 'folds', 'seed', 'data',
+    'wall_seconds'}.
+    """
+    started = time.perf_counter()
+    paths = {model_type: fold_dir(model_type, n_samples, seed, n_folds, data_path, cache_dir)
+             for model_type in model_types}
+    if not all(os.path.exists(os.path.join(path, 'folds.json')) for path in paths.values()):
+        df = read_training_data(data_path) if data_path else generate_training_data(n_samples, seed=seed)
+        for model_type, path in paths.items():
+            cache_folds(model_type, df, path, n_folds, seed)
+        del df
+    searched = {model_type: candidates(model_type, space) for model_type in model_types}
+    workers = cpu_budget or os.cpu_count() or 1
+
+    fold_results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            (model_type, candidate_id, k): pool.submit(fit_fold, model_type, candidate_id, params,
+                                                        paths[model_type], k)
+            for model_type in model_types
+            for candidate_id, params in searched[model_type]
+            for k in range(n_folds)
+        }
+        for key, future in futures.items():
+            fold_results[key] = future.result()
+
+    report = {'models': {}, 'samples': n_samples, 'folds': n_folds, 'seed': seed, 'data': data_path}
+    for model_type in model_types:
+        X_latency = _load_fold(paths[model_type], 0)[2]
+        results = []
+        for candidate_id, params in searched[model_type]:
+            folds = [fold_results[(model_type, candidate_id, k)] for k in range(n_folds)]
+            scores = [fold['score'] for fold in folds]
+            row_ms, batch_us = measure_latency(os.path.join(paths[model_type], f'{candidate_id}.forest.npz'),
+                                               X_latency)
+            results.append({
+                'id': candidate_id,
+                'params': params,
+                'score': round(float(np.mean(scores)), 4),
+                'score_std': round(float(np.std(scores)), 4),
+                'fit_seconds': round(float(np.mean([fold['fit_seconds'] for fold in folds])), 3),
+                'row_ms': round(row_ms, 4),
+                'batch_us': round(batch_us, 3),
+                'score_per_ms': round(float(np.mean(scores)) / row_ms, 3),
+            })
+        report['models'][model_type] = {
+            'metric': TARGETS[model_type][2],
+            'candidates': results,
+            'frontier': pareto_front(results),
+        }
+    report['wall_seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def find_candidate(report, candidate_id):
+    """(model_type, candidate) of `candidate_id` in a tune() report"""
+    model_type = candidate_id.rsplit('-', 1)[0]
+    for candidate in report['models'].get(model_type, {}).get('candidates', []):
+        if candidate['id'] == candidate_id:
+            return model_type, candidate
+    raise KeyError(f"No candidate {candidate_id!r} in the tuning report")
+
+
+def format_frontier(report):
+    """Printable frontier table of every model in a tune() report"""
+    lines = []
+    for model_type, result in report['models'].items():
+        by_id = {candidate['id']: candidate for candidate in result['candidates']}
+        lines.append(f"{model_type} ({result['metric']}, {report['folds']}-fold)")
+        lines.append(f"  {'id':<18}{'score':>8}{'1-row ms':>10}{'batch us':>10}{'score/ms':>10}  params")
+        for candidate_id in result['frontier']:
+            c = by_id[candidate_id]
+            lines.append(f"  {c['id']:<18}{c['score']:>8.4f}{c['row_ms']:>10.3f}{c['batch_us']:>10.2f}"
+                         f"{c['score_per_ms']:>10.2f}  {json.dumps(c['params'])}")
+        baseline = by_id.get(f'{model_type}-baseline')
+        if baseline and baseline['id'] not in result['frontier']:
+            lines.append(f"  {baseline['id']:<18}{baseline['score']:>8.4f}{baseline['row_ms']:>10.3f}"
+                         f"{baseline['batch_us']:>10.2f}{baseline['score_per_ms']:>10.2f}  (not on the frontier)")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Cross-validated hyperparameter search on quality and latency')
+    parser.add_argument('--models', nargs='+', choices=MODEL_TYPES, default=MODEL_TYPES)
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument('--folds', type=int, default=DEFAULT_FOLDS)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--data', default=None, help='Tune on data written by train_models --write-data')
+    parser.add_argument('--cpu-budget', type=int, default=None, help='Cores to use (default: all)')
+    parser.add_argument('--report', default=None, help='Write the full report to this JSON file')
+    args = parser.parse_args()
+    result = tune(args.models, args.samples, args.folds, args.seed, args.data, args.cpu_budget)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(result, f, indent=2)
+    print(format_frontier(result))
@@ -11,6 +11,7 @@ from .billing_models import (
 from .customer_models import (
     Customer,
     CustomerIdentity,
+    CustomerFeatures,
 )
 
 from .analytics_models import (
@@ -32,6 +33,7 @@ from .contract_models import (
     ContractPayment,
     ContractBankAccount,
     ContractCreditCard,
+    ContractQuote,
 )
 
 from .invoice_models import Invoice
@@ -48,6 +50,7 @@ __all__ = [
     # Customer Models
     'Customer',
     'CustomerIdentity',
+    'CustomerFeatures',
 
     # Analytics Models
     'MLModelVersion',
@@ -67,5 +70,6 @@ __all__ = [
     'ContractPayment',
     'ContractBankAccount',
     'ContractCreditCard',
+    'ContractQuote',
     'Invoice',
 ]
@@ -9,6 +9,7 @@ class Account(models.Model):
     emp_count = models.IntegerField(null=False)
     status = models.CharField(max_length=1, null=False)
     status_date = models.DateField(null=False)
+    customer = models.ForeignKey('Customer', on_delete=models.CASCADE, null=True, related_name='accounts')
 
     class Meta:
         db_table = 'account'
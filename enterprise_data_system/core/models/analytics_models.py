@@ -110,4 +110,6 @@ class ProductRecommendation(models.Model):
         indexes = [
             models.Index(fields=['recommendation_score'], name='idx_recommendation'),
             models.Index(fields=['recommendation_date'], name='idx_recommendation_date'),
+            # Serves a customer's recommendations best first
+            models.Index(fields=['customer', '-recommendation_score'], name='idx_recommendation_customer'),
         ]
@@ -85,3 +85,20 @@ class ContractCreditCard(models.Model):
 
     class Meta:
         db_table = 'contractcreditcard'
+
+class ContractQuote(models.Model):
+    id = models.AutoField(primary_key=True)
+    contract = models.ForeignKey(Contract, on_delete=models.CASCADE, db_column='contract_id')
+    base_premium = models.DecimalField(max_digits=10, decimal_places=2, null=False)
+    disease_risk = models.FloatField()
+    churn_probability = models.FloatField()
+    risk_factor = models.FloatField()
+    loyalty_discount = models.FloatField()
+    final_premium = models.DecimalField(max_digits=10, decimal_places=2, null=False)
+    quoted_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'contractquote'
+        indexes = [
+            models.Index(fields=['quoted_at'], name='idx_quote_date'),
+        ]
@@ -39,3 +39,27 @@ class CustomerIdentity(models.Model):
 
     class Meta:
         db_table = 'customeridentity'
+
+class CustomerFeatures(models.Model):
+    """
+    Model inputs per customer, kept current by core.features.refresh_customer_features
+    (wired to the source tables in core/signals.py). dob and start_date are stored
+    rather than age and tenure, which change daily.
+    """
+    customer = models.OneToOneField(Customer, primary_key=True, on_delete=models.CASCADE, db_column='customer_id')
+    dob = models.DateField(null=True)
+    start_date = models.DateField()
+    contracts_count = models.IntegerField(default=0)
+    claims_count = models.IntegerField(default=0)
+    delayed_payments = models.IntegerField(default=0)
+    total_premium = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_coverage = models.FloatField(default=0)
+    feedback_count = models.IntegerField(default=0)
+    avg_sentiment = models.FloatField(null=True)
+    complaints_count = models.IntegerField(default=0)
+    call_count = models.IntegerField(default=0)
+    avg_call_sentiment = models.FloatField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'customerfeatures'
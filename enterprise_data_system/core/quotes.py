@@ -0,0 +1,160 @@
+"""
+Premium quoting rules and the vectorized portfolio re-quoting job.
+
+price_quotes() is the single definition of the risk-factor and loyalty-discount
+rules; calculate_quote calls it with scalars, requote_portfolio with arrays.
+start_requote() runs requote_portfolio in a background thread for the API.
+"""
+import logging
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+import numpy as np
+from django.db import connections
+from django.utils import timezone
+
+from .features import features_from_store, load_customer_features
+from .models import Contract, ContractQuote
+
+RISK_LOADING = 0.5              # up to 50% increase for high disease risk
+LOYALTY_DISCOUNT = 0.1          # 10% loyalty discount...
+LOYALTY_CHURN_THRESHOLD = 0.3   # ...for customers unlikely to churn
+
+DEFAULT_CHUNK_SIZE = 2000
+MAX_CHUNK_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+# Background re-quote jobs started by this process: job id -> status dict
+REQUOTE_JOBS = {}
+_requote_lock = threading.Lock()
+
+
+def price_quotes(base_premium, disease_risk, churn_probability):
+    """
+    Apply the quoting rules elementwise.
+    Accepts scalars or NumPy arrays; returns (risk_factor, loyalty_discount, final_premium).
+    """
+    base_premium = np.asarray(base_premium, dtype=np.float64)
+    risk_factor = 1 + np.asarray(disease_risk, dtype=np.float64) * RISK_LOADING
+    loyalty_discount = np.where(np.asarray(churn_probability) < LOYALTY_CHURN_THRESHOLD, LOYALTY_DISCOUNT, 0.0)
+    final_premium = base_premium * risk_factor * (1 - loyalty_discount)
+    return risk_factor, loyalty_discount, final_premium
+
+
+def active_contracts():
+    return (
+        Contract.objects
+        .filter(status='A', account__customer__isnull=False, account__customer__end_date__isnull=True)
+        .select_related('contractpayment', 'account')
+        .order_by('id')
+    )
+
+
+def _quote_chunk(contracts, prediction_service, base_premium, quoted_at):
+    # Only the batch job needs pandas; core.views imports this module for price_quotes
+    import pandas as pd
+    features = load_customer_features({contract.account.customer_id for contract in contracts})
+    today = quoted_at.date()
+
+    contract_premiums = np.array([
+        float(contract.contractpayment.premium) if hasattr(contract, 'contractpayment') else 0.0
+        for contract in contracts
+    ])
+    bases = np.full(len(contracts), float(base_premium)) if base_premium is not None else contract_premiums
+
+    X = pd.DataFrame([features_from_store(features[c.account.customer_id], today) for c in contracts])
+    # Quote each contract on its own premium and coverage, as calculate_quote does
+    X['premium'] = bases
+    X['coverage'] = pd.to_numeric([c.coverage for c in contracts], errors='coerce')
+    X['coverage'] = X['coverage'].fillna(0.0)
+
+    disease_risk, churn_probability = prediction_service.predict_risk_arrays(X)
+    risk_factor, loyalty_discount, final_premium = price_quotes(bases, disease_risk, churn_probability)
+
+    ContractQuote.objects.bulk_create([
+        ContractQuote(
+            contract=contract,
+            base_premium=Decimal(f'{bases[i]:.2f}'),
+            disease_risk=float(disease_risk[i]),
+            churn_probability=float(churn_probability[i]),
+            risk_factor=float(risk_factor[i]),
+            loyalty_discount=float(loyalty_discount[i]),
+            final_premium=Decimal(f'{final_premium[i]:.2f}'),
+            quoted_at=quoted_at,
+        )
+        for i, contract in enumerate(contracts)
+    ], batch_size=len(contracts))
+
+
+def requote_portfolio(prediction_service, chunk_size=DEFAULT_CHUNK_SIZE, base_premium=None, progress=None):
+    """
+    Re-quote every active contract of every active customer.
+    Contracts are streamed in chunks of `chunk_size`; each chunk costs one stats
+    query, one predict call per model, NumPy pricing and one bulk insert.
+    base_premium: price every contract from this premium instead of its current one
+    progress: optional callable(quoted_so_far) invoked after each chunk
+    Returns a summary with quote count, elapsed seconds and quotes per second.
+    """
+    quoted_at = timezone.now()
+    started = time.perf_counter()
+    quoted = 0
+
+    chunk = []
+    for contract in active_contracts().iterator(chunk_size=chunk_size):
+        chunk.append(contract)
+        if len(chunk) >= chunk_size:
+            _quote_chunk(chunk, prediction_service, base_premium, quoted_at)
+            quoted += len(chunk)
+            chunk = []
+            if progress:
+                progress(quoted)
+    if chunk:
+        _quote_chunk(chunk, prediction_service, base_premium, quoted_at)
+        quoted += len(chunk)
+        if progress:
+            progress(quoted)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'quoted_at': quoted_at.isoformat(),
+        'quotes': quoted,
+        'seconds': round(elapsed, 3),
+        'quotes_per_second': round(quoted / elapsed, 1) if elapsed > 0 else 0,
+    }
+
+
+def start_requote(prediction_service, chunk_size=DEFAULT_CHUNK_SIZE, base_premium=None):
+    """
+    Run requote_portfolio in a background thread and return its job status
+    dict, which is kept current in REQUOTE_JOBS. Raises RuntimeError while
+    another job of this process is still running.
+    """
+    with _requote_lock:
+        if any(job['status'] == 'STARTED' for job in REQUOTE_JOBS.values()):
+            raise RuntimeError('A portfolio re-quote is already running')
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'status': 'STARTED',
+            'started_at': timezone.now().isoformat(),
+            'chunk_size': chunk_size,
+            'base_premium': base_premium,
+            'quotes': 0,
+        }
+        REQUOTE_JOBS[job['job_id']] = job
+
+    def run():
+        try:
+            summary = requote_portfolio(prediction_service, chunk_size=chunk_size, base_premium=base_premium,
+                                        progress=lambda quoted: job.update(quotes=quoted))
+            job.update(summary, status='COMPLETED')
+        except Exception as e:
+            logger.exception('Portfolio re-quote %s failed', job['job_id'])
+            job.update(status='FAILED', error=str(e))
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=run, name=f"requote-{job['job_id']}", daemon=True).start()
+    return dict(job)
@@ -0,0 +1,156 @@
+"""
+Nightly top-N plan recommendations from plan co-occurrence.
+
+Contract rows give a sparse binary customer x plan matrix A. Plans held by
+the same customers are similar: S is the cosine similarity of A's columns
+(A.T @ A, normalised, diagonal removed). A customer's score for a plan is
+the mean similarity to the plans they already hold, which are excluded;
+customers without contracts get the most widely held plans. Each customer's
+top N replace their ProductRecommendation rows, so the API serves them with
+one indexed lookup instead of running a model per request.
+"""
+import logging
+import time
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Contract, Customer, ProductRecommendation, DataUpdateLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_N = 3
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def holdings():
+    """(customer_ids, plan_ids, A): sorted ids and the binary customer x plan CSR matrix"""
+    # scipy stays off the request path (core.views only reads stored recommendations)
+    from scipy import sparse
+    rows = (Contract.objects.filter(account__customer__isnull=False)
+            .values_list('account__customer_id', 'plan_id'))
+    pairs = np.fromiter((value for pair in rows.iterator(chunk_size=DEFAULT_CHUNK_SIZE) for value in pair),
+                        dtype=np.int64).reshape(-1, 2)
+    customer_ids, customer_idx = np.unique(pairs[:, 0], return_inverse=True)
+    plan_ids, plan_idx = np.unique(pairs[:, 1], return_inverse=True)
+    A = sparse.csr_matrix((np.ones(len(pairs)), (customer_idx, plan_idx)),
+                          shape=(len(customer_ids), len(plan_ids)))
+    A.data[:] = 1.0  # several contracts on one plan still count once
+    return customer_ids, plan_ids, A
+
+
+def plan_similarity(A):
+    """Dense plans x plans cosine similarity with a zero diagonal, and each plan's holder count"""
+    co = (A.T @ A).toarray()
+    counts = np.diag(co).copy()
+    norm = np.sqrt(np.outer(counts, counts))
+    S = np.divide(co, norm, out=np.zeros_like(co), where=norm > 0)
+    np.fill_diagonal(S, 0.0)
+    return S, counts
+
+
+def top_plans(held, S, popularity, n):
+    """
+    (plan indexes, scores) of the top n plans per row of `held` (CSR rows of A),
+    best first; -1 where fewer than n plans score above zero.
+    """
+    n_held = np.asarray(held.sum(axis=1)).ravel()
+    scores = np.asarray(held @ S) / np.maximum(n_held, 1)[:, np.newaxis]
+    scores[n_held == 0] = popularity
+    scores[held.toarray() > 0] = 0.0
+
+    top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    top[top_scores <= 0] = -1
+    return top, top_scores
+
+
+def _customer_chunks(chunk_size):
+    chunk = []
+    customers = Customer.objects.filter(end_date__isnull=True).order_by('pk').values_list('pk', flat=True)
+    for pk in customers.iterator(chunk_size=chunk_size):
+        chunk.append(pk)
+        if len(chunk) >= chunk_size:
+            yield np.array(chunk, dtype=np.int64)
+            chunk = []
+    if chunk:
+        yield np.array(chunk, dtype=np.int64)
+
+
+def recommend_plans(top_n=DEFAULT_TOP_N, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Recompute the top `top_n` plans of every active customer and replace their
+    ProductRecommendation rows. Rows of customers no longer active are removed.
+    Returns a summary with customer, recommendation and plan counts.
+    """
+    from scipy import sparse
+    generated_at = timezone.now()
+    started = time.perf_counter()
+    customer_ids, plan_ids, A = holdings()
+    totals = {'customers': 0, 'recommendations': 0}
+    if not len(plan_ids):
+        logger.warning('No contracts with customers; no plan recommendations computed')
+        return {**totals, 'plans': 0, 'seconds': round(time.perf_counter() - started, 3)}
+
+    S, counts = plan_similarity(A)
+    popularity = counts / len(customer_ids)
+    top_n = min(top_n, len(plan_ids))
+    # One extra empty row stands in for customers without contracts
+    A = sparse.vstack([A, sparse.csr_matrix((1, len(plan_ids)))], format='csr')
+    no_contracts = len(customer_ids)
+
+    for chunk in _customer_chunks(chunk_size):
+        pos = np.minimum(np.searchsorted(customer_ids, chunk), len(customer_ids) - 1)
+        held = A[np.where(customer_ids[pos] == chunk, pos, no_contracts)]
+        top, scores = top_plans(held, S, popularity, top_n)
+
+        rows = [
+            ProductRecommendation(
+                customer_id=int(customer_id),
+                plan_id=int(plan_ids[plan]),
+                recommendation_score=float(score),
+                recommendation_date=generated_at,
+            )
+            for customer_id, plans, plan_scores in zip(chunk, top, scores)
+            for plan, score in zip(plans, plan_scores) if plan >= 0
+        ]
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(customer_id__in=chunk.tolist()).delete()
+            ProductRecommendation.objects.bulk_create(rows, batch_size=len(rows) or None)
+        totals['customers'] += len(chunk)
+        totals['recommendations'] += len(rows)
+        logger.info('Recommended plans for %d customers', totals['customers'])
+
+    ProductRecommendation.objects.filter(recommendation_date__lt=generated_at).delete()
+    DataUpdateLog.objects.create(table_name=ProductRecommendation._meta.db_table, operation='INSERT',
+                                 record_count=totals['recommendations'])
+    return {
+        **totals,
+        'plans': len(plan_ids),
+        'generated_at': generated_at.isoformat(),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def customer_recommendations(customer_id):
+    """Stored recommendations of one customer, best first (one indexed lookup)"""
+    return list(
+        ProductRecommendation.objects.filter(customer_id=customer_id)
+        .order_by('-recommendation_score')
+        .values('plan_id', 'plan__name', 'recommendation_score', 'recommendation_date')
+    )
+
+
+def recommendations_by_customer(customer_ids):
+    """{customer_id: stored recommendations, best first} for many customers in one query"""
+    recommendations = {customer_id: [] for customer_id in customer_ids}
+    rows = (ProductRecommendation.objects.filter(customer_id__in=list(recommendations))
+            .order_by('customer_id', '-recommendation_score')
+            .values('customer_id', 'plan_id', 'plan__name', 'recommendation_score', 'recommendation_date'))
+    for row in rows:
+        recommendations[row.pop('customer_id')].append(row)
+    return recommendations
@@ -0,0 +1,171 @@
+"""
+Retraining scheduler driven by DataUpdateLog.
+
+The row triggers log every write to the tables the models learn from. Pending
+rows (requires_retraining=True) are summed per table and mapped to the models
+that depend on that table; a model's backlog is the rows logged since its last
+completed training job started. A model is due when its backlog reaches
+MIN_ROWS, or has waited MAX_WAIT_SECONDS, and writes have then been quiet for
+DEBOUNCE_SECONDS (a burst of inserts coalesces into one run), and its last
+training is at least MIN_INTERVAL_SECONDS old. All models due in one check
+train together in a single train_models() call. A log row is cleared once
+every model depending on its table has trained after it was written.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min, Sum
+from django.utils import timezone
+
+from .ml.training import MODEL_TYPES
+from .models.analytics_models import DataUpdateLog, MLModelTrainingJob
+
+logger = logging.getLogger(__name__)
+
+# db table -> models whose inputs (see core/features.py) are computed from it.
+# Tables missing here (callrecord: call stats are not a model input) are
+# cleared without retraining anything.
+TABLE_MODELS = {
+    'customer': ('DISEASE', 'CHURN', 'PRODUCT'),
+    'customeridentity': ('DISEASE', 'PRODUCT'),
+    'customerfeedback': ('CHURN', 'PRODUCT'),
+    'contract': ('DISEASE', 'CHURN', 'PRODUCT'),
+    'contractpayment': ('DISEASE', 'CHURN', 'PRODUCT'),
+}
+
+DEFAULTS = {
+    'MIN_ROWS': 1000,
+    'MAX_WAIT_SECONDS': 24 * 3600,
+    'DEBOUNCE_SECONDS': 300,
+    'MIN_INTERVAL_SECONDS': 3600,
+    'STALE_JOB_SECONDS': 6 * 3600,
+}
+
+
+def thresholds(model_type):
+    """ML_RETRAINING settings of `model_type`: DEFAULTS < global keys < MODELS[model_type]"""
+    config = getattr(settings, 'ML_RETRAINING', {})
+    merged = {**DEFAULTS, **{key: value for key, value in config.items() if key in DEFAULTS}}
+    merged.update(config.get('MODELS', {}).get(model_type, {}))
+    return merged
+
+
+def model_tables(model_type):
+    return [table for table, models in TABLE_MODELS.items() if model_type in models]
+
+
+def last_trained(model_types=MODEL_TYPES):
+    """{model_type: started_at of its last completed training job, or None}"""
+    rows = (MLModelTrainingJob.objects.filter(model_type__in=model_types, status='COMPLETED')
+            .values('model_type').annotate(last=Max('started_at')))
+    trained = {row['model_type']: row['last'] for row in rows}
+    return {model_type: trained.get(model_type) for model_type in model_types}
+
+
+def running(model_types=MODEL_TYPES, now=None):
+    """Models with a training job in flight; jobs older than STALE_JOB_SECONDS are presumed dead"""
+    now = now or timezone.now()
+    return {
+        model_type for model_type in model_types
+        if MLModelTrainingJob.objects.filter(
+            model_type=model_type, status='STARTED',
+            started_at__gte=now - timedelta(seconds=thresholds(model_type)['STALE_JOB_SECONDS']),
+        ).exists()
+    }
+
+
+def pending_updates():
+    """{table: {'rows', 'oldest', 'newest'}} of the log rows awaiting retraining, in one query"""
+    rows = (DataUpdateLog.objects.filter(requires_retraining=True)
+            .values('table_name')
+            .annotate(rows=Sum('record_count'), oldest=Min('processed_at'), newest=Max('processed_at')))
+    return {row.pop('table_name'): row for row in rows}
+
+
+def model_backlog(model_type, since=None):
+    """Pending rows, oldest and newest write on the tables `model_type` depends on, after `since`"""
+    updates = DataUpdateLog.objects.filter(requires_retraining=True, table_name__in=model_tables(model_type))
+    if since is not None:
+        updates = updates.filter(processed_at__gt=since)
+    backlog = updates.aggregate(rows=Sum('record_count'), oldest=Min('processed_at'), newest=Max('processed_at'))
+    backlog['rows'] = backlog['rows'] or 0
+    return backlog
+
+
+def retraining_status(model_types=MODEL_TYPES, now=None):
+    """
+    {model_type: backlog + 'due' and 'reason'} for every model. A model is due
+    when its backlog crossed a threshold, has settled, and it isn't training
+    or within MIN_INTERVAL_SECONDS of its last training.
+    """
+    now = now or timezone.now()
+    trained = last_trained(model_types)
+    in_flight = running(model_types, now)
+    status = {}
+    for model_type in model_types:
+        limits = thresholds(model_type)
+        backlog = model_backlog(model_type, trained[model_type])
+        backlog['last_trained'] = trained[model_type]
+        status[model_type] = backlog
+        if not backlog['rows']:
+            backlog.update(due=False, reason='no pending rows')
+            continue
+
+        waited = (now - backlog['oldest']).total_seconds()
+        quiet = (now - backlog['newest']).total_seconds()
+        overdue = waited >= limits['MAX_WAIT_SECONDS']
+        if model_type in in_flight:
+            reason = 'training in progress'
+        elif trained[model_type] and (now - trained[model_type]).total_seconds() < limits['MIN_INTERVAL_SECONDS']:
+            reason = 'trained less than MIN_INTERVAL_SECONDS ago'
+        elif backlog['rows'] < limits['MIN_ROWS'] and not overdue:
+            reason = f"{backlog['rows']} of {limits['MIN_ROWS']} rows"
+        elif quiet < limits['DEBOUNCE_SECONDS'] and not overdue:
+            # Still being written to: wait for the burst to finish
+            reason = f'last write {int(quiet)}s ago'
+        else:
+            reason = 'waited MAX_WAIT_SECONDS' if backlog['rows'] < limits['MIN_ROWS'] else 'MIN_ROWS reached'
+            backlog.update(due=True, reason=reason)
+            continue
+        backlog.update(due=False, reason=reason)
+    return status
+
+
+def clear_consumed(model_types=MODEL_TYPES):
+    """
+    Clear requires_retraining on log rows every dependent model has trained
+    after, and on rows of tables no model depends on. Returns rows cleared.
+    """
+    trained = last_trained(model_types)
+    pending = DataUpdateLog.objects.filter(requires_retraining=True)
+    cleared = pending.exclude(table_name__in=list(TABLE_MODELS)).update(requires_retraining=False)
+    for table, models in TABLE_MODELS.items():
+        watermarks = [trained.get(model_type) for model_type in models if model_type in model_types]
+        if not watermarks or None in watermarks:
+            continue
+        cleared += pending.filter(table_name=table, processed_at__lte=min(watermarks)).update(
+            requires_retraining=False)
+    return cleared
+
+
+def run_scheduled_retraining(now=None, dry_run=False, **train_options):
+    """
+    Retrain the models that are due (see retraining_status) in one coalesced
+    train_models() call and clear the log rows they consumed. Returns a
+    summary with each model's status, the models trained and rows cleared.
+    """
+    from .tasks import train_models
+
+    status = retraining_status(now=now)
+    due = [model_type for model_type, backlog in status.items() if backlog['due']]
+    summary = {'tables': pending_updates(), 'models': status, 'trained': [], 'cleared': 0}
+    if dry_run:
+        return summary
+
+    if due:
+        logger.info('Retraining %s', ', '.join(f"{m} ({status[m]['reason']})" for m in due))
+        jobs = train_models(due, **train_options)
+        summary['trained'] = [model_type for model_type, job in jobs.items() if job.status == 'COMPLETED']
+    summary['cleared'] = clear_consumed()
+    return summary
@@ -0,0 +1,143 @@
+"""
+Nightly batch scoring of every active customer.
+
+Disease and churn predictions are stored here; ProductRecommendation rows
+come from core.recommendations.recommend_plans.
+
+Feature store rows are streamed in chunks; each chunk costs one feature
+DataFrame, one predict call per model and, in one transaction, a delete of
+the chunk's previous predictions and one bulk_create per prediction table,
+so each table holds one row per scored customer. With workers > 1 the
+predict calls run in a process pool while this process fetches and writes
+the neighbouring chunks.
+"""
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import snapshots
+from .features import features_from_store, refresh_missing_features
+from .ml.batch_scoring import init_worker, score_frame, score_in_worker
+from .ml.registry import ModelRegistry, active_versions
+from .models import (
+    Customer, CustomerFeatures, ChronicDiseaseRisk, ChurnPrediction, DataUpdateLog
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+
+def active_customers():
+    return Customer.objects.filter(end_date__isnull=True)
+
+
+def _chunks(chunk_size):
+    chunk = []
+    rows = CustomerFeatures.objects.filter(customer__end_date__isnull=True).order_by('customer_id')
+    for customer in rows.iterator(chunk_size=chunk_size):
+        chunk.append(customer)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _features(customers, today):
+    return pd.DataFrame([features_from_store(customer, today) for customer in customers])
+
+
+def _write_chunk(customers, scores, predicted_at):
+    customer_ids = [customer.customer_id for customer in customers]
+    with transaction.atomic():
+        ChronicDiseaseRisk.objects.filter(customer_id__in=customer_ids).delete()
+        ChurnPrediction.objects.filter(customer_id__in=customer_ids).delete()
+        ChronicDiseaseRisk.objects.bulk_create([
+            ChronicDiseaseRisk(
+                customer_id=customer.customer_id,
+                risk_score=float(scores['disease'][i]),
+                risk_factors=scores['disease_factors'][i],
+                prediction_date=predicted_at,
+                confidence_score=float(max(scores['disease'][i], 1 - scores['disease'][i])),
+            )
+            for i, customer in enumerate(customers)
+        ], batch_size=len(customers))
+        ChurnPrediction.objects.bulk_create([
+            ChurnPrediction(
+                customer_id=customer.customer_id,
+                churn_probability=float(scores['churn'][i]),
+                contributing_factors=scores['churn_factors'][i],
+                prediction_date=predicted_at,
+            )
+            for i, customer in enumerate(customers)
+        ], batch_size=len(customers))
+
+
+def score_customers(chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_WORKERS, progress=None):
+    """
+    Score every active customer with the active model versions and store the
+    results as ChronicDiseaseRisk / ChurnPrediction rows, replacing the
+    previous ones; predictions of customers no longer active are removed.
+    workers: scoring processes; 1 scores in this process
+    progress: optional callable(scored_so_far, rows_per_second) invoked after each chunk
+    Returns a summary with customer count, elapsed seconds and rows per second.
+    """
+    predicted_at = timezone.now()
+    today = predicted_at.date()
+    started = time.perf_counter()
+    registry = ModelRegistry()
+    versions = active_versions()
+    refresh_missing_features(active_customers())
+    totals = {'customers': 0}
+
+    def write(customers, scores):
+        _write_chunk(customers, scores, predicted_at)
+        totals['customers'] += len(customers)
+        rate = totals['customers'] / (time.perf_counter() - started)
+        logger.info('Scored %d customers (%.1f rows/sec)', totals['customers'], rate)
+        if progress:
+            progress(totals['customers'], rate)
+
+    if workers <= 1:
+        service = registry.service(versions)
+        for customers in _chunks(chunk_size):
+            write(customers, score_frame(service, _features(customers, today)))
+    else:
+        # Workers never touch the database; don't let them inherit a connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=registry.service_dirs(versions)) as pool:
+            pending = deque()
+            for customers in _chunks(chunk_size):
+                pending.append((customers, pool.submit(score_in_worker, _features(customers, today))))
+                # Bound memory: at most two chunks per worker in flight
+                if len(pending) >= workers * 2:
+                    customers, future = pending.popleft()
+                    write(customers, future.result())
+            while pending:
+                customers, future = pending.popleft()
+                write(customers, future.result())
+
+    for model in (ChronicDiseaseRisk, ChurnPrediction):
+        model.objects.filter(prediction_date__lt=predicted_at).delete()
+    # bulk_create skips post_save, so the analytics snapshots don't see the new rows
+    snapshots.invalidate()
+    elapsed = time.perf_counter() - started
+    for model in (ChronicDiseaseRisk, ChurnPrediction):
+        DataUpdateLog.objects.create(table_name=model._meta.db_table, operation='INSERT',
+                                     record_count=totals['customers'])
+    return {
+        'predicted_at': predicted_at.isoformat(),
+        'customers': totals['customers'],
+        'workers': workers,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(totals['customers'] / elapsed, 1) if elapsed > 0 else 0,
+    }
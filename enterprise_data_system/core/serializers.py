@@ -6,6 +6,7 @@ from .models import (
     ProductRecommendation, LineOfBusiness, CustomerIdentity,
     Invoice, BillingAccount, ContractPayment
 )
+from .analytics import stats_from_annotations
 
 class CustomerIdentitySerializer(serializers.ModelSerializer):
     class Meta:
@@ -41,6 +42,15 @@ class CustomerSerializer(serializers.ModelSerializer):
         }
         return status_map.get(obj.status, 'Unknown')
 
+class CustomerWithStatsSerializer(CustomerSerializer):
+    stats = serializers.SerializerMethodField()
+
+    class Meta(CustomerSerializer.Meta):
+        fields = CustomerSerializer.Meta.fields + ['stats']
+
+    def get_stats(self, obj):
+        return stats_from_annotations(obj)
+
 class LineOfBusinessSerializer(serializers.ModelSerializer):
     class Meta:
         model = LineOfBusiness
@@ -86,6 +96,7 @@ class ContractSerializer(serializers.ModelSerializer):
         account, _ = Account.objects.get_or_create(
             name=f"{customer.first_name} {customer.last_name} Account",
             defaults={
+                'customer': customer,
                 'company_code': customer_id + 1000,
                 'tax_id': '000-00-0000',
                 'emp_count': 1,
@@ -93,6 +104,9 @@ class ContractSerializer(serializers.ModelSerializer):
                 'status_date': timezone.now().date()
             }
         )
+        if account.customer_id is None:
+            account.customer = customer
+            account.save(update_fields=['customer'])
         
         # Create contract
         contract = Contract.objects.create(
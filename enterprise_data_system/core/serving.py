@@ -0,0 +1,46 @@
+"""
+Prediction serving components built from settings, shared by the views and
+the run_inference_server command.
+"""
+from django.conf import settings
+
+from .ml.coalescer import PredictionCoalescer
+from .ml.inference_client import InferenceClient
+from .ml.prediction_cache import PredictionCache
+from .ml.registry import ModelRegistry
+
+
+def build_prediction_cache():
+    config = getattr(settings, 'PREDICTION_CACHE', {})
+    if not config.get('ENABLED'):
+        return None
+    return PredictionCache(
+        max_entries=config.get('MAX_ENTRIES', 10000),
+        ttl=config.get('TTL', 300),
+    )
+
+
+def build_model_registry(cache=None):
+    # Models are loaded on first use, per active MLModelVersion set
+    return ModelRegistry(
+        max_loaded=getattr(settings, 'ML_REGISTRY', {}).get('MAX_LOADED', 2),
+        cache=cache,
+    )
+
+
+def build_coalescer(service):
+    config = getattr(settings, 'PREDICTION_COALESCER', {})
+    if not config.get('ENABLED'):
+        return None
+    return PredictionCoalescer(
+        service,
+        window_ms=config.get('WINDOW_MS', 2),
+        max_batch_size=config.get('MAX_BATCH_SIZE', 64),
+    )
+
+
+def build_inference_client():
+    config = getattr(settings, 'INFERENCE_SERVER', {})
+    if not config.get('ENABLED'):
+        return None
+    return InferenceClient(config['ADDRESS'], timeout=config.get('TIMEOUT', 5.0))
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from . import features, snapshots
+from .ml import registry
+from .models import (
+    Account, Customer, CustomerIdentity, Contract, ContractPayment, CustomerFeedback, CallRecord,
+    ChronicDiseaseRisk, ChurnPrediction, ProductRecommendation, MLModelVersion
+)
+
+# Tables the analytics snapshots are computed from
+ANALYTICS_SOURCES = [
+    Customer, Contract, ContractPayment, CustomerFeedback, CallRecord,
+    ChronicDiseaseRisk, ChurnPrediction, ProductRecommendation,
+]
+
+
+# Tables CustomerFeatures is derived from -> customer ids a changed row affects
+FEATURE_SOURCES = {
+    Customer: lambda customer: [customer.pk],
+    CustomerIdentity: lambda identity: [identity.customer_id],
+    Account: lambda account: [account.customer_id],
+    Contract: lambda contract: Account.objects.filter(
+        pk=contract.account_id).values_list('customer_id', flat=True),
+    ContractPayment: lambda payment: Contract.objects.filter(
+        pk=payment.contract_id).values_list('account__customer_id', flat=True),
+    CustomerFeedback: lambda feedback: [feedback.customer_id],
+    CallRecord: lambda call: [call.customer_id],
+}
+
+
+def invalidate_analytics(sender, **kwargs):
+    # Wait for commit so a refresh never reads the pre-write state
+    transaction.on_commit(snapshots.invalidate)
+
+
+def invalidate_model_versions(sender, **kwargs):
+    transaction.on_commit(registry.forget_active_versions)
+
+
+def refresh_features(sender, instance, **kwargs):
+    customer_ids = {pk for pk in FEATURE_SOURCES[sender](instance) if pk is not None}
+    if customer_ids:
+        transaction.on_commit(lambda: features.refresh_customer_features(customer_ids))
+
+
+def connect():
+    for model in ANALYTICS_SOURCES:
+        post_save.connect(invalidate_analytics, sender=model,
+                          dispatch_uid=f'analytics_save_{model.__name__}')
+        post_delete.connect(invalidate_analytics, sender=model,
+                            dispatch_uid=f'analytics_delete_{model.__name__}')
+
+    post_save.connect(invalidate_model_versions, sender=MLModelVersion,
+                      dispatch_uid='model_versions_save')
+    post_delete.connect(invalidate_model_versions, sender=MLModelVersion,
+                        dispatch_uid='model_versions_delete')
+
+    for model in FEATURE_SOURCES:
+        post_save.connect(refresh_features, sender=model,
+                          dispatch_uid=f'features_save_{model.__name__}')
+        post_delete.connect(refresh_features, sender=model,
+                            dispatch_uid=f'features_delete_{model.__name__}')
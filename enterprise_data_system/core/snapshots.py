@@ -0,0 +1,157 @@
+"""
+Cached analytics snapshots with stale-while-revalidate refresh.
+
+Each snapshot is stored in Django's cache together with the write generation
+it was computed at. Writes to the source tables bump the generation (see
+core/signals.py); a snapshot from an older generation, or older than
+TIMEOUT seconds, is served as stale while a background thread recomputes it.
+The generation only reaches other processes through a cache they share
+(CACHE_ALIAS); with a per-process cache TIMEOUT is the only staleness bound.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,          # seconds a snapshot counts as fresh
+    'STALE_TIMEOUT': 3600,   # seconds a stale snapshot may still be served
+    'LOCK_TIMEOUT': 60,      # seconds a background refresh holds its lock
+    'BACKGROUND_REFRESH': True,
+}
+
+KEY_PREFIX = 'analytics:snapshot'
+GENERATION_KEY = 'analytics:generation'
+STATS = ('hits', 'stale', 'misses', 'refreshes', 'invalidations')
+SNAPSHOTS = {}  # name -> compute function, filled by register()
+_stats = {}  # name -> {stat: count} for this process
+_stats_lock = threading.Lock()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'ANALYTICS_CACHE', {}))
+    return config
+
+
+def get_cache():
+    return caches[get_config()['CACHE_ALIAS']]
+
+
+def _incr(name, stat):
+    # Counted in process memory: on the shared cache every hit would cost two
+    # more round trips, and DatabaseCache.incr isn't atomic across processes
+    with _stats_lock:
+        counts = _stats.setdefault(name, dict.fromkeys(STATS, 0))
+        counts[stat] += 1
+
+
+def _snapshot_key(name, params):
+    if not params:
+        return f'{KEY_PREFIX}:{name}'
+    suffix = ','.join(f'{k}={params[k]}' for k in sorted(params))
+    return f'{KEY_PREFIX}:{name}:{suffix}'
+
+
+def current_generation():
+    return get_cache().get_or_set(GENERATION_KEY, 0, timeout=None)
+
+
+def register(name, compute):
+    """Register `compute(**params)` as the producer for snapshot `name`"""
+    SNAPSHOTS[name] = compute
+    return compute
+
+
+def _compute_and_store(name, params, key):
+    config = get_config()
+    generation = current_generation()
+    data = SNAPSHOTS[name](**params)
+    get_cache().set(key, {
+        'data': data,
+        'generation': generation,
+        'computed_at': time.time(),
+    }, timeout=config['TIMEOUT'] + config['STALE_TIMEOUT'])
+    return data
+
+
+def _refresh_in_background(name, params, key):
+    config = get_config()
+    lock_key = f'{key}:lock'
+    if not get_cache().add(lock_key, 1, timeout=config['LOCK_TIMEOUT']):
+        return  # another worker is already refreshing this snapshot
+
+    def run():
+        try:
+            _compute_and_store(name, params, key)
+            _incr(name, 'refreshes')
+        except Exception:
+            logger.exception('Background refresh of snapshot %s failed', name)
+        finally:
+            get_cache().delete(lock_key)
+            connections.close_all()
+
+    threading.Thread(target=run, name=f'snapshot-refresh-{name}', daemon=True).start()
+
+
+def get_snapshot(name, **params):
+    """
+    Return (data, state) for snapshot `name`.
+    state is 'hit' (fresh), 'stale' (served while refreshing) or 'miss'
+    (computed synchronously because nothing usable was cached).
+    """
+    config = get_config()
+    key = _snapshot_key(name, params)
+    entry = get_cache().get(key)
+
+    if entry is None:
+        _incr(name, 'misses')
+        return _compute_and_store(name, params, key), 'miss'
+
+    age = time.time() - entry['computed_at']
+    if entry['generation'] == current_generation() and age < config['TIMEOUT']:
+        _incr(name, 'hits')
+        return entry['data'], 'hit'
+
+    _incr(name, 'stale')
+    if config['BACKGROUND_REFRESH']:
+        _refresh_in_background(name, params, key)
+    else:
+        return _compute_and_store(name, params, key), 'miss'
+    return entry['data'], 'stale'
+
+
+def invalidate():
+    """Mark every snapshot stale by bumping the write generation"""
+    cache = get_cache()
+    cache.add(GENERATION_KEY, 0, timeout=None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+    for name in SNAPSHOTS:
+        _incr(name, 'invalidations')
+
+
+def get_stats():
+    """
+    Hit/stale/miss/refresh/invalidation counters per registered snapshot, as
+    seen by this process only (a best-effort sample of the whole deployment)
+    """
+    stats = {}
+    for name in SNAPSHOTS:
+        with _stats_lock:
+            counts = dict(_stats.get(name, dict.fromkeys(STATS, 0)))
+        served = counts['hits'] + counts['stale'] + counts['misses']
+        counts['hit_rate'] = round((counts['hits'] + counts['stale']) / served, 4) if served else 0
+        stats[name] = counts
+    return {
+        'generation': current_generation(),
+        'snapshots': stats,
+    }
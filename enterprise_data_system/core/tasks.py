@@ -1,73 +1,219 @@
+import os
+import shutil
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from .models.analytics_models import MLModelVersion, MLModelTrainingJob, DataUpdateLog
-from .models.customer_models import Customer
-from .ml.models.chronic_disease_model import DiseaseModel as ChronicDiseaseModel
-from .ml.models.churn_prediction_model import ChurnModel as ChurnPredictionModel
-from .ml.models.product_recommendation_model import ProdRecModel as ProductRecommendationModel
+from .models.analytics_models import MLModelVersion, MLModelTrainingJob
+from .ml import compression, incremental, training, tuning
+from .ml.registry import resolve_path
+from .ml.training import MODEL_TYPES
+from .recommendations import recommend_plans
+from .retraining import run_scheduled_retraining
+from .scoring import score_customers, DEFAULT_CHUNK_SIZE, DEFAULT_WORKERS
+from .training_data import customer_batches
 
-def train_model(model_type):
-    job = MLModelTrainingJob.objects.create(
-        model_type=model_type,
-        status='STARTED'
-    )
-    
-    try:
-        if model_type == 'DISEASE':
-            model = ChronicDiseaseModel()
-        elif model_type == 'CHURN':
-            model = ChurnPredictionModel()
-        elif model_type == 'PRODUCT':
-            model = ProductRecommendationModel()
-        
-        metrics = model.train()
-        version = f"{model_type}-{timezone.now().strftime('%Y%m%d-%H%M%S')}"
-        model_path = f"models/{version}.pkl"
-        model.save(model_path)
-        
+# Versioned model directories, relative to ML_MODEL_DIR
+VERSIONS_DIR = 'versions'
+
+def _activate_version(model_type, version, accuracy, metrics):
+    with transaction.atomic():
         MLModelVersion.objects.filter(model_type=model_type, is_active=True).update(is_active=False)
         
-        MLModelVersion.objects.create(
+        return MLModelVersion.objects.create(
             model_type=model_type,
             version=version,
-            accuracy=metrics['accuracy'],
-            model_path=model_path,
+            accuracy=accuracy,
+            model_path=os.path.join(VERSIONS_DIR, version),
             is_active=True,
             metadata=metrics
         )
+
+def train_models(model_types=MODEL_TYPES, cpu_budget=None, n_samples=None, seed=None, data_path=None,
+                 params=None):
+    """
+    Train `model_types` concurrently (see core/ml/training.py) and activate the
+    new versions. One MLModelTrainingJob per model records its metrics and
+    per-stage timings. `params` optionally overrides forest hyperparameters
+    per model. Returns {model_type: job}.
+    """
+    config = getattr(settings, 'ML_TRAINING', {})
+    jobs = {
+        model_type: MLModelTrainingJob.objects.create(model_type=model_type, status='STARTED')
+        for model_type in model_types
+    }
+    
+    try:
+        summary = training.train_all(
+            model_types,
+            output_root=resolve_path(VERSIONS_DIR),
+            cpu_budget=cpu_budget or config.get('CPU_BUDGET'),
+            n_samples=n_samples or config.get('SAMPLES', training.DEFAULT_SAMPLES),
+            seed=seed,
+            data_path=data_path,
+            params=params,
+        )
+    except Exception as e:
+        for job in jobs.values():
+            job.status = 'FAILED'
+            job.error_message = str(e)
+            job.completed_at = timezone.now()
+            job.save()
+        raise
+    
+    for model_type, job in jobs.items():
+        result = summary['models'][model_type]
+        job.completed_at = timezone.now()
+        if 'error' in result:
+            job.status = 'FAILED'
+            job.error_message = result['error']
+            job.save()
+            continue
+        
+        metrics = {
+            **result['metrics'],
+            'timings': result['timings'],
+            'n_jobs': result['n_jobs'],
+            'wall_seconds': summary['wall_seconds'],
+            'seed': summary['seed'],
+        }
+        _activate_version(model_type, result['version'], metrics.get('accuracy', metrics.get('r2')), metrics)
         
         job.status = 'COMPLETED'
         job.metrics = metrics
-        job.completed_at = timezone.now()
         job.save()
-        
-        return job
-        
+    
+    return jobs
+
+def train_model(model_type):
+    return train_models([model_type])[model_type]
+
+def promote_tuned(report, candidate_ids, cpu_budget=None):
+    """
+    Train the tuning candidates `candidate_ids` (see core/ml/tuning.py) on the
+    report's data and activate them, one per model. Each version's metadata
+    keeps the candidate's cross-validated score and latency. Returns {model_type: job}.
+    """
+    chosen = {}
+    for candidate_id in candidate_ids:
+        model_type, candidate = tuning.find_candidate(report, candidate_id)
+        if model_type in chosen:
+            raise ValueError(f"More than one {model_type} candidate to promote")
+        chosen[model_type] = candidate
+    
+    jobs = train_models(list(chosen), cpu_budget=cpu_budget, n_samples=report['samples'], seed=report['seed'],
+                        data_path=report['data'],
+                        params={model_type: candidate['params'] for model_type, candidate in chosen.items()})
+    for model_type, job in jobs.items():
+        if job.status != 'COMPLETED':
+            continue
+        version = MLModelVersion.objects.filter(model_type=model_type, is_active=True).latest('created_at')
+        version.metadata = {**version.metadata, 'tuning': chosen[model_type]}
+        version.save(update_fields=['metadata'])
+    return jobs
+
+def train_incremental(model_type, refresh=False, data_path=None, chunk_size=None, epochs=1):
+    """
+    Train `model_type` out of core (see core/ml/incremental.py) from `data_path`
+    or, for churn, the feature store. With refresh, the active incremental
+    version is continued from only the rows updated since it was created.
+    Returns the MLModelTrainingJob, or None when a refresh finds no new rows.
+    """
+    base = since = None
+    if refresh:
+        base = MLModelVersion.objects.filter(model_type=model_type, is_active=True).order_by('-created_at').first()
+        if base is None or not incremental.has_state(model_type, resolve_path(base.model_path)):
+            raise ValueError(f"No active incremental {model_type} version to refresh")
+        since = base.created_at
+    
+    if data_path:
+        batches = incremental.file_batches(model_type, data_path)
+    else:
+        batches = customer_batches(model_type, since, chunk_size)
+    
+    job = MLModelTrainingJob.objects.create(model_type=model_type, status='STARTED')
+    version = training.version_name(model_type)
+    output_dir = resolve_path(os.path.join(VERSIONS_DIR, version))
+    try:
+        result = incremental.train_incremental(
+            model_type, batches, output_dir,
+            base_dir=resolve_path(base.model_path) if base else None, epochs=epochs,
+        )
     except Exception as e:
         job.status = 'FAILED'
         job.error_message = str(e)
         job.completed_at = timezone.now()
         job.save()
         raise
-
-def update_predictions():
-    models = {
-        'DISEASE': ChronicDiseaseModel(),
-        'CHURN': ChurnPredictionModel(),
-        'PRODUCT': ProductRecommendationModel()
+    
+    metrics = {
+        **result['metrics'],
+        'timings': result['timings'],
+        'mode': 'refresh' if base else 'incremental',
+        'base_version': base.version if base else None,
+        'since': since.isoformat() if since else None,
     }
+    job.completed_at = timezone.now()
+    if base and not metrics['rows']:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        job.status = 'SKIPPED'
+        job.metrics = metrics
+        job.save()
+        return None
+    
+    _activate_version(model_type, version, metrics.get('accuracy', base.accuracy if base else 0.0), metrics)
+    job.status = 'COMPLETED'
+    job.metrics = metrics
+    job.save()
+    return job
+
+def compress_model(model_type, version=None, tolerance=None, activate=False):
+    """
+    Compress `version` (default: the active one) of `model_type` with
+    core/ml/compression.py and register the result as its own MLModelVersion,
+    activated only with `activate`. The version's metadata holds the
+    before/after report. Returns (MLModelVersion, report).
+    """
+    config = getattr(settings, 'ML_COMPRESSION', {})
+    versions = MLModelVersion.objects.filter(model_type=model_type)
+    if version:
+        base = versions.get(version=version)
+    else:
+        base = versions.filter(is_active=True).order_by('-created_at').first()
+        if base is None:
+            raise ValueError(f"No active {model_type} version to compress")
     
-    for model_type, model in models.items():
-        version = MLModelVersion.objects.filter(model_type=model_type, is_active=True).first()
-        if version:
-            model.load(version.model_path)
-            customers = Customer.objects.filter(end_date__isnull=True)
-            
-            for customer in customers:
-                model.predict(customer)
+    name = training.version_name(model_type)
+    output_dir = resolve_path(os.path.join(VERSIONS_DIR, name))
+    try:
+        report = compression.compress(
+            model_type, resolve_path(base.model_path), output_dir,
+            tolerance=config.get('TOLERANCE', compression.DEFAULT_TOLERANCE) if tolerance is None else tolerance,
+            n_samples=config.get('SAMPLES', compression.DEFAULT_SAMPLES),
+        )
+    except Exception:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    
+    # Not an MLModelTrainingJob: nothing new was learned from the data, so
+    # the retraining scheduler's backlog is left as it was
+    metadata = {**report, 'compressed_from': base.version}
+    if activate:
+        return _activate_version(model_type, name, report['after']['score'], metadata), report
+    compressed = MLModelVersion.objects.create(
+        model_type=model_type,
+        version=name,
+        accuracy=report['after']['score'],
+        model_path=os.path.join(VERSIONS_DIR, name),
+        is_active=False,
+        metadata=metadata
+    )
+    return compressed, report
+
+def update_predictions(chunk_size=DEFAULT_CHUNK_SIZE, workers=DEFAULT_WORKERS):
+    summary = score_customers(chunk_size=chunk_size, workers=workers)
+    summary['recommendations'] = recommend_plans()
+    return summary
 
 def check_model_retraining():
-    updates = DataUpdateLog.objects.filter(requires_retraining=True)
-    if updates.exists():
-        for model_type in ['DISEASE', 'CHURN', 'PRODUCT']:
-            train_model(model_type)  # Direct call instead of .delay()
-        updates.update(requires_retraining=False)
+    # Only models whose pending updates crossed ML_RETRAINING thresholds (see core/retraining.py)
+    return run_scheduled_retraining()
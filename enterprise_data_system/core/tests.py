@@ -1,3 +1,560 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from . import snapshots
+from .features import load_customer_features
+from .ml.ann_index import IVFIndex
+from .ml.coalescer import PredictionCoalescer
+from .ml.feature_vector import FeatureRow, PipelinePlan, ScaledPlan, compile_pipeline
+from .ml.flat_forest import FlatForest, export_forests, forest_dir, load_forest, plan_path
+from .ml.models.product_recommendation_model import ProdRecModel
+from .ml.prediction_cache import PredictionCache, canonical_key
+from .ml.predict import CHURN_FEATURES, DISEASE_FEATURES, RECOMMENDATION_FEATURES
+from .ml.train_models import generate_training_data, recommendation_preprocessor
+from .models import (
+    Account, CallRecord, Contract, ContractPayment, Customer, CustomerFeatures, CustomerFeedback,
+    LineOfBusiness, PlanName, SeriesName,
+)
+
+
+class FlatForestTests(SimpleTestCase):
+    """FlatForest must reproduce sklearn's predict_proba/predict, before and after export"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.df = generate_training_data(n_samples=600, seed=7)
+        cls.model_dir = tempfile.mkdtemp()
+
+        cls.scaler = StandardScaler().fit(cls.df[DISEASE_FEATURES])
+        cls.X = cls.scaler.transform(cls.df[DISEASE_FEATURES])
+        cls.classifier = RandomForestClassifier(n_estimators=15, random_state=0).fit(cls.X, cls.df['disease_risk'])
+        cls.pipeline = Pipeline(steps=[
+            ('preprocessor', recommendation_preprocessor()),
+            ('regressor', RandomForestRegressor(n_estimators=15, max_depth=8, random_state=0)),
+        ]).fit(cls.df[RECOMMENDATION_FEATURES], cls.df['product_score'])
+
+        joblib.dump(cls.classifier, os.path.join(cls.model_dir, 'disease_model.pkl'))
+        joblib.dump(cls.scaler, os.path.join(cls.model_dir, 'disease_scaler.pkl'))
+        joblib.dump(cls.pipeline, os.path.join(cls.model_dir, 'recommendation_model.pkl'))
+        cls.exported = export_forests(cls.model_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.model_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def assert_classifier_parity(self, forest):
+        expected = self.classifier.predict_proba(self.X)
+        self.assertTrue(np.allclose(forest.predict_proba(self.X), expected))
+        for i in range(10):
+            self.assertTrue(np.allclose(forest.predict_proba(self.X[i:i + 1]), expected[i:i + 1]))
+        np.testing.assert_array_equal(forest.predict(self.X), self.classifier.predict(self.X))
+
+    def test_classifier_matches_sklearn(self):
+        self.assert_classifier_parity(FlatForest.from_sklearn(self.classifier))
+
+    def test_regressor_matches_sklearn(self):
+        regressor = self.pipeline.named_steps['regressor']
+        X = self.pipeline[:-1].transform(self.df[RECOMMENDATION_FEATURES])
+        forest = FlatForest.from_sklearn(regressor)
+        self.assertTrue(np.allclose(forest.predict(X), regressor.predict(X)))
+        for i in range(10):
+            self.assertTrue(np.allclose(forest.predict(X[i:i + 1]), regressor.predict(X[i:i + 1])))
+
+    def test_export_writes_artifacts_for_pickled_forests(self):
+        self.assertEqual(set(self.exported), {'disease_model', 'recommendation_model'})
+        self.assertTrue(os.path.exists(os.path.join(forest_dir('disease_model', self.model_dir), 'manifest.json')))
+        self.assertTrue(os.path.exists(plan_path('recommendation_model', self.model_dir)))
+
+    def test_loaded_artifact_matches_sklearn(self):
+        forest = load_forest('disease_model', self.model_dir)
+        # Memory-mapped .npy arrays, never unpickled
+        self.assertIsInstance(forest.threshold, np.memmap)
+        self.assert_classifier_parity(forest)
+
+    def test_loaded_plan_and_forest_match_pipeline(self):
+        with open(plan_path('recommendation_model', self.model_dir)) as f:
+            plan = PipelinePlan.from_dict(json.load(f))
+        forest = load_forest('recommendation_model', self.model_dir)
+        X = self.df[RECOMMENDATION_FEATURES]
+        self.assertTrue(np.allclose(forest.predict(plan.transform_frame(X)), self.pipeline.predict(X)))
+
+
+class FeatureVectorTests(SimpleTestCase):
+    """The compiled plans must match the fitted sklearn preprocessing they replace"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.df = generate_training_data(n_samples=400, seed=11)
+        cls.pipeline = Pipeline(steps=[
+            ('preprocessor', recommendation_preprocessor()),
+            ('regressor', RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0)),
+        ]).fit(cls.df[RECOMMENDATION_FEATURES], cls.df['product_score'])
+        cls.preprocessor = cls.pipeline[:-1]
+        cls.plan, cls.regressor = compile_pipeline(cls.pipeline)
+        cls.rows = cls.df.to_dict('records')
+
+    def test_transform_frame_matches_pipeline(self):
+        X = self.df[RECOMMENDATION_FEATURES]
+        self.assertTrue(np.allclose(self.plan.transform_frame(X), self.preprocessor.transform(X)))
+
+    def test_single_row_matches_pipeline(self):
+        feature_row = FeatureRow()
+        for customer_data in self.rows[:20]:
+            expected = self.preprocessor.transform(pd.DataFrame([customer_data])[RECOMMENDATION_FEATURES])
+            actual = self.plan.transform(feature_row.fill(customer_data), customer_data)
+            self.assertTrue(np.allclose(actual, expected))
+
+    def test_plan_round_trips_through_dict(self):
+        plan = PipelinePlan.from_dict(json.loads(json.dumps(self.plan.to_dict())))
+        X = self.df[RECOMMENDATION_FEATURES]
+        self.assertTrue(np.allclose(plan.transform_frame(X), self.preprocessor.transform(X)))
+
+    def test_scaled_plan_matches_standard_scaler(self):
+        scaler = StandardScaler().fit(self.df[CHURN_FEATURES])
+        plan = ScaledPlan(CHURN_FEATURES, scaler)
+        X = self.df[CHURN_FEATURES]
+        self.assertTrue(np.allclose(plan.transform_frame(X), scaler.transform(X)))
+        row = FeatureRow().fill(self.rows[0])
+        self.assertTrue(np.allclose(plan.transform(row), scaler.transform(X.iloc[:1])))
+
+    def test_unknown_category_is_rejected_like_the_encoder(self):
+        customer_data = dict(self.rows[0], risk_tolerance='reckless')
+        X = pd.DataFrame([customer_data])[RECOMMENDATION_FEATURES]
+        with self.assertRaises(ValueError):
+            self.preprocessor.transform(X)
+        with self.assertRaises(ValueError):
+            self.plan.transform_frame(X)
+        with self.assertRaises(ValueError):
+            self.plan.transform(FeatureRow().fill(customer_data), customer_data)
+
+    def test_dropped_category_encodes_as_zeros(self):
+        dropped = [category for category, slot in self.plan.slots[0].items() if slot is None]
+        self.assertEqual(len(dropped), 1)
+        X = pd.DataFrame([dict(self.rows[0], risk_tolerance=dropped[0])])[RECOMMENDATION_FEATURES]
+        self.assertTrue(np.allclose(self.plan.transform_frame(X), self.preprocessor.transform(X)))
+
+    def test_feature_row_is_reused_within_a_thread(self):
+        feature_row = FeatureRow()
+        first = feature_row.fill(self.rows[0])
+        second = feature_row.fill(self.rows[1])
+        self.assertIs(first, second)
+        self.assertEqual(second[feature_row.columns.index('age')], self.rows[1]['age'])
+        # A value missing from the next dict must not leak from the previous one
+        row = feature_row.fill({key: value for key, value in self.rows[2].items() if key != 'premium'})
+        self.assertTrue(np.isnan(row[feature_row.columns.index('premium')]))
+        with self.assertRaises(KeyError):
+            ScaledPlan(CHURN_FEATURES).transform(row)
+
+    def test_feature_row_is_private_to_each_thread(self):
+        feature_row = FeatureRow()
+        scaler = StandardScaler().fit(self.df[DISEASE_FEATURES])
+        plan = ScaledPlan(DISEASE_FEATURES, scaler)
+        expected = scaler.transform(self.df[DISEASE_FEATURES])
+        barrier = threading.Barrier(4)
+        errors = []
+
+        def work(offset):
+            barrier.wait()
+            for _ in range(50):
+                for i in range(offset, len(self.rows), 4):
+                    actual = plan.transform(feature_row.fill(self.rows[i]))
+                    if not np.allclose(actual[0], expected[i]):
+                        errors.append(i)
+
+        threads = [threading.Thread(target=work, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        # Replaces the module's clock only, not time.monotonic everywhere
+        patcher = mock.patch('core.ml.prediction_cache.time', mock.Mock(monotonic=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_canonical_key_ignores_order_and_number_spelling(self):
+        key = canonical_key('score_all', {'age': 45, 'premium': Decimal('2000.50'), 'risk_tolerance': 'low'}, 'v1')
+        self.assertEqual(key, canonical_key(
+            'score_all', {'risk_tolerance': 'low', 'premium': 2000.5, 'age': 45.0}, 'v1'))
+        self.assertEqual(key, canonical_key(
+            'score_all', {'age': '45', 'premium': '2000.50', 'risk_tolerance': 'low'}, 'v1'))
+
+    def test_canonical_key_separates_values_methods_and_versions(self):
+        customer_data = {'age': 45, 'premium': 2000}
+        key = canonical_key('score_all', customer_data, 'v1')
+        self.assertNotEqual(key, canonical_key('score_all', dict(customer_data, age=46), 'v1'))
+        self.assertNotEqual(key, canonical_key('churn_risk', customer_data, 'v1'))
+        self.assertNotEqual(key, canonical_key('score_all', customer_data, 'v2'))
+        self.assertNotEqual(canonical_key('m', {'flag': True}, 'v1'), canonical_key('m', {'flag': 1.0}, 'v1'))
+        self.assertNotEqual(canonical_key('m', {'x': None}, 'v1'), canonical_key('m', {'x': 'None'}, 'v1'))
+
+    def test_evicts_least_recently_used(self):
+        cache = PredictionCache(max_entries=2, ttl=60)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)  # 'b' is now least recently used
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_entries_expire_after_ttl(self):
+        cache = PredictionCache(ttl=10)
+        cache.put('a', 1)
+        self.now += 9.9
+        self.assertEqual(cache.get('a'), 1)
+        self.now += 0.2
+        self.assertIsNone(cache.get('a'))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['expirations'], stats['entries']), (1, 1, 1, 0))
+
+    def test_version_change_invalidates_every_entry(self):
+        cache = PredictionCache()
+        cache.set_version('v1')
+        cache.put(canonical_key('score_all', {'age': 45}, cache.version), {'score': 1})
+        cache.set_version('v1')
+        self.assertEqual(cache.stats()['entries'], 1)
+        cache.set_version('v2')
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual(cache.stats()['invalidations'], 1)
+        self.assertEqual(cache.version, 'v2')
+
+    def test_returns_copies(self):
+        cache = PredictionCache()
+        value = {'disease_risk': {'risk_score': 0.5}}
+        cache.put('a', value)
+        value['disease_risk']['risk_score'] = 0.9
+        cache.get('a')['disease_risk']['risk_score'] = 0.1
+        self.assertEqual(cache.get('a'), {'disease_risk': {'risk_score': 0.5}})
+
+
+class FakeScoringService:
+    """Stands in for PredictionService: scores are derived from customer_data['id']"""
+
+    def __init__(self, fail_ids=()):
+        self.fail_ids = set(fail_ids)
+        self.batches = []
+
+    def cached(self, method, customer_data, compute):
+        return compute()
+
+    def score_all(self, customer_data):
+        if customer_data['id'] in self.fail_ids:
+            raise ValueError(f"bad row {customer_data['id']}")
+        return {'id': customer_data['id']}
+
+    def score_batch(self, rows):
+        self.batches.append([row['id'] for row in rows])
+        if any(row['id'] in self.fail_ids for row in rows):
+            raise ValueError('bad batch')
+        return [{'id': row['id']} for row in rows]
+
+
+class PredictionCoalescerTests(SimpleTestCase):
+    def make_coalescer(self, service, **options):
+        coalescer = PredictionCoalescer(service, **options)
+        self.addCleanup(coalescer.close)
+        return coalescer
+
+    def score_concurrently(self, coalescer, ids):
+        """score_all every id from its own thread; returns {id: result or exception}"""
+        barrier = threading.Barrier(len(ids))
+        results = {}
+
+        def call(customer_id):
+            barrier.wait()
+            try:
+                results[customer_id] = coalescer.score_all({'id': customer_id}, timeout=5)
+            except Exception as e:
+                results[customer_id] = e
+
+        threads = [threading.Thread(target=call, args=(customer_id,)) for customer_id in ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_batch(self):
+        service = FakeScoringService()
+        coalescer = self.make_coalescer(service, window_ms=2000, max_batch_size=4)
+        results = self.score_concurrently(coalescer, [1, 2, 3, 4])
+
+        self.assertEqual(results, {i: {'id': i} for i in (1, 2, 3, 4)})
+        self.assertEqual(len(service.batches), 1)
+        self.assertCountEqual(service.batches[0], [1, 2, 3, 4])
+        self.assertEqual(coalescer.stats()['batches'], 1)
+        self.assertEqual(coalescer.stats()['rows'], 4)
+
+    def test_failed_batch_falls_back_to_single_rows(self):
+        service = FakeScoringService(fail_ids=[2])
+        coalescer = self.make_coalescer(service, window_ms=2000, max_batch_size=3)
+        with self.assertLogs('core.ml.coalescer', 'ERROR'):
+            results = self.score_concurrently(coalescer, [1, 2, 3])
+
+        self.assertEqual(results[1], {'id': 1})
+        self.assertEqual(results[3], {'id': 3})
+        self.assertIsInstance(results[2], ValueError)
+        self.assertEqual(coalescer.stats()['errors'], 1)
+
+    def test_service_failure_fails_the_batch_and_keeps_the_worker(self):
+        service = FakeScoringService()
+        loads = []
+
+        def load_service():
+            # The score_all caller looks the service up first, then the worker
+            loads.append(threading.current_thread().name)
+            if len(loads) == 2:
+                raise OSError('registry unavailable')
+            return service
+
+        coalescer = self.make_coalescer(load_service, window_ms=1, max_batch_size=1)
+        with self.assertLogs('core.ml.coalescer', 'ERROR'), self.assertRaises(OSError):
+            coalescer.score_all({'id': 1}, timeout=5)
+        self.assertEqual(loads[1], 'prediction-coalescer')
+        self.assertTrue(coalescer._worker.is_alive())
+
+        # The next batch is still served
+        self.assertEqual(coalescer.score_all({'id': 2}, timeout=5), {'id': 2})
+        self.assertEqual(service.batches, [[2]])
+
+    def test_every_future_of_a_failed_batch_gets_the_exception(self):
+        service = FakeScoringService()
+        coalescer = self.make_coalescer(service, window_ms=2000, max_batch_size=3)
+        error = OSError('registry unavailable')
+        with self.assertLogs('core.ml.coalescer', 'ERROR'), \
+                mock.patch.object(coalescer, '_service', side_effect=error):
+            futures = [coalescer.submit({'id': i}) for i in (1, 2, 3)]
+            for future in futures:
+                self.assertIs(future.exception(timeout=5), error)
+        self.assertEqual(coalescer.stats()['errors'], 3)
+        self.assertEqual(coalescer.score_all({'id': 4}, timeout=5), {'id': 4})
+
+
+class IVFIndexTests(SimpleTestCase):
+    K = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(3)
+        # Clustered data, like customer feature vectors
+        centres = rng.normal(size=(20, 8)) * 4
+        cls.X = (centres[rng.integers(0, 20, 3000)] + rng.normal(size=(3000, 8))).astype(np.float32)
+        cls.Q = (centres[rng.integers(0, 20, 200)] + rng.normal(size=(200, 8))).astype(np.float32)
+
+    def exact_neighbours(self, X, Q, k):
+        D = ((Q[:, np.newaxis, :].astype(np.float64) - X[np.newaxis, :, :]) ** 2).sum(axis=2)
+        return np.argsort(D, axis=1, kind='stable')[:, :k]
+
+    def recall(self, found, expected):
+        return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)])
+
+    def test_probing_every_list_is_exact(self):
+        index = IVFIndex(n_lists=30, seed=0).fit(self.X)
+        _, ids = index.search(self.Q, self.K, n_probe=index.n_lists)
+        self.assertEqual(self.recall(ids, self.exact_neighbours(self.X, self.Q, self.K)), 1.0)
+
+    def test_partial_probe_recall(self):
+        index = IVFIndex(n_lists=30, n_probe=8, seed=0).fit(self.X)
+        _, ids = index.search(self.Q, self.K)
+        self.assertGreaterEqual(self.recall(ids, self.exact_neighbours(self.X, self.Q, self.K)), 0.9)
+
+    def test_distances_are_sorted_and_match_kneighbors(self):
+        index = IVFIndex(n_lists=30, seed=0).fit(self.X)
+        sq_dist, ids = index.search(self.Q, self.K, n_probe=index.n_lists)
+        self.assertTrue((np.diff(sq_dist, axis=1) >= 0).all())
+        dist, kn_ids = index.kneighbors(self.Q, self.K, n_probe=index.n_lists)
+        np.testing.assert_array_equal(kn_ids, ids)
+        self.assertTrue(np.allclose(dist, np.sqrt(sq_dist)))
+
+    def test_add_then_save_and_load_round_trips(self):
+        index = IVFIndex(n_lists=30, seed=0)
+        index.train(self.X[:2000])
+        first = index.add(self.X[:2000])
+        second = index.add(self.X[2000:])
+        np.testing.assert_array_equal(np.concatenate([first, second]), np.arange(len(self.X)))
+        _, ids = index.search(self.Q, self.K, n_probe=index.n_lists)
+        self.assertEqual(self.recall(ids, self.exact_neighbours(self.X, self.Q, self.K)), 1.0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'index.npz')
+            index.save(path)
+            loaded = IVFIndex.load(path)
+        self.assertEqual(len(loaded), len(index))
+        self.assertEqual((loaded.n_lists, loaded.n_probe, loaded.next_id),
+                         (index.n_lists, index.n_probe, index.next_id))
+        for n_probe in (4, loaded.n_lists):
+            expected = index.search(self.Q, self.K, n_probe=n_probe)
+            actual = loaded.search(self.Q, self.K, n_probe=n_probe)
+            np.testing.assert_array_equal(actual[1], expected[1])
+            np.testing.assert_array_equal(actual[0], expected[0])
+        # A loaded index keeps growing with fresh ids
+        np.testing.assert_array_equal(loaded.add(self.Q[:5]), np.arange(len(self.X), len(self.X) + 5))
+
+    def test_removed_vectors_are_not_returned(self):
+        index = IVFIndex(n_lists=30, seed=0).fit(self.X)
+        _, ids = index.search(self.Q[:1], self.K, n_probe=index.n_lists)
+        self.assertEqual(index.remove(ids[0][:3]), 3)
+        _, after = index.search(self.Q[:1], self.K, n_probe=index.n_lists)
+        self.assertFalse(set(ids[0][:3]) & set(after[0]))
+        self.assertEqual(len(index), len(self.X) - 3)
+
+    def test_get_recs_returns_one_list_per_row(self):
+        rng = np.random.default_rng(5)
+        users = pd.DataFrame(rng.normal(size=(200, 4)), columns=['a', 'b', 'c', 'd'])
+        prods = [[f'p{i % 7}', f'p{(i + 1) % 7}'] for i in range(200)]
+        model = ProdRecModel(k=3, index='ivf', n_lists=5).fit(users, prods)
+        recs = model.get_recs(users.iloc[:4], n=2)
+        self.assertEqual(len(recs), 4)
+        for row, products in enumerate(recs):
+            # The first row of each query is the user itself, so its own products come first
+            self.assertEqual(products, prods[row])
+
+
+def make_customer(**fields):
+    return Customer.objects.create(**{
+        'last_name': 'Doe', 'first_name': 'Jane', 'gender': 'F', 'language': 'EN',
+        'start_date': date(2015, 1, 1), **fields,
+    })
+
+
+class AnalyticsSnapshotTests(TestCase):
+    def setUp(self):
+        snapshots.get_cache().clear()
+        snapshots.register('test_customers', lambda: {'customers': Customer.objects.count()})
+        self.addCleanup(snapshots.SNAPSHOTS.pop, 'test_customers')
+        self.addCleanup(snapshots._stats.pop, 'test_customers', None)
+        patcher = mock.patch.object(snapshots, '_refresh_in_background')
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_write_through_signals_makes_the_snapshot_stale(self):
+        self.assertEqual(snapshots.get_snapshot('test_customers'), ({'customers': 0}, 'miss'))
+        self.assertEqual(snapshots.get_snapshot('test_customers'), ({'customers': 0}, 'hit'))
+        generation = snapshots.current_generation()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_customer()
+
+        self.assertGreater(snapshots.current_generation(), generation)
+        # The old data is served while a refresh is started
+        self.assertEqual(snapshots.get_snapshot('test_customers'), ({'customers': 0}, 'stale'))
+        self.refresh.assert_called_once()
+
+    def test_invalidation_waits_for_commit(self):
+        snapshots.get_snapshot('test_customers')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            make_customer()
+            self.assertEqual(snapshots.get_snapshot('test_customers')[1], 'hit')
+        self.assertIn(snapshots.invalidate, callbacks)
+
+    def test_counters_are_kept_per_process(self):
+        snapshots.get_snapshot('test_customers')
+        snapshots.get_snapshot('test_customers')
+        snapshots.invalidate()
+        snapshots.get_snapshot('test_customers')
+        counts = snapshots.get_stats()['snapshots']['test_customers']
+        self.assertEqual((counts['misses'], counts['hits'], counts['stale'], counts['invalidations']), (1, 1, 1, 1))
+        self.assertEqual(counts['hit_rate'], round(2 / 3, 4))
+
+
+class CustomerFeatureStoreTests(TestCase):
+    """CustomerFeatures rows follow writes to their source tables once the write commits"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer = make_customer()
+            self.account = Account.objects.create(
+                name='Doe Holdings', company_code=1, tax_id='12-3456789', emp_count=1, status='A',
+                status_date=date(2015, 1, 1), customer=self.customer)
+
+    def features(self):
+        return CustomerFeatures.objects.get(pk=self.customer.pk)
+
+    def add_contract(self, number, coverage='100000', premium='1200.00'):
+        contract = Contract.objects.create(
+            contract_num=number, business=LineOfBusiness.objects.get_or_create(name='Life')[0],
+            series=SeriesName.objects.get_or_create(name='Series A')[0],
+            plan=PlanName.objects.get_or_create(name='Term 20')[0], status='A', status_date=date(2015, 1, 1),
+            coverage=coverage, account=self.account, in_force='Y', language='EN', duration=20)
+        ContractPayment.objects.create(contract=contract, bill_method='MONTHLY', premium=Decimal(premium),
+                                       auto_loan='N', payment_limit=Decimal('5000.00'))
+        return contract
+
+    def test_new_customer_gets_a_row(self):
+        features = self.features()
+        self.assertEqual(features.contracts_count, 0)
+        self.assertEqual(features.start_date, self.customer.start_date)
+
+    def test_contract_updates_the_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_contract('C-1')
+            self.add_contract('C-2', coverage='50000', premium='800.00')
+        features = self.features()
+        self.assertEqual(features.contracts_count, 2)
+        self.assertEqual(features.total_coverage, 150000.0)
+        self.assertEqual(features.total_premium, Decimal('2000.00'))
+
+    def test_feedback_and_calls_update_the_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomerFeedback.objects.create(customer=self.customer, feedback_text='Slow claim',
+                                            sentiment_score=0.1, key_topics=['claims'])
+            feedback = CustomerFeedback.objects.create(customer=self.customer, feedback_text='Great agent',
+                                                       sentiment_score=0.9, key_topics=['service'])
+            CallRecord.objects.create(customer=self.customer, call_text='Billing question', duration=120,
+                                      call_time=timezone.now(), sentiment_score=0.6, key_topics=['billing'])
+        features = self.features()
+        self.assertEqual((features.feedback_count, features.complaints_count, features.call_count), (2, 1, 1))
+        self.assertAlmostEqual(features.avg_sentiment, 0.5)
+        self.assertAlmostEqual(features.avg_call_sentiment, 0.6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feedback.delete()
+        features = self.features()
+        self.assertEqual(features.feedback_count, 1)
+        self.assertAlmostEqual(features.avg_sentiment, 0.1)
+
+    def test_row_is_refreshed_only_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.add_contract('C-1')
+        self.assertEqual(self.features().contracts_count, 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.features().contracts_count, 1)
+
+    def test_load_customer_features_builds_missing_rows(self):
+        CustomerFeatures.objects.filter(pk=self.customer.pk).delete()
+        with self.captureOnCommitCallbacks(execute=False):
+            other = make_customer(first_name='John')
+        self.assertFalse(CustomerFeatures.objects.filter(pk__in=[self.customer.pk, other.pk]).exists())
+
+        rows = load_customer_features([self.customer.pk, other.pk, 999999])
+        self.assertEqual(set(rows), {self.customer.pk, other.pk})
+        self.assertEqual(CustomerFeatures.objects.filter(pk__in=[self.customer.pk, other.pk]).count(), 2)
+        self.assertEqual(rows[other.pk].contracts_count, 0)
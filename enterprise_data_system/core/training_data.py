@@ -0,0 +1,61 @@
+"""
+Training chunks streamed from the database, for incremental (re)training
+(see core/ml/incremental.py).
+
+CustomerFeatures rows are read with iterator(), so memory use is bounded by
+the chunk size, not the table size. `since` restricts a run to the rows
+whose features changed after a given time, i.e. after the last model version.
+
+Only churn has an observed outcome in the schema (Customer.end_date); there is
+no recorded disease outcome, so disease trains from files or synthetic data.
+"""
+import pandas as pd
+from django.utils import timezone
+
+from .features import features_from_store
+from .ml.incremental import split_chunk
+from .models import CustomerFeatures
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _churn_label(features):
+    return int(features.customer.end_date is not None)
+
+
+# model_type -> label of one CustomerFeatures row
+LABELS = {'CHURN': _churn_label}
+
+
+def _frame(model_type, rows, today):
+    label = LABELS[model_type]
+    records = []
+    for features in rows:
+        # A churned customer is described as of the day they left
+        record = features_from_store(features, features.customer.end_date or today)
+        record['churn_risk'] = label(features)
+        records.append(record)
+    return split_chunk(model_type, pd.DataFrame(records))
+
+
+def iter_customer_batches(model_type, since=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (X, y) chunks from the feature store, only rows updated after `since` if given"""
+    if model_type not in LABELS:
+        raise ValueError(f"No recorded outcome to train {model_type} on from the database")
+    rows = CustomerFeatures.objects.select_related('customer').order_by('customer_id')
+    if since is not None:
+        rows = rows.filter(updated_at__gt=since)
+    today = timezone.now().date()
+    chunk = []
+    for features in rows.iterator(chunk_size=chunk_size):
+        chunk.append(features)
+        if len(chunk) >= chunk_size:
+            yield _frame(model_type, chunk, today)
+            chunk = []
+    if chunk:
+        yield _frame(model_type, chunk, today)
+
+
+def customer_batches(model_type, since=None, chunk_size=None):
+    """Batch source (callable) for BaseModel.train_incremental"""
+    return lambda: iter_customer_batches(model_type, since, chunk_size or DEFAULT_CHUNK_SIZE)
@@ -1,6 +1,7 @@
-from django.db.models import Avg, Sum, Count
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
 from django.utils import timezone
-from datetime import timedelta
 from django.contrib.auth import authenticate
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
@@ -8,18 +9,55 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import (
-    Customer, Contract, CustomerFeedback, CallRecord,
-    ChronicDiseaseRisk, ChurnPrediction, ProductRecommendation,
-    ContractPayment
+    Customer, Contract, CustomerFeedback
 )
 from .serializers import (
-    CustomerSerializer, ContractSerializer,
-    CustomerFeedbackSerializer, CallRecordSerializer
+    CustomerSerializer, CustomerWithStatsSerializer, ContractSerializer,
+    CustomerFeedbackSerializer
 )
-from .ml.predict import PredictionService
-from .permissions import RoleBasedPermission, role_required
+from .serving import (
+    build_prediction_cache, build_model_registry, build_coalescer, build_inference_client
+)
+from .permissions import IsAdminUser
+from .features import features_from_store, stats_from_store, load_customer_features
+from .quotes import price_quotes, start_requote, REQUOTE_JOBS, DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE
+from .recommendations import customer_recommendations, recommendations_by_customer
+from . import analytics, snapshots
+
+# With INFERENCE_SERVER enabled, models live in the sidecar process and this
+# worker never loads them; otherwise they're loaded lazily here
+inference_client = build_inference_client()
+if inference_client is None:
+    prediction_cache = build_prediction_cache()
+    model_registry = build_model_registry(prediction_cache)
+    # Opt-in micro-batching of concurrent single-customer predictions
+    prediction_coalescer = build_coalescer(model_registry.service)
+else:
+    prediction_cache = model_registry = prediction_coalescer = None
+
+def get_prediction_service():
+    """PredictionService, or the sidecar client standing in for it"""
+    if inference_client is not None:
+        return inference_client
+    return model_registry.service()
+
+# Batch risk analysis limits
+RISK_BATCH_MAX_IDS = 10000
+RISK_BATCH_CHUNK_SIZE = 500
+
+def recommended_plans(rows):
+    """Stored ProductRecommendation rows (best first) as returned by the API"""
+    return [
+        {'plan_id': row['plan_id'], 'plan': row['plan__name'], 'score': row['recommendation_score']}
+        for row in rows
+    ]
 
-prediction_service = PredictionService()
+def recommendations_block(rows):
+    """The 'recommendations' entry of a risk analysis: the nightly plan recommendations"""
+    return {
+        'plans': recommended_plans(rows),
+        'recommendation_date': rows[0]['recommendation_date'] if rows else None,
+    }
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -52,252 +90,216 @@ class CustomerViewSet(viewsets.ModelViewSet):
     serializer_class = CustomerSerializer
     permission_classes = []  # Temporarily disable permissions for testing
 
-    def get_customer_stats(self, customer):
-        """Get aggregated customer statistics"""
-        contracts = Contract.objects.filter(account__customer=customer)
-        feedback = CustomerFeedback.objects.filter(customer=customer)
-        calls = CallRecord.objects.filter(customer=customer)
-        
-        avg_sentiment = feedback.aggregate(Avg('sentiment_score'))['sentiment_score__avg']
-        total_premium = ContractPayment.objects.filter(contract__account__customer=customer).aggregate(Sum('premium'))['premium__sum'] or 0
-        total_coverage = contracts.aggregate(Sum('coverage'))['coverage__sum'] or 0
-        
-        return {
-            'contracts_count': contracts.count(),
-            'claims_count': contracts.filter(status='claimed').count(),
-            'avg_sentiment': avg_sentiment if avg_sentiment is not None else 0.5,
-            'complaints_count': feedback.filter(sentiment_score__lt=0.3).count(),
-            'delayed_payments': contracts.filter(status='delayed').count(),
-            'avg_premium': total_premium / contracts.count() if contracts.count() > 0 else 0,
-            'total_coverage': total_coverage if total_coverage is not None else 0
-        }
+    def include_stats(self):
+        return self.request.query_params.get('include_stats', '').lower() in ('1', 'true', 'yes')
+
+    def get_queryset(self):
+        queryset = Customer.objects.select_related('customeridentity')
+        if self.include_stats():
+            queryset = analytics.with_customer_stats(queryset)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve') and self.include_stats():
+            return CustomerWithStatsSerializer
+        return CustomerSerializer
+
+    def get_features(self):
+        """CustomerFeatures row of the requested customer: a single primary-key lookup"""
+        try:
+            pk = int(self.kwargs['pk'])
+        except (TypeError, ValueError):
+            raise Http404
+        features = load_customer_features([pk]).get(pk)
+        if features is None:
+            raise Http404
+        return features
 
     @action(detail=True, methods=['get'])
     def risk_analysis(self, request, pk=None):
         """Get comprehensive risk analysis for a customer"""
-        customer = self.get_object()
-        stats = self.get_customer_stats(customer)
-        
-        customer_data = {
-            'age': customer.age,
-            'income': customer.income,
-            'years_as_customer': (timezone.now().date() - customer.start_date).days / 365,
-            'num_products': stats['contracts_count'],
-            'total_claims': stats['claims_count'],
-            'avg_sentiment': stats['avg_sentiment'],
-            'num_complaints': stats['complaints_count'],
-            'payment_delay': stats['delayed_payments'],
-            'premium': stats['avg_premium'],
-            'coverage': stats['total_coverage'],
-            'risk_tolerance': customer.risk_profile,
-            'family_size': customer.family_size,
-            'employment_status': customer.employment_status
-        }
+        features = self.get_features()
+        stats = stats_from_store(features)
+        customer_data = features_from_store(features)
         
-        disease_risk = prediction_service.predict_disease_risk(customer_data)
-        churn_risk = prediction_service.predict_churn_risk(customer_data)
-        recommendations = prediction_service.get_product_recommendations(customer_data)
+        scorer = prediction_coalescer or get_prediction_service()
+        scores = scorer.score_all(customer_data)
         
         return Response({
-            'customer_id': customer.id,
+            'customer_id': features.customer_id,
             'customer_stats': stats,
-            'disease_risk': disease_risk,
-            'churn_risk': churn_risk,
-            'recommendations': recommendations
+            **scores,
+            'recommendations': recommendations_block(customer_recommendations(features.customer_id)),
+        })
+
+    @action(detail=True, methods=['get'])
+    def recommendations(self, request, pk=None):
+        """Top plans precomputed by the nightly recommend_plans job: one indexed lookup, no model call"""
+        try:
+            customer_id = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
+        rows = customer_recommendations(customer_id)
+        if not rows and not Customer.objects.filter(pk=customer_id).exists():
+            raise Http404
+        
+        return Response({
+            'customer_id': customer_id,
+            'recommendations': recommended_plans(rows),
+            'recommendation_date': rows[0]['recommendation_date'] if rows else None,
         })
 
     @action(detail=True, methods=['post'])
     def calculate_quote(self, request, pk=None):
         """Calculate insurance quote based on customer risk profile"""
-        customer = self.get_object()
-        stats = self.get_customer_stats(customer)
+        features = self.get_features()
         
-        customer_data = {
-            'age': customer.age,
-            'income': customer.income,
-            'years_as_customer': (timezone.now().date() - customer.start_date).days / 365,
-            'num_products': stats['contracts_count'],
-            'total_claims': stats['claims_count'],
-            'premium': request.data.get('base_premium', 1000),
-            'coverage': request.data.get('coverage', 100000)
-        }
+        customer_data = features_from_store(features)
+        customer_data['premium'] = float(request.data.get('base_premium', 1000))
+        customer_data['coverage'] = float(request.data.get('coverage', 100000))
         
+        prediction_service = get_prediction_service()
         disease_risk = prediction_service.predict_disease_risk(customer_data)
         churn_risk = prediction_service.predict_churn_risk(customer_data)
         
-        base_premium = float(request.data.get('base_premium', 1000))
-        risk_factor = 1 + (disease_risk['risk_score'] * 0.5)  # Up to 50% increase for high risk
-        loyalty_discount = 0.1 if churn_risk['churn_probability'] < 0.3 else 0  # 10% loyalty discount
-        
-        final_premium = base_premium * risk_factor * (1 - loyalty_discount)
+        base_premium = customer_data['premium']
+        risk_factor, loyalty_discount, final_premium = price_quotes(
+            base_premium, disease_risk['risk_score'], churn_risk['churn_probability'])
         
         return Response({
-            'customer_id': customer.id,
+            'customer_id': features.customer_id,
             'base_premium': base_premium,
-            'risk_factor': risk_factor,
-            'loyalty_discount': loyalty_discount,
-            'final_premium': final_premium,
+            'risk_factor': float(risk_factor),
+            'loyalty_discount': float(loyalty_discount),
+            'final_premium': float(final_premium),
             'risk_assessment': {
                 'disease_risk': disease_risk,
                 'churn_risk': churn_risk
             }
         })
 
+    @action(detail=False, methods=['post'], url_path='risk_analysis/batch')
+    def risk_analysis_batch(self, request):
+        """
+        Risk analysis for many customers in one request
+        Body: {"customer_ids": [1, 2, ...]}
+        Streams one JSON object per line (NDJSON), chunk by chunk, in request order.
+        """
+        customer_ids = request.data.get('customer_ids')
+        if not isinstance(customer_ids, list) or not customer_ids:
+            return Response({'error': 'customer_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            customer_ids = list(dict.fromkeys(int(cid) for cid in customer_ids))
+        except (TypeError, ValueError):
+            return Response({'error': 'customer_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(customer_ids) > RISK_BATCH_MAX_IDS:
+            return Response({'error': f'At most {RISK_BATCH_MAX_IDS} customer_ids per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return StreamingHttpResponse(self.stream_risk_batch(customer_ids), content_type='application/x-ndjson')
+
+    def stream_risk_batch(self, customer_ids):
+        """Per chunk: one feature store lookup, one feature matrix, one call per model, one recommendations lookup"""
+        today = timezone.now().date()
+        for start in range(0, len(customer_ids), RISK_BATCH_CHUNK_SIZE):
+            chunk = customer_ids[start:start + RISK_BATCH_CHUNK_SIZE]
+            customers = load_customer_features(chunk)
+            found = [cid for cid in chunk if cid in customers]
+            stats = {cid: stats_from_store(customers[cid]) for cid in found}
+            scores = get_prediction_service().score_batch(
+                [features_from_store(customers[cid], today) for cid in found])
+            scores = dict(zip(found, scores))
+            recommendations = recommendations_by_customer(found)
+
+            for cid in chunk:
+                if cid not in customers:
+                    result = {'customer_id': cid, 'error': 'Customer not found'}
+                else:
+                    result = {'customer_id': cid, 'customer_stats': stats[cid], **scores[cid],
+                              'recommendations': recommendations_block(recommendations[cid])}
+                yield json.dumps(result, cls=DjangoJSONEncoder) + '\n'
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def dashboard_analytics(request):
     """Get dashboard analytics data"""
     try:
-        # Get customer analytics
-        customers = Customer.objects.all()
-        total_customers = customers.count()
-        active_customers = customers.filter(status='A').count()
-
-        # Get contract analytics
-        contracts = Contract.objects.all()
-        total_contracts = contracts.count()
-        active_contracts = contracts.filter(status='A').count()
-
-        # Get business distribution
-        business_distribution = {
-            'insurance': Contract.objects.filter(business__name__icontains='insurance').count(),
-            'investment': Contract.objects.filter(business__name__icontains='investment').count(),
-            'banking': Contract.objects.filter(business__name__icontains='banking').count(),
-            'loan': Contract.objects.filter(business__name__icontains='loan').count()
-        }
-
-        # Get duration distribution
-        duration_distribution = {
-            '1': Contract.objects.filter(duration=12).count(),
-            '2': Contract.objects.filter(duration=24).count(),
-            '3': Contract.objects.filter(duration=36).count(),
-            '5': Contract.objects.filter(duration=60).count(),
-            '10': Contract.objects.filter(duration=120).count()
-        }
-
-        # Get status distribution
-        status_distribution = {
-            'active': Contract.objects.filter(status='A').count(),
-            'pending': Contract.objects.filter(status='P').count(),
-            'expired': Contract.objects.filter(status='E').count(),
-            'suspended': Contract.objects.filter(status='C').count()
-        }
-
-        # Calculate average contract value
-        total_premium = ContractPayment.objects.aggregate(
-            total=Sum('premium')
-        )['total'] or 0
-        average_value = total_premium / total_contracts if total_contracts > 0 else 0
-
-        return Response({
-            'total_customers': total_customers,
-            'active_customers': active_customers,
-            'total_contracts': total_contracts,
-            'active_contracts': active_contracts,
-            'average_contract_value': average_value,
-            'retention_rate': 95,  # 示例数据
-            'business_distribution': business_distribution,
-            'duration_distribution': duration_distribution,
-            'status_distribution': status_distribution,
-            'risk_distribution': {
-                'low': 30,
-                'medium': 50,
-                'high': 20
-            },
-            'growth_trend': [100, 120, 140, 160, 180, 200, 220, 240, 260, 280, 300, 320]  # 示例数据
-        })
+        data, state = snapshots.get_snapshot('dashboard')
+        return Response(data, headers={'X-Cache': state.upper()})
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def ai_analytics(request):
-    """Get AI-powered analytics data"""
+    """
+    Get AI-powered analytics data
+    Query params: days (1-366, default 7) and bucket (day|week|month, default day)
+    control the window and granularity of the sentiment trends.
+    """
     try:
-        # Get feedback analytics
-        feedbacks = CustomerFeedback.objects.all()
-        feedback_count = feedbacks.count()
-        avg_sentiment = feedbacks.aggregate(Avg('sentiment_score'))['sentiment_score__avg'] or 0
-
-        # Get call record analytics
-        calls = CallRecord.objects.all()
-        call_count = calls.count()
-        avg_call_sentiment = calls.aggregate(Avg('sentiment_score'))['sentiment_score__avg'] or 0
-
-        # Get disease risk analytics
-        disease_risks = ChronicDiseaseRisk.objects.all()
-        avg_risk_score = disease_risks.aggregate(Avg('risk_score'))['risk_score__avg'] or 0
-        risk_distribution = {
-            'high': disease_risks.filter(risk_score__gte=0.7).count(),
-            'medium': disease_risks.filter(risk_score__gte=0.3, risk_score__lt=0.7).count(),
-            'low': disease_risks.filter(risk_score__lt=0.3).count()
-        }
-
-        # Get churn prediction analytics
-        churn_predictions = ChurnPrediction.objects.all()
-        avg_churn_prob = churn_predictions.aggregate(Avg('churn_probability'))['churn_probability__avg'] or 0
-        churn_distribution = {
-            'high': churn_predictions.filter(churn_probability__gte=0.7).count(),
-            'medium': churn_predictions.filter(churn_probability__gte=0.3, churn_probability__lt=0.7).count(),
-            'low': churn_predictions.filter(churn_probability__lt=0.3).count()
-        }
-
-        # Get sentiment trend (last 7 days)
-        today = timezone.now().date()
-        sentiment_trend = []
-        for i in range(7):
-            date = today - timedelta(days=i)
-            daily_feedbacks = feedbacks.filter(created_at__date=date)
-            if daily_feedbacks.exists():
-                daily_sentiment = daily_feedbacks.aggregate(Avg('sentiment_score'))['sentiment_score__avg']
-                sentiment_trend.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'score': round(daily_sentiment, 2)
-                })
-            else:
-                sentiment_trend.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'score': None
-                })
-
-        # Calculate risk distribution percentages
-        total_risks = sum(risk_distribution.values())
-        risk_distribution_percent = {
-            'high': round(risk_distribution['high'] / total_risks * 100 if total_risks > 0 else 0),
-            'medium': round(risk_distribution['medium'] / total_risks * 100 if total_risks > 0 else 0),
-            'low': round(risk_distribution['low'] / total_risks * 100 if total_risks > 0 else 0)
-        }
-
-        # Calculate churn distribution percentages
-        total_churns = sum(churn_distribution.values())
-        churn_distribution_percent = {
-            'high': round(churn_distribution['high'] / total_churns * 100 if total_churns > 0 else 0),
-            'medium': round(churn_distribution['medium'] / total_churns * 100 if total_churns > 0 else 0),
-            'low': round(churn_distribution['low'] / total_churns * 100 if total_churns > 0 else 0)
-        }
+        days = int(request.query_params.get('days', analytics.DEFAULT_TREND_DAYS))
+    except ValueError:
+        return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    bucket = request.query_params.get('bucket', 'day')
 
-        return Response({
-            'feedback_analytics': {
-                'total_feedbacks': feedback_count,
-                'average_sentiment': round(avg_sentiment, 2),
-                'sentiment_trend': [x for x in sentiment_trend if x['score'] is not None]
-            },
-            'call_analytics': {
-                'total_calls': call_count,
-                'average_sentiment': round(avg_call_sentiment, 2)
-            },
-            'risk_analytics': {
-                'average_risk_score': round(avg_risk_score, 2),
-                'risk_distribution': risk_distribution_percent
-            },
-            'churn_analytics': {
-                'average_churn_probability': round(avg_churn_prob, 2),
-                'churn_distribution': churn_distribution_percent
-            }
-        })
+    if not 1 <= days <= analytics.MAX_TREND_DAYS:
+        return Response({'error': f'days must be between 1 and {analytics.MAX_TREND_DAYS}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if bucket not in analytics.TREND_BUCKETS:
+        return Response({'error': f"bucket must be one of: {', '.join(analytics.TREND_BUCKETS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        data, state = snapshots.get_snapshot('ai', days=days, bucket=bucket)
+        return Response(data, headers={'X-Cache': state.upper()})
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def analytics_cache_stats(request):
+    """Get hit/miss counters for the analytics snapshot cache"""
+    return Response(snapshots.get_stats())
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def prediction_coalescer_stats(request):
+    """Get batch size and latency figures for the prediction coalescer"""
+    if prediction_coalescer is None:
+        return Response({'enabled': False})
+    return Response({'enabled': True, **prediction_coalescer.stats()})
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def prediction_cache_stats(request):
+    """Get hit/miss/eviction counters for the prediction cache"""
+    if prediction_cache is None:
+        return Response({'enabled': False})
+    return Response({'enabled': True, **prediction_cache.stats()})
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def model_registry_stats(request):
+    """Get the active model versions and which ones are loaded"""
+    if model_registry is None:
+        return Response({'enabled': False, 'inference_server': inference_client.address})
+    try:
+        return Response(model_registry.stats())
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def inference_server_stats(request):
+    """Get request counters from the inference sidecar"""
+    if inference_client is None:
+        return Response({'enabled': False})
+    try:
+        return Response({'enabled': True, 'address': inference_client.address, **inference_client.stats()})
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
 class FeedbackViewSet(viewsets.ModelViewSet):
     serializer_class = CustomerFeedbackSerializer
     permission_classes = []  # Temporarily disable permissions for testing
@@ -320,21 +322,42 @@ class ContractViewSet(viewsets.ModelViewSet):
     def analytics(self, request):
         """Get contract analytics and insights"""
         try:
-            total_contracts = Contract.objects.count()
-            active_contracts = Contract.objects.filter(status='A').count()
-            total_premium = ContractPayment.objects.filter(contract__status='A').aggregate(Sum('premium'))['premium__sum'] or 0
-            avg_duration = Contract.objects.aggregate(Avg('duration'))['duration__avg'] or 0
-            
-            return Response({
-                'total_contracts': total_contracts,
-                'active_contracts': active_contracts,
-                'total_premium': float(total_premium),  # Convert Decimal to float
-                'average_duration': float(avg_duration) if avg_duration else 0,
-                'contract_distribution': {
-                    'active': round(active_contracts / total_contracts * 100, 1) if total_contracts > 0 else 0,
-                    'pending': round(Contract.objects.filter(status='P').count() / total_contracts * 100, 1) if total_contracts > 0 else 0,
-                    'expired': round(Contract.objects.filter(status='E').count() / total_contracts * 100, 1) if total_contracts > 0 else 0
-                }
-            })
+            data, state = snapshots.get_snapshot('contracts')
+            return Response(data, headers={'X-Cache': state.upper()})
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def requote(self, request):
+        """
+        Start re-quoting all active contracts with the portfolio quoting job (admins only)
+        Body (optional): {"base_premium": 1000, "chunk_size": 2000}
+        Returns 202 with the job; poll GET requote/{job_id}/ for its progress.
+        """
+        try:
+            chunk_size = int(request.data.get('chunk_size', DEFAULT_CHUNK_SIZE))
+            base_premium = request.data.get('base_premium')
+            base_premium = float(base_premium) if base_premium is not None else None
+        except (TypeError, ValueError):
+            return Response({'error': 'chunk_size and base_premium must be numbers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+            return Response({'error': f'chunk_size must be between 1 and {MAX_CHUNK_SIZE}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            job = start_requote(get_prediction_service(), chunk_size=chunk_size, base_premium=base_premium)
+        except RuntimeError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(job, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'requote/(?P<job_id>[0-9a-f]+)',
+            permission_classes=[IsAdminUser])
+    def requote_status(self, request, job_id=None):
+        """Progress of a re-quote job started by this server process"""
+        job = REQUOTE_JOBS.get(job_id)
+        if job is None:
+            raise Http404
+        return Response(dict(job))
@@ -160,9 +160,96 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+# Cache settings
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'enterprise-data-system',
+    },
+    # Shared by every worker process, so one process's invalidation is seen by
+    # all of them; the table is created by migration core 0012
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'core_shared_cache',
+    },
+}
+
+# Analytics snapshot cache (see core/snapshots.py). CACHE_ALIAS must be shared
+# between processes: with a per-process cache the write-generation bump only
+# reaches the process that made the write, and others serve stale snapshots
+# for up to TIMEOUT seconds
+ANALYTICS_CACHE = {
+    'CACHE_ALIAS': 'shared',
+    'TIMEOUT': 300,
+    'STALE_TIMEOUT': 3600,
+    'LOCK_TIMEOUT': 60,
+    'BACKGROUND_REFRESH': True,
+}
+
 # ML Model settings
 ML_MODEL_DIR = os.path.join(BASE_DIR, 'core', 'ml', 'models')
 
+# Parallel training (see core/ml/training.py); CPU_BUDGET None uses every core
+ML_TRAINING = {
+    'CPU_BUDGET': None,
+    'SAMPLES': 10000,
+}
+
+# When pending DataUpdateLog rows trigger retraining (see core/retraining.py)
+ML_RETRAINING = {
+    'MIN_ROWS': 1000,
+    'MAX_WAIT_SECONDS': 24 * 3600,
+    'DEBOUNCE_SECONDS': 300,
+    'MIN_INTERVAL_SECONDS': 3600,
+    'STALE_JOB_SECONDS': 6 * 3600,
+    'MODELS': {
+        'PRODUCT': {'MIN_ROWS': 5000},
+    },
+}
+
+# Post-training forest compression (see core/ml/compression.py): largest
+# allowed drop in accuracy (r2 for recommendations) and rows to score on
+ML_COMPRESSION = {
+    'TOLERANCE': 0.01,
+    'SAMPLES': 10000,
+}
+
+# Budget checked by `manage.py benchmark_startup`: seconds to import core.views
+# after django.setup(), resident memory after it, and modules that must stay
+# unimported until an ML code path actually runs
+STARTUP_BUDGET = {
+    'IMPORT_SECONDS': 1.0,
+    'RSS_MB': 150,
+    'LAZY_MODULES': ['torch', 'sklearn', 'scipy', 'pandas', 'faker', 'joblib'],
+}
+
+# Loaded model versions kept in memory per process (see core/ml/registry.py)
+ML_REGISTRY = {
+    'MAX_LOADED': 2,
+}
+
+# Memoized single-customer predictions (see core/ml/prediction_cache.py)
+PREDICTION_CACHE = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 10000,
+    'TTL': 300,
+}
+
+# Micro-batching of concurrent risk_analysis predictions (see core/ml/coalescer.py)
+PREDICTION_COALESCER = {
+    'ENABLED': False,
+    'WINDOW_MS': 2,
+    'MAX_BATCH_SIZE': 64,
+}
+
+# Optional shared inference sidecar (python manage.py run_inference_server).
+# When enabled, web workers send predictions to it instead of loading models.
+INFERENCE_SERVER = {
+    'ENABLED': False,
+    'ADDRESS': 'unix:/tmp/enterprise_data_system_inference.sock',  # or '127.0.0.1:8765'
+    'TIMEOUT': 5.0,
+}
+
 # Logging settings
 LOGGING = {
     'version': 1,
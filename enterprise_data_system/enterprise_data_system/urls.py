@@ -3,7 +3,9 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from core.views import (
     CustomerViewSet, ContractViewSet, FeedbackViewSet,
-    login, ai_analytics, dashboard_analytics
+    login, ai_analytics, dashboard_analytics, analytics_cache_stats,
+    prediction_coalescer_stats, prediction_cache_stats, model_registry_stats,
+    inference_server_stats
 )
 
 # Create router and register viewsets
@@ -19,16 +21,22 @@ urlpatterns = [
     path('auth/login/', login, name='login'),
     path('api/analytics/ai/', ai_analytics, name='ai-analytics'),
     path('api/analytics/dashboard/', dashboard_analytics, name='dashboard-analytics'),
+    path('api/analytics/cache/', analytics_cache_stats, name='analytics-cache-stats'),
+    path('api/ml/coalescer/', prediction_coalescer_stats, name='prediction-coalescer-stats'),
+    path('api/ml/prediction-cache/', prediction_cache_stats, name='prediction-cache-stats'),
+    path('api/ml/registry/', model_registry_stats, name='model-registry-stats'),
+    path('api/ml/inference-server/', inference_server_stats, name='inference-server-stats'),
 ]
 
 # Available API endpoints:
-# GET /api/customers/ - List all customers
+# GET /api/customers/ - List all customers (?include_stats=true adds per-customer risk stats)
 # POST /api/customers/ - Create a new customer
 # GET /api/customers/{id}/ - Get customer details
 # PUT /api/customers/{id}/ - Update customer
 # DELETE /api/customers/{id}/ - Delete customer
 # GET /api/customers/{id}/risk_analysis/ - Get customer risk analysis
 # POST /api/customers/{id}/calculate_quote/ - Calculate insurance quote
+# POST /api/customers/risk_analysis/batch/ - Stream risk analysis for a list of customer_ids (NDJSON)
 
 # GET /api/contracts/ - List all contracts
 # POST /api/contracts/ - Create a new contract
@@ -36,4 +44,11 @@ urlpatterns = [
 # PUT /api/contracts/{id}/ - Update contract
 # DELETE /api/contracts/{id}/ - Delete contract
 # GET /api/contracts/analytics/ - Get contract analytics
-# GET /api/analytics/ai/ - Get AI analytics data
+# POST /api/contracts/requote/ - Start re-quoting all active contracts in the background (admins; 202 + job)
+# GET /api/contracts/requote/{job_id}/ - Get the progress of a re-quote job (admins)
+# GET /api/analytics/ai/?days=30&bucket=week - Get AI analytics data
+# GET /api/analytics/cache/ - Get analytics snapshot cache hit/miss counters
+# GET /api/ml/coalescer/ - Get prediction micro-batching stats
+# GET /api/ml/prediction-cache/ - Get prediction cache hit/miss/eviction stats
+# GET /api/ml/registry/ - Get active model versions and loaded artifacts
+# GET /api/ml/inference-server/ - Get inference sidecar stats